@@ -0,0 +1,259 @@
+from flask import Blueprint, jsonify, request, session
+
+from cache_grupos import cache, invalidar_grupos, pagina_grupo
+from database import conectar_bd
+from escuela import GRUPOS, MATERIAS, TRIMESTRES, validar_calificaciones
+from estadisticas import alumnos_con_promedio, invalidar_tablero
+from paginacion import CursorInvalido, pagina_alumnos, tamano_pagina
+import promedios
+from trabajos import TAREAS, a_json, cancelar_trabajo, encolar, listar_trabajos, obtener_trabajo
+
+# API JSON para capturar calificaciones de un grupo completo en una sola
+# petición. Usa la misma sesión que las páginas HTML.
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+CAMPOS_ALUMNO = {'nombre': 1, 'apellidos': 1, 'grupo': 1}
+
+
+class ErrorApi(Exception):
+    def __init__(self, mensaje, estado=400, errores=None):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.estado = estado
+        self.errores = errores or []
+
+
+@api.errorhandler(ErrorApi)
+def responder_error(error):
+    cuerpo = {'error': error.mensaje}
+    if error.errores:
+        cuerpo['errores'] = error.errores
+    return jsonify(cuerpo), error.estado
+
+
+def requerir_sesion():
+    if not session.get('logueado'):
+        raise ErrorApi("Sesión no iniciada", 401)
+    return session.get('rol') == 'admin'
+
+
+def requerir_admin():
+    if not requerir_sesion():
+        raise ErrorApi("Solo el administrador puede realizar esta acción", 403)
+
+
+def requerir_grupo(grupo):
+    # Los maestros solo pueden leer y escribir su propio grupo
+    es_admin = requerir_sesion()
+    if grupo not in GRUPOS:
+        raise ErrorApi(f"Grupo desconocido: {grupo}", 404)
+    if not es_admin and grupo != session.get('grupo'):
+        raise ErrorApi("No tienes permisos sobre este grupo", 403)
+
+
+def requerir_trimestre(trimestre):
+    if trimestre not in TRIMESTRES:
+        raise ErrorApi(f"Trimestre desconocido: {trimestre}", 404)
+
+
+def requerir_bd():
+    db = conectar_bd()
+    if db is None:
+        raise ErrorApi("Base de datos no disponible", 503)
+    return db
+
+
+def leer_pagina(db, filtro, trimestre):
+    # Las consultas de un solo grupo salen de la caché por worker
+    argumentos = {'despues': request.args.get('despues'), 'limite': tamano_pagina(request.args.get('limite'))}
+    try:
+        if list(filtro) == ['grupo']:
+            pagina = pagina_grupo(db, filtro['grupo'], trimestre, **argumentos)
+        else:
+            pagina = pagina_alumnos(db, filtro, trimestre, **argumentos)
+        return list(pagina), pagina.siguiente
+    except CursorInvalido as e:
+        raise ErrorApi(str(e), 400)
+
+
+@api.route('/alumnos')
+def listar_alumnos():
+    es_admin = requerir_sesion()
+    grupo = request.args.get('grupo') or (None if es_admin else session.get('grupo'))
+    filtro = {}
+    if grupo:
+        requerir_grupo(grupo)
+        filtro['grupo'] = grupo
+
+    alumnos, siguiente = leer_pagina(requerir_bd(), filtro, TRIMESTRES[0])
+    return jsonify(
+        alumnos=[{campo: alumno.get(campo) for campo in ('_id', *CAMPOS_ALUMNO)} for alumno in alumnos],
+        siguiente=siguiente
+    )
+
+
+@api.route('/alumnos/<int:alumno_id>')
+def obtener_alumno(alumno_id):
+    es_admin = requerir_sesion()
+    db = requerir_bd()
+    alumno = db.alumnos.find_one({'_id': alumno_id}, {**CAMPOS_ALUMNO, 'calificaciones': 1})
+    if alumno is None or (not es_admin and alumno.get('grupo') != session.get('grupo')):
+        raise ErrorApi("Alumno no encontrado", 404)
+    return jsonify(alumno)
+
+
+@api.route('/grupos/<grupo>/calificaciones/<trimestre>')
+def calificaciones_grupo(grupo, trimestre):
+    requerir_grupo(grupo)
+    requerir_trimestre(trimestre)
+
+    alumnos, siguiente = leer_pagina(requerir_bd(), {'grupo': grupo}, trimestre)
+    return jsonify(grupo=grupo, trimestre=trimestre, alumnos=alumnos, siguiente=siguiente)
+
+
+def validar_filas(db, grupo, trimestre, filas, materias_de_fila):
+    # Valida todas las filas y devuelve (filas válidas, errores, trimestre
+    # actual de cada alumno). Los errores de todas las filas se reportan
+    # juntos; si hay alguno no se escribe nada.
+    if not isinstance(filas, list) or not filas:
+        raise ErrorApi("Se esperaba una lista 'calificaciones' con al menos una fila", 400)
+
+    errores = []
+    validas = []
+    for indice, fila in enumerate(filas):
+        if not isinstance(fila, dict) or not isinstance(fila.get('alumno_id'), int):
+            errores.append({'fila': indice, 'errores': ["Falta 'alumno_id' numérico"]})
+            continue
+        materias = materias_de_fila(fila)
+        if not materias:
+            errores.append({'fila': indice, 'alumno_id': fila['alumno_id'], 'errores': ["La fila no tiene calificaciones"]})
+            continue
+        calificaciones, errores_fila = validar_calificaciones(fila, materias)
+        if errores_fila:
+            errores.append({'fila': indice, 'alumno_id': fila['alumno_id'], 'errores': errores_fila})
+        else:
+            validas.append((indice, fila['alumno_id'], calificaciones))
+
+    # Una sola consulta para comprobar que todos los alumnos son del grupo; de
+    # paso trae el trimestre actual para recalcular los promedios al escribir
+    ids = [alumno_id for _, alumno_id, _ in validas]
+    actuales = {
+        alumno['_id']: (alumno.get('calificaciones') or {}).get(trimestre)
+        for alumno in db.alumnos.find({'_id': {'$in': ids}, 'grupo': grupo}, {f'calificaciones.{trimestre}': 1})
+    }
+    for indice, alumno_id, _ in validas:
+        if alumno_id not in actuales:
+            errores.append({'fila': indice, 'alumno_id': alumno_id, 'errores': [f"El alumno no pertenece al grupo {grupo}"]})
+
+    return validas, sorted(errores, key=lambda error: error['fila']), actuales
+
+
+def escribir_calificaciones(db, grupo, trimestre, validas, actuales):
+    # Un update por alumno (las filas repetidas se combinan) que también
+    # guarda su promedio; promedios.py ajusta el resumen del grupo
+    cambios = {}
+    for _, alumno_id, calificaciones in validas:
+        cambios.setdefault(alumno_id, {}).update(calificaciones)
+    encontrados, modificados = promedios.escribir_calificaciones(db, grupo, trimestre, cambios, actuales)
+    if modificados:
+        invalidar_tablero()
+        invalidar_grupos(db, [grupo])
+    return {'filas': len(validas), 'encontrados': encontrados, 'modificados': modificados}
+
+
+@api.route('/grupos/<grupo>/calificaciones/<trimestre>', methods=['PUT'])
+def guardar_calificaciones_grupo(grupo, trimestre):
+    # Cuerpo: {"calificaciones": [{"alumno_id": 1, "matematicas": 8, ...}, ...]}
+    # Cada fila debe traer las cinco materias del trimestre.
+    requerir_grupo(grupo)
+    requerir_trimestre(trimestre)
+    cuerpo = request.get_json(silent=True) or {}
+    db = requerir_bd()
+
+    validas, errores, actuales = validar_filas(db, grupo, trimestre, cuerpo.get('calificaciones'), lambda fila: MATERIAS)
+    if errores:
+        raise ErrorApi("Hay filas con errores; no se guardó ninguna calificación", 422, errores)
+
+    return jsonify(escribir_calificaciones(db, grupo, trimestre, validas, actuales))
+
+
+@api.route('/grupos/<grupo>/calificaciones/<trimestre>', methods=['PATCH'])
+def guardar_cambios_grupo(grupo, trimestre):
+    # Guardado por lotes de la cuadrícula: cada fila trae solo las materias que
+    # cambiaron, p. ej. {"calificaciones": [{"alumno_id": 1, "ingles": 8}]}.
+    # Devuelve los promedios recalculados de los alumnos modificados.
+    requerir_grupo(grupo)
+    requerir_trimestre(trimestre)
+    cuerpo = request.get_json(silent=True) or {}
+    db = requerir_bd()
+
+    validas, errores, actuales = validar_filas(
+        db, grupo, trimestre, cuerpo.get('calificaciones'),
+        lambda fila: [materia for materia in MATERIAS if materia in fila]
+    )
+    if errores:
+        raise ErrorApi("Hay celdas con errores; no se guardó ninguna calificación", 422, errores)
+
+    resultado = escribir_calificaciones(db, grupo, trimestre, validas, actuales)
+    ids = [alumno_id for _, alumno_id, _ in validas]
+    resultado['promedios'] = {
+        str(alumno['_id']): alumno['promedio']
+        for alumno in alumnos_con_promedio(db, {'_id': {'$in': ids}, 'grupo': grupo}, trimestre)
+    }
+    return jsonify(resultado)
+
+
+@api.route('/trabajos')
+def listar_trabajos_api():
+    requerir_admin()
+    return jsonify(trabajos=[a_json(trabajo) for trabajo in listar_trabajos(requerir_bd())])
+
+
+@api.route('/trabajos', methods=['POST'])
+def encolar_trabajo():
+    # Cuerpo: {"tipo": "boletas" | "exportar" | "recalcular", "parametros": {...}}. Responde
+    # 202 de inmediato; el avance se consulta en /api/v1/trabajos/<id>
+    requerir_admin()
+    cuerpo = request.get_json(silent=True) or {}
+    tipo = cuerpo.get('tipo')
+    parametros = cuerpo.get('parametros') or {}
+    if tipo not in TAREAS or tipo == 'importar':
+        raise ErrorApi(f"Tipo de trabajo no válido: {tipo}", 400)
+    if tipo == 'boletas' and any(grupo not in GRUPOS for grupo in parametros.get('grupos') or []):
+        raise ErrorApi("Grupo desconocido en 'grupos'", 400)
+    if tipo == 'exportar':
+        requerir_trimestre(parametros.get('trimestre'))
+        if parametros.get('grupo') is not None and parametros['grupo'] not in GRUPOS:
+            raise ErrorApi(f"Grupo desconocido: {parametros['grupo']}", 404)
+        if parametros.get('formato') not in ('csv', 'xlsx'):
+            raise ErrorApi("'formato' debe ser csv o xlsx", 400)
+
+    db = requerir_bd()
+    trabajo = obtener_trabajo(db, encolar(db, tipo, parametros, session.get('usuario')))
+    return jsonify(a_json(trabajo)), 202, {'Location': f"/api/v1/trabajos/{trabajo['_id']}"}
+
+
+@api.route('/trabajos/<trabajo_id>')
+def estado_trabajo(trabajo_id):
+    requerir_admin()
+    trabajo = obtener_trabajo(requerir_bd(), trabajo_id)
+    if trabajo is None:
+        raise ErrorApi("Trabajo no encontrado", 404)
+    return jsonify(a_json(trabajo))
+
+
+@api.route('/trabajos/<trabajo_id>/cancelar', methods=['POST'])
+def cancelar_trabajo_api(trabajo_id):
+    requerir_admin()
+    trabajo = cancelar_trabajo(requerir_bd(), trabajo_id)
+    if trabajo is None:
+        raise ErrorApi("Trabajo no encontrado", 404)
+    return jsonify(a_json(trabajo))
+
+
+@api.route('/cache')
+def estadisticas_cache():
+    # Aciertos y fallos de la caché de grupos de este worker (cada proceso
+    # tiene la suya), para ajustar CACHE_GRUPOS_TAMANO y CACHE_GRUPOS_TTL
+    requerir_admin()
+    return jsonify(cache.estadisticas())
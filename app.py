@@ -1,75 +1,196 @@
-from flask import Flask, request, redirect, session, jsonify, send_from_directory
-from pymongo import MongoClient
-from datetime import datetime
+from flask import Flask, Response, abort, request, redirect, render_template, session, jsonify, send_from_directory, stream_with_context, url_for, get_template_attribute, make_response, has_request_context
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
+from werkzeug.middleware.proxy_fix import ProxyFix
+import hashlib
+import io
 import os
-import bcrypt
 
-app = Flask(__name__, template_folder='.', static_folder='static')
+from api import api
+from boletas import ErrorBoletas, boleta_pdf, generar_zip, nombre_seguro, verificar_reportlab
+from cache_grupos import cache, invalidar_grupos, oyentes_invalidacion, pagina_grupo
+from compresion import comprimir_respuesta, variantes_etag
+import contrasenas
+from database import conectar_bd, en_paralelo, reiniciar_cliente
+from escuela import GRUPOS, ICONOS_MATERIAS, MATERIAS, NOMBRES_MATERIAS, TRIMESTRES, nombre_trimestre, nuevo_alumno, validar_calificaciones
+from estadisticas import invalidar_tablero, obtener_tablero, resumen_grupo
+from exportacion import FORMATOS, ErrorExportacion, exportar, nombre_archivo
+from importacion import ErrorImportacion, importar_alumnos, plantilla_csv
+import metricas
+from paginacion import CursorInvalido, agrupar_por_grupo, pagina_alumnos, tamano_pagina
+import promedios
+from secuencias import siguiente_id
+from sesiones import instalar as instalar_sesiones, renovar_id
+from trabajos import SIN_WORKER, encolar, esperando_worker, guardar_entrada, leer_resultado, listar_trabajos, obtener_trabajo
+
+# Los estáticos los sirve serve_static() (con caché según la huella), no la ruta automática de Flask
+app = Flask(__name__, template_folder='templates', static_folder=None)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'Kaliuserfr_2024_Escuela_20Nov_Sistema_Calif!@#$%^&*()')
+# Detrás del proxy de Railway la IP real del cliente llega en X-Forwarded-For
+# (se usa para limitar intentos de inicio de sesión por IP)
+PROXIES_CONFIABLES = int(os.environ.get('PROXIES_CONFIABLES', 1))
+if PROXIES_CONFIABLES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXIES_CONFIABLES)
+app.register_blueprint(api)
+app.after_request(comprimir_respuesta)
+instalar_sesiones(app)
+metricas.instalar(app)
+
+# Lectura de lo propio: la versión de cada grupo que escribe un usuario se
+# guarda en su sesión (compartida entre workers); el worker que atienda su
+# siguiente petición relee las versiones si las que conoce son anteriores, en
+# lugar de servir la lista en caché hasta CACHE_GRUPOS_SINCRONIZAR segundos
+def recordar_versiones(versiones):
+    if not has_request_context() or not session.get('logueado'):
+        return
+    escritas = dict(session.get('versiones_escritas') or {})
+    for grupo, version in versiones.items():
+        escritas[grupo] = max(version, escritas.get(grupo, 0))
+    session['versiones_escritas'] = escritas
+
+oyentes_invalidacion.append(recordar_versiones)
+
+@app.before_request
+def ver_lo_escrito():
+    escritas = session.get('versiones_escritas')
+    if escritas:
+        db = conectar_bd()
+        if db is not None:
+            cache.exigir_versiones(db, escritas)
+
+# Plantillas Jinja2 (con autoescape). Se compilan una vez al importar la app;
+# fuera del modo debug Flask no vuelve a revisarlas en disco
+PLANTILLAS = ['login.html', 'seleccionar_trimestre.html', 'calificaciones.html', 'reportes.html', 'admin.html', 'importacion.html', 'trabajos.html']
+app.jinja_env.trim_blocks = True
+app.jinja_env.lstrip_blocks = True
+app.jinja_env.globals.update(
+    grupos=GRUPOS,
+    trimestres=TRIMESTRES,
+    materias=[(materia, NOMBRES_MATERIAS[materia]) for materia in MATERIAS],
+    iconos=ICONOS_MATERIAS
+)
+for plantilla in PLANTILLAS:
+    app.jinja_env.get_template(plantilla)
+
+# La tabla de todos los alumnos (admin) se envía en flujo: el cursor se lee por
+# lotes y las filas salen hacia el cliente conforme se generan
+FLUJO_ADMIN = os.environ.get('CALIFICACIONES_EN_FLUJO', '1') == '1'
+TAMANO_LOTE = int(os.environ.get('MONGO_TAMANO_LOTE', 200))
+TAMANO_BUFFER_FLUJO = int(os.environ.get('TAMANO_BUFFER_FLUJO', 50))
+
+def url_pagina(despues):
+    # Misma URL con otro cursor de paginación (None vuelve a la primera página)
+    parametros = request.args.to_dict()
+    parametros.pop('formato', None)
+    parametros.pop('despues', None)
+    if despues:
+        parametros['despues'] = despues
+    return url_for(request.endpoint, **parametros)
+
+app.jinja_env.globals['url_pagina'] = url_pagina
+
+# Archivos estáticos con huella: las plantillas los piden como
+# /static/css.css?v=<hash del contenido> y esas URLs se cachean un año
+# (immutable); al cambiar el archivo cambia la URL
+def calcular_huellas(carpeta):
+    huellas = {}
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            with open(ruta, 'rb') as archivo:
+                huellas[os.path.relpath(ruta, carpeta).replace(os.sep, '/')] = hashlib.sha1(archivo.read()).hexdigest()[:12]
+    return huellas
+
+HUELLAS_ESTATICOS = calcular_huellas(os.path.join(app.root_path, 'static'))
+# Cambia con cada despliegue que toque plantillas o estáticos; forma parte de los ETag
+VERSION_PAGINAS = hashlib.sha1(repr(sorted({
+    **HUELLAS_ESTATICOS, **{f'plantillas/{nombre}': huella for nombre, huella in calcular_huellas(os.path.join(app.root_path, app.template_folder)).items()}
+}.items())).encode()).hexdigest()[:12]
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+def estatico(nombre):
+    huella = HUELLAS_ESTATICOS.get(nombre)
+    return f'/static/{nombre}?v={huella}' if huella else f'/static/{nombre}'
+
+app.jinja_env.globals['estatico'] = estatico
+
+def con_cache_estatico(respuesta, nombre):
+    # Solo la URL con la huella vigente es inmutable; el resto se revalida
+    if request.args.get('v') and request.args.get('v') == HUELLAS_ESTATICOS.get(nombre):
+        respuesta.headers['Cache-Control'] = CACHE_INMUTABLE
+    else:
+        respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+# Páginas de un solo grupo (reportes y la vista del maestro): el ETag sale de
+# la versión del grupo en versiones_grupos, que cambia con cada escritura. Se
+# lee de la copia en memoria de cache_grupos, así que un 304 no consulta MongoDB
+def etiqueta_grupo(db, grupo):
+    version, actualizado = cache.version(db, grupo)
+    partes = [VERSION_PAGINAS, grupo, version, session.get('usuario'), session.get('rol'), request.full_path]
+    return hashlib.sha1(repr(partes).encode()).hexdigest(), actualizado
+
+def sin_cambios(etiqueta):
+    # Respuesta 304 si el navegador ya tiene esta versión de la página (en
+    # cualquiera de sus codificaciones, ver compresion.py)
+    etag, actualizado = etiqueta
+    for variante in variantes_etag(etag):
+        if request.if_none_match.contains(variante):
+            return con_etiqueta(Response(status=304), (variante, actualizado))
+    return None
+
+def con_etiqueta(respuesta, etiqueta):
+    # El navegador guarda la página solo para esta sesión y siempre la revalida
+    etag, actualizado = etiqueta
+    respuesta = make_response(respuesta)
+    respuesta.set_etag(etag)
+    if actualizado:
+        respuesta.last_modified = actualizado
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    respuesta.vary.add('Cookie')
+    return respuesta
+
+def respuesta_json_pagina(pagina, macro, *argumentos, **extra):
+    # Variante JSON de una página: los datos y las filas ya renderizadas
+    fila = get_template_attribute('_macros.html', macro)
+    alumnos = list(pagina)
+    return jsonify(
+        alumnos=alumnos,
+        html=''.join(str(fila(alumno, *argumentos)) for alumno in alumnos),
+        siguiente=pagina.siguiente,
+        **extra
+    )
+
+def render_en_flujo(plantilla, **contexto):
+    # Equivalente a render_template() pero sin armar la página completa en memoria
+    app.update_template_context(contexto)
+    flujo = app.jinja_env.get_template(plantilla).stream(contexto)
+    flujo.enable_buffering(TAMANO_BUFFER_FLUJO)
+    return Response(stream_with_context(flujo), mimetype='text/html')
 
 # RUTA ESTÁTICA PARA SERVIR ARCHIVOS CSS, JS, IMÁGENES, ETC.
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    return send_from_directory('static', filename)
+    return con_cache_estatico(send_from_directory('static', filename), filename)
 
 # También crear una ruta específica para CSS por si acaso
 @app.route('/css.css')
 def serve_css():
-    return send_from_directory('static', 'css.css')
+    return con_cache_estatico(send_from_directory('static', 'css.css'), 'css.css')
 
-def conectar_bd():
-    try:
-        # Obtener URI de MongoDB desde variables de entorno de Railway
-        # Railway usa MONGO_URL o MONGODB_URI
-        mongo_uri = os.environ.get('MONGO_URL') or os.environ.get('MONGODB_URI') or 'mongodb://localhost:27017/'
-        
-        # Conectar con timeout para Railway
-        cliente = MongoClient(mongo_uri, serverSelectionTimeoutMS=10000)
-        db = cliente['sistema_calificaciones']
-        
-        # Verificar conexión (pero no fallar si no hay)
-        try:
-            cliente.server_info()
-            print(f"✅ Conectado a MongoDB")
-        except:
-            print("⚠️  MongoDB: Conectado pero no se pudo verificar servidor")
-        
-        return db
-    except Exception as e:
-        print(f"⚠️  Error de conexión inicial a MongoDB: {e}")
-        print("ℹ️  Se intentará reconectar cuando sea necesario")
-        # No retornar None inmediatamente, intentar crear cliente básico
-        try:
-            cliente = MongoClient(mongo_uri, connect=False)
-            db = cliente['sistema_calificaciones']
-            return db
-        except:
-            return None
+@app.errorhandler(ConnectionFailure)
+def error_conexion_bd(error):
+    print(f"⚠️  MongoDB no disponible: {error}")
+    reiniciar_cliente()
+    agregar_mensaje("⚠️ No se pudo conectar con la base de datos, intenta de nuevo", 'danger')
+    return redirect('/')
 
 def obtener_proximo_id(coleccion):
+    # Incremento atómico en la colección contadores: sin carreras entre admins
     db = conectar_bd()
     if db is not None:
-        ultimo = db[coleccion].find_one(sort=[("_id", -1)])
-        return 1 if not ultimo else ultimo['_id'] + 1
+        return siguiente_id(db, coleccion)
     return 1
 
-def calcular_promedio(calificaciones_trimestre):
-    materias = ['matematicas', 'espanol', 'ingles', 'ciencias', 'formacion']
-    suma = sum(float(calificaciones_trimestre.get(materia, 0)) for materia in materias)
-    return round(suma / len(materias), 2)
-
-def verificar_password(password, hash_password, es_admin=False):
-    try:
-        if es_admin:
-            if isinstance(hash_password, str):
-                hash_password = hash_password.encode('utf-8')
-            return bcrypt.checkpw(password.encode('utf-8'), hash_password)
-        else:
-            return password == hash_password
-    except Exception as e:
-        print(f"❌ Error verificando password: {e}")
-        return False
-
 def agregar_mensaje(mensaje, tipo='success'):
     if 'mensajes' not in session:
         session['mensajes'] = []
@@ -77,54 +198,15 @@ def agregar_mensaje(mensaje, tipo='success'):
     session.modified = True
 
 def obtener_mensajes():
-    mensajes = session.get('mensajes', [])
-    session['mensajes'] = []
-    session.modified = True
-    return mensajes
+    # Solo modifica la sesión si había mensajes: leerla no provoca escrituras
+    if not session.get('mensajes'):
+        return []
+    return session.pop('mensajes')
 
 # Página de Login
 @app.route('/')
 def login():
-    html = '''
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Login - Sistema de Calificaciones</title>
-        <link rel="stylesheet" href="/static/css.css">
-    </head>
-    <body>
-        <div class="login-container">
-            <div class="login-box">
-                <div class="login-header">
-                    <h1>🏫 Sistema de Calificaciones</h1>
-                    <p>Escuela "20 de noviembre"</p>
-                </div>
-                <form action="/iniciar_sesion" method="POST" class="student-form">
-                    <input type="text" name="usuario" placeholder="Usuario" required>
-                    <input type="password" name="password" placeholder="Contraseña" required>
-                    <button type="submit" class="btn btn-primary">Ingresar al Sistema</button>
-                </form>
-                <div style="margin-top: 1rem; text-align: center; font-size: 0.9rem;">
-                    <p><strong>Credenciales de prueba:</strong></p>
-                    <p>Admin: <code>admin</code> | Contraseña: <code>AdminSeguro2025!</code></p>
-                    <p>Maestro 1°A: <code>m1a</code> | Contraseña: <code>1234</code></p>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
-    
-    mensajes_html = ""
-    for mensaje in obtener_mensajes():
-        mensajes_html += f'<div class="alert alert-{mensaje["tipo"]}">{mensaje["texto"]}</div>'
-    
-    if mensajes_html:
-        html = html.replace('<form action=', f'{mensajes_html}<form action=')
-    
-    return html
+    return render_template('login.html', mensajes=obtener_mensajes())
 
 @app.route('/iniciar_sesion', methods=['POST'])
 def iniciar_sesion():
@@ -133,26 +215,48 @@ def iniciar_sesion():
     
     db = conectar_bd()
     if db is not None:
+        # Los usuarios o IPs con demasiados fallos se rechazan antes de calcular ningún hash
+        ip = request.remote_addr or ''
+        minutos = contrasenas.minutos_bloqueado(db, usuario, ip)
+        if minutos:
+            print(f"⚠️  Inicio de sesión bloqueado: {usuario} desde {ip}")
+            agregar_mensaje(f"❌ Demasiados intentos fallidos, espera {minutos} min e intenta de nuevo", 'danger')
+            return redirect('/')
+        
         maestro = db.maestros.find_one({'usuario': usuario, 'activo': True})
-        if maestro:
-            es_admin = maestro.get('rol') == 'admin'
-            if verificar_password(password, maestro['password'], es_admin):
-                session['usuario'] = usuario
-                session['logueado'] = True
-                session['maestro_id'] = maestro['_id']
-                session['maestro_nombre'] = maestro['nombre']
-                session['grupo'] = maestro['grupo']
-                session['grado'] = maestro['grado']
-                session['rol'] = maestro.get('rol', 'maestro')
-                
-                if es_admin:
-                    agregar_mensaje(f"✅ Sesión de administrador iniciada correctamente", 'success')
-                    return redirect('/admin')
-                else:
-                    agregar_mensaje(f"✅ Sesión iniciada correctamente - {maestro['nombre']} ({maestro['grupo']})", 'success')
-                    return redirect('/seleccionar_trimestre')
-        else:
+        if not maestro:
             print(f"❌ Usuario no encontrado: {usuario}")
+        
+        # bcrypt corre en el pool de contrasenas.py, no en el hilo de la petición
+        try:
+            valida, rehash = contrasenas.verificar_en_pool(password, maestro['password'] if maestro else None)
+        except contrasenas.ServidorOcupado:
+            agregar_mensaje("⚠️ Hay muchos inicios de sesión en este momento, intenta de nuevo en unos segundos", 'danger')
+            return redirect('/')
+        
+        if valida:
+            contrasenas.limpiar_fallos(db, usuario)
+            if rehash:
+                contrasenas.actualizar_hash(db, maestro['_id'], password)
+            
+            es_admin = maestro.get('rol') == 'admin'
+            renovar_id(session)
+            session['usuario'] = usuario
+            session['logueado'] = True
+            session['maestro_id'] = maestro['_id']
+            session['maestro_nombre'] = maestro['nombre']
+            session['grupo'] = maestro['grupo']
+            session['grado'] = maestro['grado']
+            session['rol'] = maestro.get('rol', 'maestro')
+            
+            if es_admin:
+                agregar_mensaje(f"✅ Sesión de administrador iniciada correctamente", 'success')
+                return redirect('/admin')
+            else:
+                agregar_mensaje(f"✅ Sesión iniciada correctamente - {maestro['nombre']} ({maestro['grupo']})", 'success')
+                return redirect('/seleccionar_trimestre')
+        
+        contrasenas.registrar_fallo(db, usuario, ip)
     
     agregar_mensaje("❌ Usuario o contraseña incorrectos", 'danger')
     return redirect('/')
@@ -163,528 +267,105 @@ def seleccionar_trimestre():
     if not session.get('logueado') or session.get('rol') == 'admin':
         return redirect('/')
     
-    html = f'''
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Seleccionar Trimestre</title>
-        <link rel="stylesheet" href="/static/css.css">
-    </head>
-    <body>
-        <div class="login-container">
-            <div class="login-box" style="max-width: 500px;">
-                <div class="login-header">
-                    <h1>📅 Seleccionar Trimestre</h1>
-                    <p>Grupo: {session.get('grupo')}</p>
-                    <p>Maestro: {session.get('maestro_nombre')}</p>
-                </div>
-                
-                <div class="trimestre-options">
-                    <a href="/calificaciones?trimestre=primer_trimestre" class="trimestre-card">
-                        <div class="trimestre-icon">1️⃣</div>
-                        <h3>Primer Trimestre</h3>
-                        <p>Agosto - Noviembre</p>
-                    </a>
-                    
-                    <a href="/calificaciones?trimestre=segundo_trimestre" class="trimestre-card">
-                        <div class="trimestre-icon">2️⃣</div>
-                        <h3>Segundo Trimestre</h3>
-                        <p>Diciembre - Marzo</p>
-                    </a>
-                    
-                    <a href="/calificaciones?trimestre=tercer_trimestre" class="trimestre-card">
-                        <div class="trimestre-icon">3️⃣</div>
-                        <h3>Tercer Trimestre</h3>
-                        <p>Abril - Julio</p>
-                    </a>
-                </div>
-                
-                <div style="margin-top: 2rem; text-align: center;">
-                    <a href="/cerrar_sesion" class="btn btn-danger">🚪 Cerrar Sesión</a>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
-    return html
+    return render_template('seleccionar_trimestre.html')
 
 @app.route('/calificaciones')
 def ver_calificaciones():
     if not session.get('logueado'):
         return redirect('/')
     
-    # Obtener trimestre seleccionado
+    # Obtener trimestre seleccionado; se valida antes de guardarlo en la
+    # sesión y de usarlo en consultas y llaves de caché
     trimestre_seleccionado = request.args.get('trimestre', 'primer_trimestre')
-    session['trimestre_actual'] = trimestre_seleccionado
+    if trimestre_seleccionado not in TRIMESTRES:
+        abort(400, description="Trimestre no válido")
+    if session.get('trimestre_actual') != trimestre_seleccionado:
+        session['trimestre_actual'] = trimestre_seleccionado
     
     grupo_maestro = session.get('grupo')
     es_admin = session.get('rol') == 'admin'
     
+    filtro = {} if es_admin else {'grupo': grupo_maestro}
+    formato_json = request.args.get('formato') == 'json'
+    en_flujo = es_admin and FLUJO_ADMIN and not formato_json
+    # Modo cuadrícula (maestros): celdas editables con guardado automático por lotes
+    modo_cuadricula = not es_admin and request.args.get('modo') == 'cuadricula'
+    
     db = conectar_bd()
     alumnos = []
+    total_alumnos = 0
+    etiqueta = None
     if db is not None:
+        # Vista del maestro: si el grupo no cambió desde la copia del
+        # navegador se responde 304 (salvo que haya mensajes pendientes)
+        if not es_admin and not session.get('mensajes'):
+            etiqueta = etiqueta_grupo(db, grupo_maestro)
+            respuesta = sin_cambios(etiqueta)
+            if respuesta:
+                return respuesta
+        
+        # Una página por llave (grupo, apellidos, nombre) recorriendo el índice
+        # único; el promedio se calcula en MongoDB y solo viajan las columnas
+        # La lista de un solo grupo sale de la caché por worker (cache_grupos.py)
+        try:
+            if es_admin:
+                alumnos = pagina_alumnos(
+                    db, filtro, trimestre_seleccionado,
+                    despues=request.args.get('despues'),
+                    limite=tamano_pagina(request.args.get('limite')),
+                    tamano_lote=TAMANO_LOTE
+                )
+            else:
+                alumnos = pagina_grupo(
+                    db, grupo_maestro, trimestre_seleccionado,
+                    despues=request.args.get('despues'),
+                    limite=tamano_pagina(request.args.get('limite'))
+                )
+        except CursorInvalido:
+            agregar_mensaje("❌ La página solicitada no es válida", 'danger')
+            return redirect('/calificaciones?trimestre=' + trimestre_seleccionado)
+        
         if es_admin:
-            alumnos = list(db.alumnos.find().sort('grupo', 1).sort('apellidos', 1))
+            total_alumnos = db.alumnos.estimated_document_count()
         else:
-            alumnos = list(db.alumnos.find({'grupo': grupo_maestro}).sort('apellidos', 1))
+            total_alumnos = len(cache.obtener(db, grupo_maestro, trimestre_seleccionado))
+        
+        if formato_json:
+            if modo_cuadricula:
+                respuesta = respuesta_json_pagina(alumnos, 'fila_cuadricula', total=total_alumnos)
+            else:
+                respuesta = respuesta_json_pagina(alumnos, 'fila_alumno', es_admin, total=total_alumnos)
+            return con_etiqueta(respuesta, etiqueta) if etiqueta else respuesta
     
     titulo_grupo = "Todos los Grupos (Admin)" if es_admin else grupo_maestro
-    nombre_trimestre = trimestre_seleccionado.replace('_', ' ').title()
     
-    # Obtener información del maestro para mostrar
-    maestro_info = ""
+    # Información del maestro para mostrar en el encabezado
     if not es_admin:
-        # Para maestro normal, usar la información de la sesión
         maestro_info = f'👨‍🏫 {session.get("maestro_nombre")}'
     else:
-        # Para admin, mostrar que es administrador
         maestro_info = '👨‍💼 Administrador del Sistema'
     
-    html = f'''
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Gestión de Calificaciones</title>
-        <link rel="stylesheet" href="/static/css.css">
-    </head>
-    <body>
-        <div class="container">
-            <header>
-                <h1>🏫 Calificaciones - {titulo_grupo}</h1>
-                <div class="header-info">
-                    <div class="info-card">
-                        <span class="info-label">📅 Trimestre:</span>
-                        <span class="info-value">{nombre_trimestre}</span>
-                    </div>
-                    <div class="info-card">
-                        <span class="info-label">👨‍🏫 Maestro:</span>
-                        <span class="info-value">{maestro_info}</span>
-                    </div>
-                    <div class="info-card">
-                        <span class="info-label">👥 Grupo:</span>
-                        <span class="info-value">{grupo_maestro if grupo_maestro != "Todos" else "Todos los grupos"}</span>
-                    </div>
-                </div>
-                <nav>
-                    <a href="/calificaciones?trimestre={trimestre_seleccionado}" class="btn">📝 Calificaciones</a>
-                    <a href="/reportes" class="btn">📊 Reportes</a>
-                    {'<a href="/admin" class="btn">👨‍💼 Admin</a>' if es_admin else ''}
-                    {'<a href="/seleccionar_trimestre" class="btn">📅 Cambiar Trimestre</a>' if not es_admin else ''}
-                    <a href="/cerrar_sesion" class="btn btn-danger">🚪 Cerrar Sesión</a>
-                </nav>
-            </header>
-
-            <main>
-    '''
-    
-    mensajes_html = ""
-    for mensaje in obtener_mensajes():
-        mensajes_html += f'<div class="alert alert-{mensaje["tipo"]}">{mensaje["texto"]}</div>'
-    
-    html += mensajes_html
-    
-    if es_admin:
-        html += f'''
-                <section class="form-section">
-                    <h2>👥 Gestión de Alumnos - {grupo_maestro if grupo_maestro != "Todos" else "Todos los Grupos"}</h2>
-                    <form action="/agregar_alumno" method="POST" class="student-form">
-                        <input type="text" name="nombre" placeholder="Nombre del Alumno" required>
-                        <input type="text" name="apellidos" placeholder="Apellidos del Alumno" required>
-                        <select name="grupo" required>
-                            <option value="">Selecciona grupo</option>
-                            <option value="1°A">1°A</option>
-                            <option value="1°B">1°B</option>
-                            <option value="1°C">1°C</option>
-                            <option value="2°A">2°A</option>
-                            <option value="2°B">2°B</option>
-                            <option value="2°C">2°C</option>
-                            <option value="3°A">3°A</option>
-                            <option value="3°B">3°B</option>
-                            <option value="3°C">3°C</option>
-                            <option value="4°A">4°A</option>
-                            <option value="4°B">4°B</option>
-                            <option value="4°C">4°C</option>
-                            <option value="5°A">5°A</option>
-                            <option value="5°B">5°B</option>
-                            <option value="5°C">5°C</option>
-                            <option value="6°A">6°A</option>
-                            <option value="6°B">6°B</option>
-                            <option value="6°C">6°C</option>
-                        </select>
-                        <button type="submit" class="btn btn-primary">➕ Agregar Alumno</button>
-                    </form>
-                </section>
-        '''
-    else:
-        html += f'''
-                <section class="form-section">
-                    <div class="alert alert-info">
-                        <strong>📅 Trimestre Actual:</strong> {nombre_trimestre} | 
-                        <strong>👨‍🏫 Maestro:</strong> {session.get('maestro_nombre')} | 
-                        <strong>👥 Grupo:</strong> {grupo_maestro}
-                    </div>
-                </section>
-        '''
-    
-    html += f'''
-                <section class="list-section">
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1rem;">
-                        <h2>📊 Calificaciones - {nombre_trimestre} (Total: {len(alumnos)})</h2>
-                    </div>
-                    <div class="table-container">
-                        <table>
-                            <thead>
-                                <tr>
-                                    {'<th>Grupo</th>' if es_admin else ''}
-                                    <th>Alumno</th>
-                                    <th>Matemáticas</th>
-                                    <th>Español</th>
-                                    <th>Inglés</th>
-                                    <th>Ciencias</th>
-                                    <th>Formación Cívica</th>
-                                    <th>Promedio</th>
-                                    {'<th>Acciones</th>' if es_admin else ''}
-                                </tr>
-                            </thead>
-                            <tbody>
-    '''
-    
-    if alumnos:
-        for alumno in alumnos:
-            calificaciones = alumno['calificaciones'].get(trimestre_seleccionado, {})
-            promedio = calcular_promedio(calificaciones)
-            
-            html += f'''
-                                <tr class="fila-alumno" data-alumno-id="{alumno['_id']}">
-                                    {'<td>' + alumno['grupo'] + '</td>' if es_admin else ''}
-                                    <td>{alumno['nombre']} {alumno['apellidos']}</td>
-                                    <td>{calificaciones.get('matematicas', 'N/A')}</td>
-                                    <td>{calificaciones.get('espanol', 'N/A')}</td>
-                                    <td>{calificaciones.get('ingles', 'N/A')}</td>
-                                    <td>{calificaciones.get('ciencias', 'N/A')}</td>
-                                    <td>{calificaciones.get('formacion', 'N/A')}</td>
-                                    <td><strong>{promedio if promedio > 0 else 'N/A'}</strong></td>
-            '''
-            
-            if es_admin:
-                html += f'''
-                                    <td>
-                                        <button class="btn btn-warning btn-sm" onclick="abrirModalAdmin({alumno['_id']}, '{alumno['nombre']}', '{alumno['apellidos']}', '{alumno['grupo']}', {calificaciones.get('matematicas', 0)}, {calificaciones.get('espanol', 0)}, {calificaciones.get('ingles', 0)}, {calificaciones.get('ciencias', 0)}, {calificaciones.get('formacion', 0)})">✏️ Modificar</button>
-                                        <form action="/eliminar_alumno/{alumno['_id']}" method="POST" style="display: inline;">
-                                            <button type="submit" class="btn btn-danger btn-sm" onclick="return confirm('¿Estás seguro de eliminar a {alumno['nombre']} {alumno['apellidos']}?')">🗑️ Eliminar</button>
-                                        </form>
-                                    </td>
-                '''
-            else:
-                html += f'''
-                                    <td style="position: relative;">
-                                        <div class="hover-actions">
-                                            <button class="btn btn-warning btn-sm" onclick="abrirModalMaestro({alumno['_id']}, {calificaciones.get('matematicas', 0)}, {calificaciones.get('espanol', 0)}, {calificaciones.get('ingles', 0)}, {calificaciones.get('ciencias', 0)}, {calificaciones.get('formacion', 0)})">✏️ Modificar Calificaciones</button>
-                                        </div>
-                                    </td>
-                '''
-            
-            html += '</tr>'
-    else:
-        html += '''
-                                <tr>
-                                    <td colspan="8" class="no-data">No hay alumnos registrados</td>
-                                </tr>
-        '''
-    
-    html += '''
-                            </tbody>
-                        </table>
-                    </div>
-                </section>
-            </main>
-        </div>
-    '''
-    
-    if es_admin:
-        html += '''
-        <!-- Modal para Admin -->
-        <div id="modalAdmin" class="modal">
-            <div class="modal-content">
-                <div class="modal-header">
-                    <h2>✏️ Modificar Alumno y Calificaciones</h2>
-                    <span class="close">&times;</span>
-                </div>
-                <form id="formModificarAdmin" method="POST" class="student-form">
-                    <input type="hidden" id="admin_alumno_id" name="alumno_id">
-                    
-                    <div class="form-group">
-                        <label for="admin_nombre">Nombre:</label>
-                        <input type="text" id="admin_nombre" name="nombre" placeholder="Nombre del alumno" required>
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="admin_apellidos">Apellidos:</label>
-                        <input type="text" id="admin_apellidos" name="apellidos" placeholder="Apellidos del alumno" required>
-                    </div>
-                    
-                    <div class="form-group">
-                        <label for="admin_grupo">Grupo:</label>
-                        <select id="admin_grupo" name="grupo" required>
-                            <option value="">Selecciona grupo</option>
-                            <option value="1°A">1°A</option>
-                            <option value="1°B">1°B</option>
-                            <option value="1°C">1°C</option>
-                            <option value="2°A">2°A</option>
-                            <option value="2°B">2°B</option>
-                            <option value="2°C">2°C</option>
-                            <option value="3°A">3°A</option>
-                            <option value="3°B">3°B</option>
-                            <option value="3°C">3°C</option>
-                            <option value="4°A">4°A</option>
-                            <option value="4°B">4°B</option>
-                            <option value="4°C">4°C</option>
-                            <option value="5°A">5°A</option>
-                            <option value="5°B">5°B</option>
-                            <option value="5°C">5°C</option>
-                            <option value="6°A">6°A</option>
-                            <option value="6°B">6°B</option>
-                            <option value="6°C">6°C</option>
-                        </select>
-                    </div>
-                    
-                    <h3 style="grid-column: 1 / -1; margin-top: 1rem;">📚 Calificaciones (5-10)</h3>
-                    
-                    <div class="materia-group">
-                        <label for="admin_matematicas">🔢 Matemáticas:</label>
-                        <input type="number" id="admin_matematicas" name="matematicas" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="materia-group">
-                        <label for="admin_espanol">📚 Español:</label>
-                        <input type="number" id="admin_espanol" name="espanol" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="materia-group">
-                        <label for="admin_ingles">🌐 Inglés:</label>
-                        <input type="number" id="admin_ingles" name="ingles" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="materia-group">
-                        <label for="admin_ciencias">🔬 Ciencias:</label>
-                        <input type="number" id="admin_ciencias" name="ciencias" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="materia-group">
-                        <label for="admin_formacion">⭐ Formación Cívica:</label>
-                        <input type="number" id="admin_formacion" name="formacion" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="modal-actions">
-                        <button type="button" class="btn btn-secondary" onclick="cerrarModalAdmin()">Cancelar</button>
-                        <button type="submit" class="btn btn-primary">Guardar Cambios</button>
-                    </div>
-                </form>
-            </div>
-        </div>
-        '''
-    else:
-        html += f'''
-        <!-- Modal para Maestro -->
-        <div id="modalMaestro" class="modal">
-            <div class="modal-content">
-                <div class="modal-header">
-                    <h2>✏️ Modificar Calificaciones - {nombre_trimestre}</h2>
-                    <span class="close">&times;</span>
-                </div>
-                <form id="formModificarMaestro" method="POST" class="student-form">
-                    <input type="hidden" id="maestro_alumno_id" name="alumno_id">
-                    <input type="hidden" name="trimestre" value="{trimestre_seleccionado}">
-                    
-                    <h3 style="grid-column: 1 / -1; margin-bottom: 1rem;">📚 Calificaciones (5-10)</h3>
-                    
-                    <div class="materia-group">
-                        <label for="maestro_matematicas">🔢 Matemáticas:</label>
-                        <input type="number" id="maestro_matematicas" name="matematicas" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="materia-group">
-                        <label for="maestro_espanol">📚 Español:</label>
-                        <input type="number" id="maestro_espanol" name="espanol" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="materia-group">
-                        <label for="maestro_ingles">🌐 Inglés:</label>
-                        <input type="number" id="maestro_ingles" name="ingles" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="materia-group">
-                        <label for="maestro_ciencias">🔬 Ciencias:</label>
-                        <input type="number" id="maestro_ciencias" name="ciencias" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="materia-group">
-                        <label for="maestro_formacion">⭐ Formación Cívica:</label>
-                        <input type="number" id="maestro_formacion" name="formacion" min="5" max="10" step="0.1" required>
-                    </div>
-                    
-                    <div class="modal-actions">
-                        <button type="button" class="btn btn-secondary" onclick="cerrarModalMaestro()">Cancelar</button>
-                        <button type="submit" class="btn btn-primary">Guardar Calificaciones</button>
-                    </div>
-                </form>
-            </div>
-        </div>
-        '''
-    
-    html += '''
-        <script>
-            // Funciones para modales de Admin
-            function abrirModalAdmin(id, nombre, apellidos, grupo, matematicas, espanol, ingles, ciencias, formacion) {
-                document.getElementById("admin_alumno_id").value = id;
-                document.getElementById("admin_nombre").value = nombre;
-                document.getElementById("admin_apellidos").value = apellidos;
-                document.getElementById("admin_grupo").value = grupo;
-                document.getElementById("admin_matematicas").value = matematicas;
-                document.getElementById("admin_espanol").value = espanol;
-                document.getElementById("admin_ingles").value = ingles;
-                document.getElementById("admin_ciencias").value = ciencias;
-                document.getElementById("admin_formacion").value = formacion;
-                
-                document.getElementById("formModificarAdmin").action = `/modificar_alumno/` + id;
-                document.getElementById("modalAdmin").style.display = "block";
-            }
-
-            function cerrarModalAdmin() {
-                document.getElementById("modalAdmin").style.display = "none";
-            }
-
-            // Funciones para modales de Maestro
-            function abrirModalMaestro(id, matematicas, espanol, ingles, ciencias, formacion) {
-                document.getElementById("maestro_alumno_id").value = id;
-                document.getElementById("maestro_matematicas").value = matematicas;
-                document.getElementById("maestro_espanol").value = espanol;
-                document.getElementById("maestro_ingles").value = ingles;
-                document.getElementById("maestro_ciencias").value = ciencias;
-                document.getElementById("maestro_formacion").value = formacion;
-                
-                document.getElementById("formModificarMaestro").action = `/modificar_calificaciones/` + id;
-                document.getElementById("modalMaestro").style.display = "block";
-            }
-
-            function cerrarModalMaestro() {
-                document.getElementById("modalMaestro").style.display = "none";
-            }
-
-            // Cerrar modales
-            document.querySelectorAll('.close').forEach(closeBtn => {
-                closeBtn.onclick = function() {
-                    document.querySelectorAll('.modal').forEach(modal => {
-                        modal.style.display = "none";
-                    });
-                }
-            });
-
-            window.onclick = function(event) {
-                document.querySelectorAll('.modal').forEach(modal => {
-                    if (event.target == modal) {
-                        modal.style.display = "none";
-                    }
-                });
-            }
-
-            // Hover effects para filas de alumnos (maestros)
-            document.querySelectorAll('.fila-alumno').forEach(fila => {
-                fila.addEventListener('mouseenter', function() {
-                    this.style.backgroundColor = '#f8f9fa';
-                    this.style.cursor = 'pointer';
-                });
-                
-                fila.addEventListener('mouseleave', function() {
-                    this.style.backgroundColor = '';
-                });
-            });
-        </script>
-        
-        <style>
-            /* Estilos adicionales para los grupos de materias */
-            .materia-group {
-                display: grid;
-                grid-template-columns: 120px 1fr;
-                align-items: center;
-                gap: 10px;
-                margin-bottom: 15px;
-            }
-            
-            .materia-group label {
-                font-weight: bold;
-                color: #333;
-                font-size: 14px;
-            }
-            
-            .materia-group input {
-                padding: 10px;
-                border: 2px solid #ddd;
-                border-radius: 5px;
-                font-size: 16px;
-            }
-            
-            .form-group {
-                margin-bottom: 15px;
-            }
-            
-            .form-group label {
-                display: block;
-                margin-bottom: 5px;
-                font-weight: bold;
-                color: #333;
-            }
-            
-            .form-group input,
-            .form-group select {
-                width: 100%;
-                padding: 10px;
-                border: 2px solid #ddd;
-                border-radius: 5px;
-                font-size: 16px;
-            }
-            
-            /* Estilos para la información del encabezado */
-            .header-info {
-                display: flex;
-                gap: 20px;
-                margin: 15px 0;
-                flex-wrap: wrap;
-            }
-            
-            .info-card {
-                background: #f8f9fa;
-                padding: 10px 15px;
-                border-radius: 8px;
-                border-left: 4px solid #007bff;
-                display: flex;
-                flex-direction: column;
-                min-width: 150px;
-            }
-            
-            .info-label {
-                font-size: 0.85rem;
-                color: #6c757d;
-                font-weight: 500;
-            }
-            
-            .info-value {
-                font-size: 1rem;
-                color: #333;
-                font-weight: 600;
-                margin-top: 3px;
-            }
-        </style>
-    </body>
-    </html>
-    '''
-    
-    return html
+    # Modo agrupado (admin): una sección por grupo sobre el mismo recorrido ordenado
+    extra = {}
+    if es_admin and request.args.get('agrupar') == '1':
+        extra['secciones'] = agrupar_por_grupo(alumnos)
+    
+    render = render_en_flujo if en_flujo else render_template
+    respuesta = render(
+        'calificaciones.html',
+        alumnos=alumnos,
+        **extra,
+        total_alumnos=total_alumnos,
+        es_admin=es_admin,
+        modo_cuadricula=modo_cuadricula,
+        grupo_maestro=grupo_maestro,
+        titulo_grupo=titulo_grupo,
+        maestro_info=maestro_info,
+        trimestre_seleccionado=trimestre_seleccionado,
+        nombre_trimestre=nombre_trimestre(trimestre_seleccionado),
+        mensajes=obtener_mensajes()
+    )
+    return con_etiqueta(respuesta, etiqueta) if etiqueta else respuesta
 
 # ... (resto del código de las rutas se mantiene igual) ...
 
@@ -710,26 +391,17 @@ def agregar_alumno():
             if alumno_existente:
                 agregar_mensaje(f"❌ El alumno {nombre} {apellidos} ya existe en el grupo {grupo}", 'danger')
             else:
-                alumno_data = {
-                    '_id': obtener_proximo_id('alumnos'),
-                    'nombre': nombre,
-                    'apellidos': apellidos,
-                    'grupo': grupo,
-                    'calificaciones': {
-                        'primer_trimestre': {
-                            'matematicas': 0, 'espanol': 0, 'ingles': 0, 'ciencias': 0, 'formacion': 0
-                        },
-                        'segundo_trimestre': {
-                            'matematicas': 0, 'espanol': 0, 'ingles': 0, 'ciencias': 0, 'formacion': 0
-                        },
-                        'tercer_trimestre': {
-                            'matematicas': 0, 'espanol': 0, 'ingles': 0, 'ciencias': 0, 'formacion': 0
-                        }
-                    },
-                    'fecha_registro': datetime.now()
-                }
+                alumno_data = {'_id': obtener_proximo_id('alumnos'), **nuevo_alumno(nombre, apellidos, grupo)}
                 
-                db.alumnos.insert_one(alumno_data)
+                try:
+                    db.alumnos.insert_one(promedios.preparar_alta(alumno_data))
+                except DuplicateKeyError:
+                    # Otro admin lo agregó entre la consulta y el insert (índice único)
+                    agregar_mensaje(f"❌ El alumno {nombre} {apellidos} ya existe en el grupo {grupo}", 'danger')
+                    return redirect('/calificaciones')
+                promedios.registrar_altas(db, [alumno_data])
+                invalidar_tablero()
+                invalidar_grupos(db, [grupo])
                 mensaje = f"✅ Alumno {nombre} {apellidos} agregado al grupo {grupo}"
                 agregar_mensaje(mensaje, 'success')
                 print(mensaje)
@@ -747,34 +419,27 @@ def modificar_alumno(alumno_id):
     grupo = request.form['grupo']
     trimestre_actual = session.get('trimestre_actual', 'primer_trimestre')
     
-    calificaciones = {
-        'matematicas': float(request.form['matematicas']),
-        'espanol': float(request.form['espanol']),
-        'ingles': float(request.form['ingles']),
-        'ciencias': float(request.form['ciencias']),
-        'formacion': float(request.form['formacion'])
-    }
-    
-    for materia, calificacion in calificaciones.items():
-        if calificacion < 5 or calificacion > 10:
-            agregar_mensaje(f"❌ Las calificaciones deben estar entre 5 y 10", 'danger')
-            return redirect('/calificaciones')
+    calificaciones, errores = validar_calificaciones(request.form)
+    if errores:
+        agregar_mensaje(f"❌ {errores[0]}", 'danger')
+        return redirect('/calificaciones')
     
     db = conectar_bd()
     if db is not None:
-        resultado = db.alumnos.update_one(
-            {'_id': alumno_id},
-            {
-                '$set': {
-                    'nombre': nombre,
-                    'apellidos': apellidos,
-                    'grupo': grupo,
-                    f'calificaciones.{trimestre_actual}': calificaciones
-                }
-            }
-        )
+        datos = {'nombre': nombre, 'apellidos': apellidos, 'grupo': grupo}
+        try:
+            anterior = promedios.actualizar_alumno(db, {'_id': alumno_id}, trimestre_actual, calificaciones, datos)
+        except DuplicateKeyError:
+            # El nombre nuevo coincide con otro alumno del grupo (índice único)
+            agregar_mensaje(f"❌ El alumno {nombre} {apellidos} ya existe en el grupo {grupo}", 'danger')
+            return redirect('/calificaciones')
         
-        if resultado.modified_count > 0:
+        if anterior is not None and (
+            any(anterior.get(campo) != valor for campo, valor in datos.items())
+            or anterior.get('calificaciones', {}).get(trimestre_actual) != calificaciones
+        ):
+            invalidar_tablero()
+            invalidar_grupos(db, [anterior.get('grupo'), grupo])
             mensaje = f"✅ Alumno {nombre} {apellidos} modificado correctamente"
             agregar_mensaje(mensaje, 'success')
         else:
@@ -789,35 +454,22 @@ def modificar_calificaciones(alumno_id):
         agregar_mensaje("❌ No tienes permisos para realizar esta acción", 'danger')
         return redirect('/calificaciones')
     
-    trimestre = request.form['trimestre']
-    
-    calificaciones = {
-        'matematicas': float(request.form['matematicas']),
-        'espanol': float(request.form['espanol']),
-        'ingles': float(request.form['ingles']),
-        'ciencias': float(request.form['ciencias']),
-        'formacion': float(request.form['formacion'])
-    }
+    trimestre = request.form.get('trimestre')
+    if trimestre not in TRIMESTRES:
+        abort(400, description="Trimestre no válido")
     
-    for materia, calificacion in calificaciones.items():
-        if calificacion < 5 or calificacion > 10:
-            agregar_mensaje(f"❌ Las calificaciones deben estar entre 5 y 10", 'danger')
-            return redirect('/calificaciones')
+    calificaciones, errores = validar_calificaciones(request.form)
+    if errores:
+        agregar_mensaje(f"❌ {errores[0]}", 'danger')
+        return redirect('/calificaciones')
     
     db = conectar_bd()
     if db is not None:
-        alumno = db.alumnos.find_one({'_id': alumno_id})
+        alumno = promedios.actualizar_alumno(db, {'_id': alumno_id}, trimestre, calificaciones)
         if alumno:
-            resultado = db.alumnos.update_one(
-                {'_id': alumno_id},
-                {
-                    '$set': {
-                        f'calificaciones.{trimestre}': calificaciones
-                    }
-                }
-            )
-            
-            if resultado.modified_count > 0:
+            if alumno.get('calificaciones', {}).get(trimestre) != calificaciones:
+                invalidar_tablero()
+                invalidar_grupos(db, [alumno.get('grupo')])
                 mensaje = f"✅ Calificaciones de {alumno['nombre']} {alumno['apellidos']} actualizadas"
                 agregar_mensaje(mensaje, 'success')
             else:
@@ -834,15 +486,15 @@ def eliminar_alumno(alumno_id):
     
     db = conectar_bd()
     if db is not None:
-        alumno = db.alumnos.find_one({'_id': alumno_id})
+        alumno = promedios.eliminar_alumno(db, alumno_id)
         if alumno:
-            resultado = db.alumnos.delete_one({'_id': alumno_id})
-            if resultado.deleted_count > 0:
-                mensaje = f"✅ Alumno {alumno['nombre']} {alumno['apellidos']} eliminado correctamente"
-                agregar_mensaje(mensaje, 'success')
-            else:
-                mensaje = f"❌ Error al eliminar el alumno"
-                agregar_mensaje(mensaje, 'danger')
+            invalidar_tablero()
+            invalidar_grupos(db, [alumno.get('grupo')])
+            mensaje = f"✅ Alumno {alumno['nombre']} {alumno['apellidos']} eliminado correctamente"
+            agregar_mensaje(mensaje, 'success')
+        else:
+            mensaje = f"❌ Error al eliminar el alumno"
+            agregar_mensaje(mensaje, 'danger')
     
     return redirect('/calificaciones')
 
@@ -855,172 +507,220 @@ def reportes():
     grupo_maestro = session.get('grupo')
     
     # Obtener información del maestro
-    maestro_info = ""
     if not es_admin:
         maestro_info = f'👨‍🏫 {session.get("maestro_nombre")}'
     else:
         maestro_info = '👨‍💼 Administrador del Sistema'
     
-    html = f'''
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Reportes - Sistema de Calificaciones</title>
-        <link rel="stylesheet" href="/static/css.css">
-    </head>
-    <body>
-        <div class="container">
-            <header>
-                <h1>📊 Reportes de Calificaciones</h1>
-                <div class="header-info">
-                    <div class="info-card">
-                        <span class="info-label">👨‍🏫 Maestro:</span>
-                        <span class="info-value">{maestro_info}</span>
-                    </div>
-                    <div class="info-card">
-                        <span class="info-label">👥 Grupo:</span>
-                        <span class="info-value">{grupo_maestro if grupo_maestro != "Todos" else "Todos los grupos"}</span>
-                    </div>
-                </div>
-                <nav>
-                    <a href="/calificaciones" class="btn">📝 Calificaciones</a>
-                    <a href="/reportes" class="btn">📊 Reportes</a>
-                    {'<a href="/admin" class="btn">👨‍💼 Admin</a>' if es_admin else ''}
-                    <a href="/cerrar_sesion" class="btn btn-danger">🚪 Cerrar Sesión</a>
-                </nav>
-            </header>
-
-            <main>
-                <section class="form-section">
-                    <h2>🔍 Seleccionar Grupo y Trimestre</h2>
-                    <form action="/reportes" method="GET" class="student-form">
-                        {'<select name="grupo" required>' if es_admin else ''}
-                            {'<option value="">Selecciona grupo</option>' if es_admin else ''}
-                            {'<option value="1°A">1°A</option>' if es_admin else ''}
-                            {'<option value="1°B">1°B</option>' if es_admin else ''}
-                            {'<option value="1°C">1°C</option>' if es_admin else ''}
-                            {'<option value="2°A">2°A</option>' if es_admin else ''}
-                            {'<option value="2°B">2°B</option>' if es_admin else ''}
-                            {'<option value="2°C">2°C</option>' if es_admin else ''}
-                            {'<option value="3°A">3°A</option>' if es_admin else ''}
-                            {'<option value="3°B">3°B</option>' if es_admin else ''}
-                            {'<option value="3°C">3°C</option>' if es_admin else ''}
-                            {'<option value="4°A">4°A</option>' if es_admin else ''}
-                            {'<option value="4°B">4°B</option>' if es_admin else ''}
-                            {'<option value="4°C">4°C</option>' if es_admin else ''}
-                            {'<option value="5°A">5°A</option>' if es_admin else ''}
-                            {'<option value="5°B">5°B</option>' if es_admin else ''}
-                            {'<option value="5°C">5°C</option>' if es_admin else ''}
-                            {'<option value="6°A">6°A</option>' if es_admin else ''}
-                            {'<option value="6°B">6°B</option>' if es_admin else ''}
-                            {'<option value="6°C">6°C</option>' if es_admin else ''}
-                        {'</select>' if es_admin else ''}
-                        
-                        <select name="trimestre" required>
-                            <option value="primer_trimestre">Primer Trimestre</option>
-                            <option value="segundo_trimestre">Segundo Trimestre</option>
-                            <option value="tercer_trimestre">Tercer Trimestre</option>
-                        </select>
-                        
-                        <button type="submit" class="btn btn-primary">🔍 Ver Reporte</button>
-                    </form>
-                </section>
-    '''
-    
     grupo_seleccionado = request.args.get('grupo', grupo_maestro if not es_admin else '')
     trimestre_seleccionado = request.args.get('trimestre', 'primer_trimestre')
+    if trimestre_seleccionado not in TRIMESTRES:
+        abort(400, description="Trimestre no válido")
+    if not es_admin:
+        grupo_seleccionado = grupo_maestro
     
+    alumnos = []
+    resumen = None
+    maestro_grupo_info = maestro_info
+    etiqueta = None
     if grupo_seleccionado:
         db = conectar_bd()
-        alumnos = []
         if db is not None:
+            etiqueta = etiqueta_grupo(db, grupo_seleccionado)
+            respuesta = sin_cambios(etiqueta)
+            if respuesta:
+                return respuesta
+            
+            try:
+                alumnos = pagina_grupo(
+                    db, grupo_seleccionado, trimestre_seleccionado,
+                    despues=request.args.get('despues'),
+                    limite=tamano_pagina(request.args.get('limite'))
+                )
+            except CursorInvalido:
+                agregar_mensaje("❌ La página solicitada no es válida", 'danger')
+                return redirect('/reportes')
+            
+            if request.args.get('formato') == 'json':
+                return con_etiqueta(respuesta_json_pagina(alumnos, 'fila_reporte'), etiqueta)
+            
+            # El resumen y el maestro del grupo (para admin) se consultan a la vez
+            consultas = [lambda: resumen_grupo(db, grupo_seleccionado, trimestre_seleccionado)]
             if es_admin:
-                alumnos = list(db.alumnos.find({'grupo': grupo_seleccionado}).sort('apellidos', 1))
-            else:
-                alumnos = list(db.alumnos.find({'grupo': grupo_maestro}).sort('apellidos', 1))
-        
-        nombre_trimestre = trimestre_seleccionado.replace('_', ' ').title()
-        
-        # Obtener el nombre del maestro del grupo seleccionado (para admin)
-        maestro_grupo_info = ""
-        if es_admin and grupo_seleccionado:
-            maestro_grupo = db.maestros.find_one({'grupo': grupo_seleccionado})
-            if maestro_grupo:
-                maestro_grupo_info = f'👨‍🏫 {maestro_grupo["nombre"]}'
-            else:
-                maestro_grupo_info = '👨‍🏫 Maestro no asignado'
-        elif not es_admin:
-            maestro_grupo_info = maestro_info
-        
-        html += f'''
-                <section class="list-section">
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1rem;">
-                        <div>
-                            <h2>📋 Reporte - {grupo_seleccionado} - {nombre_trimestre}</h2>
-                            <div style="display: flex; gap: 15px; margin-top: 5px; font-size: 0.95rem; color: #666;">
-                                <span><strong>👨‍🏫 Maestro:</strong> {maestro_grupo_info}</span>
-                                <span><strong>📅 Trimestre:</strong> {nombre_trimestre}</span>
-                                <span><strong>👥 Total alumnos:</strong> {len(alumnos)}</span>
-                            </div>
-                        </div>
-                        <button onclick="window.print()" class="btn btn-primary">🖨️ Imprimir Reporte</button>
-                    </div>
-                    <div class="table-container">
-                        <table>
-                            <thead>
-                                <tr>
-                                    <th>Alumno</th>
-                                    <th>Matemáticas</th>
-                                    <th>Español</th>
-                                    <th>Inglés</th>
-                                    <th>Ciencias</th>
-                                    <th>Formación Cívica</th>
-                                    <th>Promedio</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-        '''
-        
-        if alumnos:
-            for alumno in alumnos:
-                calificaciones = alumno['calificaciones'].get(trimestre_seleccionado, {})
-                promedio = calcular_promedio(calificaciones)
-                
-                html += f'''
-                                <tr>
-                                    <td>{alumno['nombre']} {alumno['apellidos']}</td>
-                                    <td>{calificaciones.get('matematicas', 'N/A')}</td>
-                                    <td>{calificaciones.get('espanol', 'N/A')}</td>
-                                    <td>{calificaciones.get('ingles', 'N/A')}</td>
-                                    <td>{calificaciones.get('ciencias', 'N/A')}</td>
-                                    <td>{calificaciones.get('formacion', 'N/A')}</td>
-                                    <td><strong>{promedio if promedio > 0 else 'N/A'}</strong></td>
-                                </tr>
-                '''
-        else:
-            html += '''
-                                <tr>
-                                    <td colspan="7" class="no-data">No hay alumnos en este grupo</td>
-                                </tr>
-            '''
-        
-        html += '''
-                            </tbody>
-                        </table>
-                    </div>
-                </section>
-        '''
+                consultas.append(lambda: db.maestros.find_one({'grupo': grupo_seleccionado}, {'nombre': 1}))
+            resumen, *maestro = en_paralelo(*consultas)
+            
+            # Obtener el nombre del maestro del grupo seleccionado (para admin)
+            if es_admin:
+                maestro_grupo = maestro[0]
+                if maestro_grupo:
+                    maestro_grupo_info = f'👨‍🏫 {maestro_grupo["nombre"]}'
+                else:
+                    maestro_grupo_info = '👨‍🏫 Maestro no asignado'
+    
+    respuesta = render_template(
+        'reportes.html',
+        alumnos=alumnos,
+        resumen=resumen,
+        es_admin=es_admin,
+        grupo_maestro=grupo_maestro,
+        grupo_seleccionado=grupo_seleccionado,
+        maestro_info=maestro_info,
+        maestro_grupo_info=maestro_grupo_info,
+        trimestre_seleccionado=trimestre_seleccionado,
+        nombre_trimestre=nombre_trimestre(trimestre_seleccionado)
+    )
+    return con_etiqueta(respuesta, etiqueta) if etiqueta else respuesta
+
+@app.route('/reportes/export')
+def exportar_reporte():
+    # CSV/XLSX en flujo desde el cursor. grupo=todos (admin) exporta la escuela completa
+    if not session.get('logueado'):
+        return redirect('/')
+    
+    es_admin = session.get('rol') == 'admin'
+    grupo = request.args.get('grupo') if es_admin else session.get('grupo')
+    trimestre = request.args.get('trimestre', 'primer_trimestre')
+    formato = request.args.get('formato', 'csv')
+    if grupo == 'todos':
+        grupo = None
+    if (grupo is not None and grupo not in GRUPOS) or trimestre not in TRIMESTRES:
+        agregar_mensaje("❌ Selecciona un grupo y un trimestre válidos", 'danger')
+        return redirect('/reportes')
+    
+    db = conectar_bd()
+    if db is None:
+        agregar_mensaje("❌ Error de conexión a la base de datos", 'danger')
+        return redirect('/reportes')
+    
+    try:
+        contenido = exportar(db, grupo, trimestre, formato)
+    except ErrorExportacion as e:
+        agregar_mensaje(f"❌ {e}", 'danger')
+        return redirect('/reportes')
+    
+    return Response(
+        stream_with_context(contenido),
+        mimetype=FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename={nombre_archivo(grupo, trimestre, formato)}'}
+    )
+
+@app.route('/boletas/<int:alumno_id>.pdf')
+def boleta_alumno(alumno_id):
+    if not session.get('logueado'):
+        return redirect('/')
+    
+    db = conectar_bd()
+    if db is None:
+        agregar_mensaje("❌ Error de conexión a la base de datos", 'danger')
+        return redirect('/reportes')
+    
+    alumno = db.alumnos.find_one({'_id': alumno_id})
+    if alumno is None or (session.get('rol') != 'admin' and alumno.get('grupo') != session.get('grupo')):
+        agregar_mensaje("❌ Alumno no encontrado", 'danger')
+        return redirect('/reportes')
+    
+    try:
+        verificar_reportlab()
+    except ErrorBoletas as e:
+        agregar_mensaje(f"❌ {e}", 'danger')
+        return redirect('/reportes')
+    
+    maestro = db.maestros.find_one({'grupo': alumno.get('grupo')}, {'nombre': 1})
+    nombre = nombre_seguro(f"{alumno.get('apellidos')} {alumno.get('nombre')}")
+    return Response(boleta_pdf(alumno, maestro.get('nombre') if maestro else None), mimetype='application/pdf',
+                    headers={'Content-Disposition': f'inline; filename=boleta_{nombre}.pdf'})
+
+@app.route('/boletas')
+def boletas_del_grupo():
+    # Zip con las boletas de un grupo (una por alumno y la combinada). Un solo
+    # grupo se genera dentro de la petición; toda la escuela va por la CLI
+    if not session.get('logueado'):
+        return redirect('/')
+    
+    grupo = request.args.get('grupo') if session.get('rol') == 'admin' else session.get('grupo')
+    if grupo not in GRUPOS:
+        agregar_mensaje("❌ Selecciona un grupo válido", 'danger')
+        return redirect('/reportes')
+    
+    salida = io.BytesIO()
+    try:
+        generar_zip([grupo], salida, procesos=1)
+    except ErrorBoletas as e:
+        agregar_mensaje(f"❌ {e}", 'danger')
+        return redirect('/reportes')
+    
+    return Response(salida.getvalue(), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename=boletas_{nombre_seguro(grupo)}.zip'})
+
+@app.route('/trabajos')
+def ver_trabajos():
+    if not session.get('logueado') or session.get('rol') != 'admin':
+        return redirect('/')
+    
+    db = conectar_bd()
+    trabajos = listar_trabajos(db) if db is not None else []
+    return render_template('trabajos.html', trabajos=trabajos, esperando_worker=esperando_worker,
+                           sin_worker=SIN_WORKER, mensajes=obtener_mensajes())
+
+@app.route('/trabajos/boletas', methods=['POST'])
+def encolar_boletas():
+    # Boletas de toda la escuela (o de los grupos elegidos) en segundo plano
+    if not session.get('logueado') or session.get('rol') != 'admin':
+        return redirect('/')
+    
+    grupos = [grupo for grupo in request.form.getlist('grupos') if grupo in GRUPOS]
+    db = conectar_bd()
+    if db is None:
+        agregar_mensaje("❌ Error de conexión a la base de datos", 'danger')
+        return redirect('/reportes')
+    
+    encolar(db, 'boletas', {'grupos': grupos}, session.get('usuario'))
+    agregar_mensaje("🕒 Generación de boletas en cola", 'success')
+    return redirect('/trabajos')
+
+@app.route('/trabajos/exportar', methods=['POST'])
+def encolar_exportacion():
+    if not session.get('logueado') or session.get('rol') != 'admin':
+        return redirect('/')
     
-    html += '''
-            </main>
-        </div>
-    </body>
-    </html>
-    '''
+    grupo = request.form.get('grupo') or None
+    trimestre = request.form.get('trimestre')
+    formato = request.form.get('formato')
+    if (grupo is not None and grupo not in GRUPOS) or trimestre not in TRIMESTRES or formato not in FORMATOS:
+        agregar_mensaje("❌ Selecciona un grupo, trimestre y formato válidos", 'danger')
+        return redirect('/reportes')
     
-    return html
+    db = conectar_bd()
+    if db is None:
+        agregar_mensaje("❌ Error de conexión a la base de datos", 'danger')
+        return redirect('/reportes')
+    
+    encolar(db, 'exportar', {'grupo': grupo, 'trimestre': trimestre, 'formato': formato}, session.get('usuario'))
+    agregar_mensaje("🕒 Exportación en cola", 'success')
+    return redirect('/trabajos')
+
+@app.route('/trabajos/<trabajo_id>/descargar')
+def descargar_trabajo(trabajo_id):
+    if not session.get('logueado') or session.get('rol') != 'admin':
+        return redirect('/')
+    
+    db = conectar_bd()
+    trabajo = obtener_trabajo(db, trabajo_id) if db is not None else None
+    archivo = leer_resultado(db, trabajo) if trabajo else None
+    if archivo is None:
+        agregar_mensaje("❌ El archivo de este trabajo no está disponible", 'danger')
+        return redirect('/trabajos')
+    
+    # GridFS entrega el archivo por fragmentos; no se carga completo en memoria
+    return Response(
+        iter(lambda: archivo.read(256 * 1024), b''),
+        mimetype=trabajo['resultado']['tipo_mime'],
+        headers={
+            'Content-Disposition': f"attachment; filename={trabajo['resultado']['nombre']}",
+            'Content-Length': str(archivo.length),
+        }
+    )
 
 @app.route('/admin')
 def admin_panel():
@@ -1031,114 +731,65 @@ def admin_panel():
     estadisticas = {
         'total_maestros': 0,
         'total_alumnos': 0,
-        'alumnos_por_grado': {}
+        'alumnos_por_grado': {},
+        'alumnos_por_grupo': {},
+        'trimestres': {}
     }
     
     if db is not None:
-        estadisticas['total_maestros'] = db.maestros.count_documents({'rol': 'maestro', 'activo': True})
-        estadisticas['total_alumnos'] = db.alumnos.count_documents({})
-        
-        for grado in range(1, 7):
-            grupos = [f"{grado}°A", f"{grado}°B", f"{grado}°C"]
-            estadisticas['alumnos_por_grado'][f'{grado}°'] = db.alumnos.count_documents({'grupo': {'$in': grupos}})
+        # Una sola agregación $facet, cacheada unos segundos por worker
+        estadisticas = obtener_tablero(db)
     
-    html = f'''
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Panel Administrativo</title>
-        <link rel="stylesheet" href="/static/css.css">
-    </head>
-    <body>
-        <div class="container">
-            <header>
-                <h1>👨‍💼 Panel Administrativo</h1>
-                <div class="header-info">
-                    <div class="info-card">
-                        <span class="info-label">👨‍💼 Usuario:</span>
-                        <span class="info-value">Administrador del Sistema</span>
-                    </div>
-                    <div class="info-card">
-                        <span class="info-label">📊 Maestros activos:</span>
-                        <span class="info-value">{estadisticas['total_maestros']}</span>
-                    </div>
-                    <div class="info-card">
-                        <span class="info-label">👥 Alumnos totales:</span>
-                        <span class="info-value">{estadisticas['total_alumnos']}</span>
-                    </div>
-                </div>
-                <nav>
-                    <a href="/admin" class="btn">📊 Dashboard</a>
-                    <a href="/calificaciones" class="btn">👥 Gestionar Alumnos</a>
-                    <a href="/reportes" class="btn">📋 Reportes</a>
-                    <a href="/cerrar_sesion" class="btn btn-danger">🚪 Cerrar Sesión</a>
-                </nav>
-            </header>
+    return render_template('admin.html', estadisticas=estadisticas, mensajes=obtener_mensajes())
 
-            <main>
-    '''
-    
-    mensajes_html = ""
-    for mensaje in obtener_mensajes():
-        mensajes_html += f'<div class="alert alert-{mensaje["tipo"]}">{mensaje["texto"]}</div>'
-    
-    if mensajes_html:
-        html += mensajes_html
+@app.route('/importar_alumnos', methods=['POST'])
+def importar_alumnos_archivo():
+    # Inscripción masiva desde CSV/XLSX; devuelve el reporte de errores por fila
+    if not session.get('logueado') or session.get('rol') != 'admin':
+        agregar_mensaje("❌ No tienes permisos para realizar esta acción", 'danger')
+        return redirect('/')
     
-    html += f'''
-                <section class="form-section">
-                    <h2>📈 Estadísticas del Sistema</h2>
-                    <div class="student-details" style="grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));">
-                        <div style="text-align: center; padding: 1rem; background: #f8f9fa; border-radius: 10px;">
-                            <h3>👨‍🏫 Maestros Activos</h3>
-                            <p style="font-size: 2rem; font-weight: bold; color: #3498db;">{estadisticas['total_maestros']}</p>
-                        </div>
-                        <div style="text-align: center; padding: 1rem; background: #f8f9fa; border-radius: 10px;">
-                            <h3>👥 Alumnos Registrados</h3>
-                            <p style="font-size: 2rem; font-weight: bold; color: #27ae60;">{estadisticas['total_alumnos']}</p>
-                        </div>
-                    </div>
-                </section>
-
-                <section class="list-section">
-                    <h2>📊 Alumnos por Grado</h2>
-                    <div class="table-container">
-                        <table>
-                            <thead>
-                                <tr>
-                                    <th>Grado</th>
-                                    <th>Total Alumnos</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-    '''
+    archivo = request.files.get('archivo')
+    if archivo is None or not archivo.filename:
+        agregar_mensaje("❌ Selecciona un archivo .csv o .xlsx", 'danger')
+        return redirect('/admin')
     
-    for grado, total in estadisticas['alumnos_por_grado'].items():
-        html += f'''
-                                <tr>
-                                    <td>{grado}</td>
-                                    <td>{total}</td>
-                                </tr>
-        '''
+    db = conectar_bd()
+    if db is None:
+        agregar_mensaje("❌ Error de conexión a la base de datos", 'danger')
+        return redirect('/admin')
     
-    html += '''
-                            </tbody>
-                        </table>
-                    </div>
-                </section>
-            </main>
-        </div>
-    </body>
-    </html>
-    '''
+    if request.form.get('en_segundo_plano') == '1':
+        # Archivos grandes: el worker de trabajos.py lo procesa fuera de la petición
+        entrada_id = guardar_entrada(db, archivo.stream, archivo.filename)
+        encolar(db, 'importar', {'simular': request.form.get('simular') == '1'}, session.get('usuario'), entrada_id)
+        agregar_mensaje(f"🕒 Importación de {archivo.filename} en cola", 'success')
+        return redirect('/trabajos')
     
-    return html
+    try:
+        resultado = importar_alumnos(db, archivo.stream, archivo.filename, simular=request.form.get('simular') == '1')
+    except ErrorImportacion as e:
+        if request.args.get('formato') == 'json':
+            return jsonify(error=str(e)), 400
+        agregar_mensaje(f"❌ {e}", 'danger')
+        return redirect('/admin')
+    
+    print(f"📥 Importación {archivo.filename}: {resultado['insertados']} alumnos, {resultado['con_errores']} filas con errores")
+    if request.args.get('formato') == 'json':
+        return jsonify(resultado)
+    return render_template('importacion.html', resultado=resultado, archivo=archivo.filename)
+
+@app.route('/importar_alumnos/plantilla.csv')
+def plantilla_importacion():
+    if not session.get('logueado') or session.get('rol') != 'admin':
+        return redirect('/')
+    return Response(plantilla_csv(), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=plantilla_alumnos.csv'})
 
 @app.route('/cerrar_sesion')
 def cerrar_sesion():
     session.clear()
+    renovar_id(session)
     agregar_mensaje("👋 Sesión cerrada correctamente", 'success')
     return redirect('/')
 
@@ -1151,8 +802,7 @@ if __name__ == '__main__':
     
     print(f"🚀 Sistema de Calificaciones - Modo Desarrollo")
     print(f"📡 http://localhost:{port}")
-    print("👤 Admin: admin | Contraseña: AdminSeguro2025!")
-    print("👨‍🏫 Maestro 1°A: m1a | Contraseña: 1234")
+    print("👤 Cuentas: python preparar_bd.py sembrar (muestra las contraseñas generadas)")
     
 
     app.run(debug=True, host='0.0.0.0', port=port)
@@ -0,0 +1,52 @@
+# Tiempo de generar las boletas de toda la escuela en un solo proceso y con
+# el pool de procesos de boletas.py.
+#
+# Uso:
+#   python benchmarks/bench_boletas.py --alumnos 540 --procesos 4            # mongomock
+#   python benchmarks/bench_boletas.py --alumnos 540 --procesos 4 --mongo    # MongoDB local / MONGO_URL
+#
+# Con --mongo se usa la base 'bench_calificaciones' para no tocar datos reales.
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+from bench_flujo import preparar_bd, sembrar
+from escuela import GRUPOS
+
+
+def medir(procesos):
+    from boletas import generar_zip
+
+    with tempfile.TemporaryFile() as destino:
+        inicio = time.perf_counter()
+        archivos = generar_zip(GRUPOS, destino, procesos=procesos)
+        total = time.perf_counter() - inicio
+        tamano = destino.seek(0, os.SEEK_END)
+    print(f"{procesos:>2} proceso(s) {total:7.2f} s | {archivos} PDF | {tamano / 1024 / 1024:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la generación de boletas')
+    parser.add_argument('--alumnos', type=int, default=540)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--mongo', action='store_true', help='usar MongoDB real en lugar de mongomock')
+    args = parser.parse_args()
+
+    db = preparar_bd(args.mongo)
+    sembrar(db, args.alumnos)
+
+    medir(1)
+    if args.procesos > 1:
+        medir(args.procesos)
+
+    if args.mongo:
+        db.client.drop_database(database.NOMBRE_BD)
+
+
+if __name__ == '__main__':
+    main()
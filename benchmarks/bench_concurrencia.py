@@ -0,0 +1,171 @@
+# Carga de cierre de trimestre contra gunicorn en cada modo de worker
+# (GUNICORN_MODO=sync, hilos, gevent; ver gunicorn.conf.py): todos los
+# maestros a la vez abren su grupo, guardan calificaciones con PATCH y
+# consultan el reporte. Reporta peticiones/segundo y latencias por modo.
+#
+# Uso (requiere gunicorn y un MongoDB local o MONGO_URL; usa la base
+# 'bench_calificaciones' y la borra al terminar):
+#   python benchmarks/bench_concurrencia.py --clientes 32 --segundos 20
+#   python benchmarks/bench_concurrencia.py --modos sync hilos --workers 2
+import argparse
+import http.cookiejar
+import importlib.util
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+import database
+from escuela import GRUPOS, MATERIAS
+
+NOMBRE_BD = 'bench_calificaciones'
+TRIMESTRE = 'primer_trimestre'
+
+
+def sembrar(db, alumnos_por_grupo):
+    db.client.drop_database(NOMBRE_BD)
+    db.maestros.insert_many([
+        {'_id': i, 'usuario': f'bench{i}', 'password': '1234', 'nombre': f'Maestro {grupo}', 'grupo': grupo,
+         'grado': grupo[:1], 'rol': 'maestro', 'activo': True}
+        for i, grupo in enumerate(GRUPOS, start=1)
+    ])
+    alumnos = []
+    for grupo in GRUPOS:
+        for i in range(alumnos_por_grupo):
+            alumnos.append({
+                '_id': len(alumnos) + 1, 'nombre': f'Alumno {i}', 'apellidos': f'Apellido {i:03d}', 'grupo': grupo,
+                'calificaciones': {TRIMESTRE: {materia: round(random.uniform(5, 10), 1) for materia in MATERIAS}},
+            })
+    db.alumnos.insert_many(alumnos)
+    return {grupo: [a['_id'] for a in alumnos if a['grupo'] == grupo] for grupo in GRUPOS}
+
+
+def arrancar(modo, puerto, workers):
+    entorno = {**os.environ, 'GUNICORN_MODO': modo, 'WEB_CONCURRENCY': str(workers), 'MONGO_BD': NOMBRE_BD}
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', f'--bind=127.0.0.1:{puerto}', '--log-level=warning'],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL
+    )
+    limite = time.monotonic() + 20
+    while time.monotonic() < limite:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{puerto}/', timeout=1).read()
+            return proceso
+        except OSError:
+            if proceso.poll() is not None:
+                sys.exit(f"❌ gunicorn terminó al arrancar en modo {modo}")
+            time.sleep(0.2)
+    proceso.terminate()
+    sys.exit(f"❌ gunicorn no respondió en modo {modo}")
+
+
+class Maestro:
+    def __init__(self, base, numero, grupo, ids):
+        self.base = base
+        self.grupo = grupo
+        self.ids = ids
+        self.abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        datos = urllib.parse.urlencode({'usuario': f'bench{numero}', 'password': '1234'}).encode()
+        self.abridor.open(f'{base}/iniciar_sesion', datos).read()
+
+    def peticion(self, metodo, ruta, cuerpo=None):
+        solicitud = urllib.request.Request(self.base + ruta, method=metodo, data=cuerpo,
+                                           headers={'Content-Type': 'application/json'} if cuerpo else {})
+        inicio = time.perf_counter()
+        with self.abridor.open(solicitud, timeout=30) as respuesta:
+            respuesta.read()
+        return time.perf_counter() - inicio
+
+    def ronda(self):
+        grupo = urllib.parse.quote(self.grupo)
+        filas = [{'alumno_id': alumno_id, random.choice(MATERIAS): round(random.uniform(5, 10), 1)}
+                 for alumno_id in random.sample(self.ids, min(5, len(self.ids)))]
+        return [
+            self.peticion('GET', f'/calificaciones?trimestre={TRIMESTRE}'),
+            self.peticion('PATCH', f'/api/v1/grupos/{grupo}/calificaciones/{TRIMESTRE}',
+                          json.dumps({'calificaciones': filas}).encode()),
+            self.peticion('GET', f'/reportes?trimestre={TRIMESTRE}'),
+        ]
+
+
+def medir(modo, puerto, workers, clientes, segundos, ids_por_grupo):
+    proceso = arrancar(modo, puerto, workers)
+    base = f'http://127.0.0.1:{puerto}'
+    try:
+        maestros = [Maestro(base, (i % len(GRUPOS)) + 1, GRUPOS[i % len(GRUPOS)], ids_por_grupo[GRUPOS[i % len(GRUPOS)]])
+                    for i in range(clientes)]
+        latencias, errores = [], [0]
+        lock = threading.Lock()
+        fin = time.monotonic() + segundos
+
+        def cliente(maestro):
+            while time.monotonic() < fin:
+                try:
+                    tiempos = maestro.ronda()
+                except OSError:
+                    with lock:
+                        errores[0] += 1
+                    continue
+                with lock:
+                    latencias.extend(tiempos)
+
+        hilos = [threading.Thread(target=cliente, args=(maestro,)) for maestro in maestros]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+    if not latencias:
+        print(f"{modo:<7} sin respuestas ({errores[0]} errores)")
+        return
+    percentiles = statistics.quantiles(latencias, n=100)
+    print(f"{modo:<7} {len(latencias) / duracion:8.1f} req/s | p50 {percentiles[49] * 1000:7.1f} ms | "
+          f"p95 {percentiles[94] * 1000:7.1f} ms | {errores[0]} errores")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga por modo de worker de gunicorn')
+    parser.add_argument('--modos', nargs='+', default=['sync', 'hilos', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clientes', type=int, default=32, help='maestros simultáneos')
+    parser.add_argument('--segundos', type=float, default=20)
+    parser.add_argument('--alumnos', type=int, default=35, help='alumnos por grupo')
+    parser.add_argument('--puerto', type=int, default=8765)
+    args = parser.parse_args()
+
+    if importlib.util.find_spec('gunicorn') is None:
+        sys.exit("❌ Este benchmark requiere gunicorn (pip install gunicorn)")
+    if 'gevent' in args.modos and importlib.util.find_spec('gevent') is None:
+        print("ℹ️  gevent no está instalado: se omite ese modo")
+        args.modos.remove('gevent')
+
+    database.NOMBRE_BD = NOMBRE_BD
+    db = database.obtener_bd()
+    if not database.verificar_conexion():
+        sys.exit("❌ No hay MongoDB disponible en " + database.obtener_uri())
+    ids_por_grupo = sembrar(db, args.alumnos)
+
+    print(f"{args.workers} workers, {args.clientes} maestros simultáneos, {args.segundos:g} s por modo")
+    try:
+        for modo in args.modos:
+            medir(modo, args.puerto, args.workers, args.clientes, args.segundos, ids_por_grupo)
+    finally:
+        db.client.drop_database(NOMBRE_BD)
+
+
+if __name__ == '__main__':
+    main()
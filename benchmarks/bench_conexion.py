@@ -0,0 +1,59 @@
+# Compara peticiones/segundo entre el esquema anterior (un MongoClient nuevo
+# por petición + server_info()) y el cliente compartido de database.py.
+#
+# Uso (requiere un MongoDB local o MONGO_URL):
+#   python benchmarks/bench_conexion.py --peticiones 300 --hilos 8
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pymongo import MongoClient
+
+import database
+
+
+def peticion_antes():
+    # Réplica de la antigua conectar_bd(): cliente nuevo y ping bloqueante
+    cliente = MongoClient(database.obtener_uri(), serverSelectionTimeoutMS=10000)
+    cliente.server_info()
+    db = cliente[database.NOMBRE_BD]
+    db.maestros.find_one({'usuario': 'm1a', 'activo': True})
+    # El código original nunca cerraba el cliente; aquí se cierra para no
+    # agotar los descriptores del propio benchmark
+    cliente.close()
+
+
+def peticion_despues():
+    db = database.obtener_bd()
+    db.maestros.find_one({'usuario': 'm1a', 'activo': True})
+
+
+def medir(nombre, funcion, peticiones, hilos):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        list(ejecutor.map(lambda _: funcion(), range(peticiones)))
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<10} {peticiones} peticiones en {duracion:.2f}s -> {peticiones / duracion:.1f} req/s")
+    return peticiones / duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de conexiones a MongoDB')
+    parser.add_argument('--peticiones', type=int, default=300)
+    parser.add_argument('--hilos', type=int, default=8)
+    args = parser.parse_args()
+
+    if not database.verificar_conexion():
+        sys.exit("❌ No hay MongoDB disponible en " + database.obtener_uri())
+
+    antes = medir('antes', peticion_antes, args.peticiones, args.hilos)
+    despues = medir('después', peticion_despues, args.peticiones, args.hilos)
+    print(f"Mejora: x{despues / antes:.1f}")
+
+
+if __name__ == '__main__':
+    main()
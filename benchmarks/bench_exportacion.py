@@ -0,0 +1,63 @@
+# Memoria pico y tiempo de /reportes/export para toda la escuela en CSV y XLSX.
+#
+# Uso:
+#   python benchmarks/bench_exportacion.py --alumnos 10000            # mongomock
+#   python benchmarks/bench_exportacion.py --alumnos 10000 --mongo    # MongoDB local / MONGO_URL
+#
+# Con --mongo se usa la base 'bench_calificaciones' para no tocar datos reales.
+# tracemalloc encarece mucho a openpyxl: los tiempos de XLSX salen inflados.
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+from bench_flujo import preparar_bd, sembrar
+
+
+def medir(app_modulo, formato):
+    cliente = app_modulo.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion.update({'logueado': True, 'rol': 'admin', 'grupo': 'Todos', 'maestro_nombre': 'Admin'})
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    respuesta = cliente.get(f'/reportes/export?grupo=todos&trimestre=primer_trimestre&formato={formato}', buffered=False)
+    primer_byte = None
+    tamano = 0
+    for fragmento in respuesta.response:
+        if primer_byte is None:
+            primer_byte = time.perf_counter() - inicio
+        tamano += len(fragmento)
+    total = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    respuesta.close()
+
+    print(f"{formato:<4} primer byte {primer_byte * 1000:8.1f} ms | total {total * 1000:8.1f} ms | "
+          f"pico {pico / 1024 / 1024:7.1f} MB | {tamano / 1024 / 1024:.1f} MB enviados")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la exportación de reportes')
+    parser.add_argument('--alumnos', type=int, default=10000)
+    parser.add_argument('--mongo', action='store_true', help='usar MongoDB real en lugar de mongomock')
+    args = parser.parse_args()
+
+    db = preparar_bd(args.mongo)
+    sembrar(db, args.alumnos)
+    os.environ['ASEGURAR_INDICES'] = '0'
+
+    import app as app_modulo
+    medir(app_modulo, 'csv')
+    medir(app_modulo, 'xlsx')
+
+    if args.mongo:
+        db.client.drop_database(database.NOMBRE_BD)
+
+
+if __name__ == '__main__':
+    main()
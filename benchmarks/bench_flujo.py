@@ -0,0 +1,101 @@
+# Memoria pico y tiempo al primer byte de /calificaciones (vista de admin) con
+# la tabla en flujo y con la página armada completa en memoria.
+#
+# Uso:
+#   python benchmarks/bench_flujo.py --alumnos 10000            # mongomock
+#   python benchmarks/bench_flujo.py --alumnos 10000 --mongo    # MongoDB local / MONGO_URL
+#
+# Con --mongo se usa la base 'bench_calificaciones' para no tocar datos reales.
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+from escuela import GRUPOS, MATERIAS, TRIMESTRES
+
+
+def preparar_bd(usar_mongo):
+    if usar_mongo:
+        database.NOMBRE_BD = 'bench_calificaciones'
+    else:
+        import mongomock
+        import estadisticas
+        cliente = mongomock.MongoClient()
+        database.MongoClient = lambda *args, **kwargs: cliente
+        estadisticas.EN_PYTHON = True
+    return database.obtener_bd()
+
+
+def sembrar(db, cantidad):
+    db.alumnos.drop()
+    lote = []
+    for i in range(1, cantidad + 1):
+        lote.append({
+            '_id': i,
+            'nombre': f'Alumno {i}',
+            'apellidos': f'Apellido {random.randint(1, 5000):05d}',
+            'grupo': random.choice(GRUPOS),
+            'calificaciones': {
+                trimestre: {materia: round(random.uniform(5, 10), 1) for materia in MATERIAS}
+                for trimestre in TRIMESTRES
+            },
+        })
+        if len(lote) == 1000:
+            db.alumnos.insert_many(lote)
+            lote = []
+    if lote:
+        db.alumnos.insert_many(lote)
+
+
+def medir(app_modulo, en_flujo):
+    app_modulo.FLUJO_ADMIN = en_flujo
+    cliente = app_modulo.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion.update({'logueado': True, 'rol': 'admin', 'grupo': 'Todos', 'maestro_nombre': 'Admin'})
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    respuesta = cliente.get('/calificaciones', buffered=False)
+    primer_byte = None
+    tamano = 0
+    for fragmento in respuesta.response:
+        if primer_byte is None:
+            primer_byte = time.perf_counter() - inicio
+        tamano += len(fragmento)
+    total = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    respuesta.close()
+
+    modo = 'en flujo' if en_flujo else 'completa'
+    print(f"{modo:<9} primer byte {primer_byte * 1000:8.1f} ms | total {total * 1000:8.1f} ms | "
+          f"pico {pico / 1024 / 1024:7.1f} MB | {tamano / 1024 / 1024:.1f} MB enviados")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la tabla de admin en flujo')
+    parser.add_argument('--alumnos', type=int, default=10000)
+    parser.add_argument('--mongo', action='store_true', help='usar MongoDB real en lugar de mongomock')
+    args = parser.parse_args()
+
+    db = preparar_bd(args.mongo)
+    sembrar(db, args.alumnos)
+    os.environ['ASEGURAR_INDICES'] = '0'
+    # Toda la escuela en una sola respuesta, sin paginación
+    os.environ['TAMANO_PAGINA'] = '0'
+
+    import app as app_modulo
+    medir(app_modulo, en_flujo=True)
+    medir(app_modulo, en_flujo=False)
+
+    if args.mongo:
+        db.client.drop_database(database.NOMBRE_BD)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# Tiempo de importar un padrón completo (CSV y XLSX) con importacion.py.
+#
+# Uso:
+#   python benchmarks/bench_importacion.py --filas 10000            # mongomock
+#   python benchmarks/bench_importacion.py --filas 10000 --mongo    # MongoDB local / MONGO_URL
+#
+# Con --mongo se usa la base 'bench_calificaciones' para no tocar datos reales.
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+from escuela import GRUPOS, MATERIAS, TRIMESTRES
+
+
+def preparar_bd(usar_mongo):
+    if usar_mongo:
+        database.NOMBRE_BD = 'bench_calificaciones'
+    else:
+        import mongomock
+        cliente = mongomock.MongoClient()
+        database.MongoClient = lambda *args, **kwargs: cliente
+    return database.obtener_bd()
+
+
+def generar_filas(cantidad, con_calificaciones):
+    columnas = ['nombre', 'apellidos', 'grupo']
+    if con_calificaciones:
+        columnas += [f'{trimestre}.{materia}' for trimestre in TRIMESTRES for materia in MATERIAS]
+    yield columnas
+    for i in range(1, cantidad + 1):
+        fila = [f'Alumno {i}', f'Apellido {i:05d}', random.choice(GRUPOS)]
+        if con_calificaciones:
+            fila += [round(random.uniform(5, 10), 1) for _ in range(len(columnas) - 3)]
+        # Unas cuantas filas con errores para que el reporte no salga vacío
+        if i % 500 == 0:
+            fila[2] = '7°Z'
+        yield fila
+
+
+def archivo_csv(filas):
+    texto = io.StringIO()
+    csv.writer(texto).writerows(filas)
+    return io.BytesIO(texto.getvalue().encode('utf-8')), 'alumnos.csv'
+
+
+def archivo_xlsx(filas):
+    from openpyxl import Workbook
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet()
+    for fila in filas:
+        hoja.append(fila)
+    salida = io.BytesIO()
+    libro.save(salida)
+    salida.seek(0)
+    return salida, 'alumnos.xlsx'
+
+
+def medir(db, formato, cantidad, con_calificaciones):
+    from importacion import importar_alumnos
+
+    db.alumnos.drop()
+    db.contadores.drop()
+    generador = archivo_xlsx if formato == 'xlsx' else archivo_csv
+    archivo, nombre = generador(generar_filas(cantidad, con_calificaciones))
+
+    inicio = time.perf_counter()
+    resultado = importar_alumnos(db, archivo, nombre)
+    total = time.perf_counter() - inicio
+
+    detalle = 'con calificaciones' if con_calificaciones else 'solo padrón'
+    print(f"{formato:<4} {detalle:<18} {total:6.2f} s | {resultado['insertados']} insertados, "
+          f"{resultado['con_errores']} con errores")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la importación masiva de alumnos')
+    parser.add_argument('--filas', type=int, default=10000)
+    parser.add_argument('--mongo', action='store_true', help='usar MongoDB real en lugar de mongomock')
+    args = parser.parse_args()
+
+    db = preparar_bd(args.mongo)
+    for formato in ('csv', 'xlsx'):
+        for con_calificaciones in (False, True):
+            medir(db, formato, args.filas, con_calificaciones)
+
+    if args.mongo:
+        db.client.drop_database(database.NOMBRE_BD)
+
+
+if __name__ == '__main__':
+    main()
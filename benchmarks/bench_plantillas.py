@@ -0,0 +1,66 @@
+# Tiempo de render de calificaciones.html sin base de datos: un grupo de 40
+# alumnos (vista de maestro) y la vista de administrador con 700 alumnos.
+#
+# Uso:
+#   python benchmarks/bench_plantillas.py --repeticiones 200
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import render_template
+
+from app import app
+from escuela import GRUPOS, MATERIAS
+
+
+def alumnos_sinteticos(cantidad, grupos):
+    alumnos = []
+    for i in range(1, cantidad + 1):
+        calificaciones = {materia: round(random.uniform(5, 10), 1) for materia in MATERIAS}
+        alumnos.append({
+            '_id': i,
+            'nombre': f'Alumno {i}',
+            'apellidos': f"Apellido O'Prueba {i}",
+            'grupo': grupos[i % len(grupos)],
+            'calificaciones': calificaciones,
+            'promedio': round(sum(calificaciones.values()) / len(MATERIAS), 2),
+        })
+    return alumnos
+
+
+def render(alumnos, es_admin):
+    return render_template(
+        'calificaciones.html',
+        alumnos=alumnos,
+        es_admin=es_admin,
+        grupo_maestro='Todos' if es_admin else '1°A',
+        titulo_grupo='Todos los Grupos (Admin)' if es_admin else '1°A',
+        maestro_info='Benchmark',
+        trimestre_seleccionado='primer_trimestre',
+        nombre_trimestre='Primer Trimestre',
+        mensajes=[]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de plantillas Jinja2')
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    escenarios = [
+        ('grupo de 40 (maestro)', alumnos_sinteticos(40, ['1°A']), False),
+        ('escuela de 700 (admin)', alumnos_sinteticos(700, GRUPOS), True),
+    ]
+    with app.test_request_context('/calificaciones'):
+        for nombre, alumnos, es_admin in escenarios:
+            tamano = len(render(alumnos, es_admin))
+            total = timeit.timeit(lambda: render(alumnos, es_admin), number=args.repeticiones)
+            print(f"{nombre:<24} {total / args.repeticiones * 1000:7.2f} ms/render  ({tamano / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+# Prueba de carga del cierre de trimestre: siembra una escuela configurable
+# (grupos × alumnos), arranca gunicorn y simula a la vez
+#   - maestros: inician sesión, eligen trimestre, abren /calificaciones y
+#     capturan alumno por alumno con /modificar_calificaciones (siguiendo la
+#     redirección a /calificaciones como lo hace el navegador)
+#   - admins: /admin y /reportes de cada grupo, una y otra vez
+# Reporta p50/p95/p99 y peticiones/segundo por ruta. Con --guardar escribe
+# una línea base en JSON; con --comparar la compara contra una anterior y
+# termina con código 1 si alguna ruta empeoró más de --tolerancia.
+#
+# Uso (requiere gunicorn y un MongoDB local o MONGO_URL; usa la base
+# 'bench_cierre' y la borra al terminar):
+#   python benchmarks/carga_cierre.py --grupos 18 --alumnos 35 --segundos 60 --guardar benchmarks/base_cierre.json
+#   python benchmarks/carga_cierre.py --comparar benchmarks/base_cierre.json
+#   GUNICORN_MODO=hilos python benchmarks/carga_cierre.py --workers 4 --admins 3
+import argparse
+import http.cookiejar
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+import contrasenas
+import database
+import promedios
+from escuela import GRUPOS, MATERIAS
+
+NOMBRE_BD = 'bench_cierre'
+TRIMESTRE = 'tercer_trimestre'
+PASSWORD = 'cierre-1234'
+INTENTOS_LOGIN = 10
+
+
+def sembrar(db, grupos, alumnos_por_grupo):
+    # Un maestro por grupo y un admin, con la misma contraseña (un solo hash
+    # de bcrypt para todos: sembrar no debe tardar más que la prueba)
+    db.client.drop_database(db.name)
+    hash_password = contrasenas.hashear(PASSWORD)
+    maestros = [{'_id': 1, 'usuario': 'cierre_admin', 'password': hash_password, 'nombre': 'Admin',
+                 'grupo': 'Todos', 'grado': 'Admin', 'rol': 'admin', 'activo': True}]
+    maestros += [{'_id': i, 'usuario': f'cierre{i}', 'password': hash_password, 'nombre': f'Maestro {grupo}',
+                  'grupo': grupo, 'grado': grupo[:1], 'rol': 'maestro', 'activo': True}
+                 for i, grupo in enumerate(grupos, start=2)]
+    db.maestros.insert_many(maestros)
+
+    alumnos = []
+    for grupo in grupos:
+        for i in range(alumnos_por_grupo):
+            alumnos.append(promedios.preparar_alta({
+                '_id': len(alumnos) + 1, 'nombre': f'Alumno {i}', 'apellidos': f'Apellido {i:04d}', 'grupo': grupo,
+                'calificaciones': {TRIMESTRE: {materia: round(random.uniform(5, 10), 1) for materia in MATERIAS}},
+            }))
+    db.alumnos.insert_many(alumnos)
+    promedios.registrar_altas(db, alumnos)
+    return {
+        'maestros': [(m['usuario'], m['grupo'], [a['_id'] for a in alumnos if a['grupo'] == m['grupo']])
+                     for m in maestros[1:]],
+        'admin': 'cierre_admin',
+        'grupos': grupos,
+    }
+
+
+def arrancar(puerto, workers):
+    entorno = {**os.environ, 'WEB_CONCURRENCY': str(workers), 'MONGO_BD': NOMBRE_BD}
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', f'--bind=127.0.0.1:{puerto}', '--log-level=warning'],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL
+    )
+    limite = time.monotonic() + 20
+    while time.monotonic() < limite:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{puerto}/', timeout=1).read()
+            return proceso
+        except OSError:
+            if proceso.poll() is not None:
+                sys.exit("❌ gunicorn terminó al arrancar")
+            time.sleep(0.2)
+    proceso.terminate()
+    sys.exit("❌ gunicorn no respondió")
+
+
+class SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    # Cada redirección se mide como su propia petición
+    def redirect_request(self, *argumentos):
+        return None
+
+
+class Sesion:
+    def __init__(self, base, muestras, desde):
+        self.base = base
+        self.muestras = muestras
+        self.desde = desde
+        self.abridor = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), SinRedirecciones())
+
+    def pedir(self, ruta, url, formulario=None):
+        # Devuelve la URL de la redirección, si la hubo
+        datos = urllib.parse.urlencode(formulario).encode() if formulario is not None else None
+        inicio = time.perf_counter()
+        destino = None
+        error = False
+        try:
+            with self.abridor.open(self.base + url, datos, timeout=60) as respuesta:
+                respuesta.read()
+        except urllib.error.HTTPError as e:
+            e.read()
+            if e.code in (301, 302, 303):
+                destino = e.headers.get('Location')
+            else:
+                error = True
+        except OSError:
+            error = True
+        if time.monotonic() >= self.desde:
+            self.muestras.append((ruta, time.perf_counter() - inicio, error))
+        return destino
+
+    def seguir(self, destino):
+        if destino:
+            ruta = urllib.parse.urlsplit(destino)
+            self.pedir(ruta.path.strip('/') or 'login', ruta.path + (f'?{ruta.query}' if ruta.query else ''))
+
+    def iniciar(self, usuario):
+        # Con muchos inicios a la vez el pool de bcrypt puede responder
+        # "servidor ocupado" (redirección a /): se reintenta como lo haría el usuario
+        for _ in range(INTENTOS_LOGIN):
+            destino = self.pedir('iniciar_sesion', '/iniciar_sesion', {'usuario': usuario, 'password': PASSWORD})
+            if destino and urllib.parse.urlsplit(destino).path != '/':
+                return
+            time.sleep(random.uniform(0.5, 1.5))
+        raise RuntimeError(f"{usuario} no pudo iniciar sesión")
+
+
+def maestro(base, usuario, ids, muestras, desde, fin):
+    sesion = Sesion(base, muestras, desde)
+    sesion.iniciar(usuario)
+    sesion.pedir('seleccionar_trimestre', '/seleccionar_trimestre')
+    sesion.pedir('calificaciones', f'/calificaciones?trimestre={TRIMESTRE}')
+    pendientes = []
+    while time.monotonic() < fin:
+        if not pendientes:
+            pendientes = list(ids)
+            random.shuffle(pendientes)
+        formulario = {materia: round(random.uniform(5, 10), 1) for materia in MATERIAS}
+        formulario['trimestre'] = TRIMESTRE
+        sesion.seguir(sesion.pedir('modificar_calificaciones', f'/modificar_calificaciones/{pendientes.pop()}', formulario))
+
+
+def admin(base, usuario, grupos, muestras, desde, fin):
+    sesion = Sesion(base, muestras, desde)
+    sesion.iniciar(usuario)
+    while time.monotonic() < fin:
+        sesion.pedir('admin', '/admin')
+        for grupo in grupos:
+            if time.monotonic() >= fin:
+                break
+            sesion.pedir('reportes', '/reportes?' + urllib.parse.urlencode({'grupo': grupo, 'trimestre': TRIMESTRE}))
+
+
+def correr(base, escuela, admins, segundos, calentamiento):
+    # Las muestras del calentamiento (arranque de workers, cachés vacías) se descartan
+    muestras = []
+    desde = time.monotonic() + calentamiento
+    fin = desde + segundos
+    hilos = [threading.Thread(target=maestro, args=(base, usuario, ids, muestras, desde, fin))
+             for usuario, _, ids in escuela['maestros']]
+    hilos += [threading.Thread(target=admin, args=(base, escuela['admin'], escuela['grupos'], muestras, desde, fin))
+              for _ in range(admins)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resumir(muestras, segundos)
+
+
+def percentil(ordenadas, p):
+    if len(ordenadas) == 1:
+        return ordenadas[0]
+    return statistics.quantiles(ordenadas, n=100, method='inclusive')[p - 1]
+
+
+def resumir(muestras, segundos):
+    por_ruta = {}
+    for ruta, latencia, error in muestras:
+        por_ruta.setdefault(ruta, []).append((latencia, error))
+    por_ruta['total'] = [(latencia, error) for _, latencia, error in muestras]
+    resultados = {}
+    for ruta, valores in por_ruta.items():
+        latencias = sorted(latencia for latencia, _ in valores)
+        if not latencias:
+            continue
+        resultados[ruta] = {
+            'peticiones': len(latencias),
+            'por_segundo': round(len(latencias) / segundos, 2),
+            'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+            'p95_ms': round(percentil(latencias, 95) * 1000, 1),
+            'p99_ms': round(percentil(latencias, 99) * 1000, 1),
+            'errores': sum(1 for _, error in valores if error),
+        }
+    return resultados
+
+
+def imprimir(resultados):
+    print(f"{'ruta':<26}{'peticiones':>11}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errores':>9}")
+    for ruta in sorted(resultados, key=lambda r: (r == 'total', r)):
+        fila = resultados[ruta]
+        print(f"{ruta:<26}{fila['peticiones']:>11}{fila['por_segundo']:>9}{fila['p50_ms']:>9}"
+              f"{fila['p95_ms']:>9}{fila['p99_ms']:>9}{fila['errores']:>9}")
+
+
+def comparar(resultados, base, tolerancia):
+    # Regresión: p95 o p99 más de `tolerancia` arriba, menos peticiones/segundo
+    # que la base en la misma proporción, o errores donde no había
+    regresiones = []
+    for ruta, anterior in base['resultados'].items():
+        actual = resultados.get(ruta)
+        if actual is None:
+            regresiones.append(f"{ruta}: sin peticiones en esta corrida")
+            continue
+        for campo in ('p95_ms', 'p99_ms'):
+            if actual[campo] > anterior[campo] * (1 + tolerancia):
+                regresiones.append(f"{ruta}: {campo} {anterior[campo]} -> {actual[campo]}")
+        if actual['por_segundo'] < anterior['por_segundo'] * (1 - tolerancia):
+            regresiones.append(f"{ruta}: req/s {anterior['por_segundo']} -> {actual['por_segundo']}")
+        if actual['errores'] > anterior['errores']:
+            regresiones.append(f"{ruta}: errores {anterior['errores']} -> {actual['errores']}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga del cierre de trimestre')
+    parser.add_argument('--grupos', type=int, default=len(GRUPOS), help=f'grupos con maestro activo (máx. {len(GRUPOS)})')
+    parser.add_argument('--alumnos', type=int, default=35, help='alumnos por grupo')
+    parser.add_argument('--admins', type=int, default=2, help='sesiones de admin simultáneas')
+    parser.add_argument('--segundos', type=float, default=60, help='duración de la medición')
+    parser.add_argument('--calentamiento', type=float, default=5, help='segundos iniciales que no se miden')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--puerto', type=int, default=8766)
+    parser.add_argument('--semilla', type=int, default=2024, help='semilla de random (datos y capturas)')
+    parser.add_argument('--guardar', metavar='JSON', help='escribe los resultados como línea base')
+    parser.add_argument('--comparar', metavar='JSON', help='compara contra una línea base anterior')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='empeoramiento permitido (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    if not 1 <= args.grupos <= len(GRUPOS):
+        sys.exit(f"❌ --grupos debe estar entre 1 y {len(GRUPOS)}")
+    if importlib.util.find_spec('gunicorn') is None:
+        sys.exit("❌ Esta prueba requiere gunicorn (pip install gunicorn)")
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+
+    random.seed(args.semilla)
+    database.NOMBRE_BD = NOMBRE_BD
+    db = database.obtener_bd()
+    if not database.verificar_conexion():
+        sys.exit("❌ No hay MongoDB disponible en " + database.obtener_uri())
+
+    parametros = {
+        'grupos': args.grupos, 'alumnos': args.alumnos, 'admins': args.admins, 'segundos': args.segundos,
+        'workers': args.workers, 'modo': os.environ.get('GUNICORN_MODO', 'sync'), 'bcrypt_costo': contrasenas.COSTO,
+    }
+    print(f"📥 Sembrando {args.grupos} grupos × {args.alumnos} alumnos...")
+    escuela = sembrar(db, GRUPOS[:args.grupos], args.alumnos)
+    proceso = arrancar(args.puerto, args.workers)
+    try:
+        print(f"ℹ️  {args.grupos} maestros y {args.admins} admins durante {args.segundos:g} s "
+              f"({args.workers} workers, modo {parametros['modo']})")
+        resultados = correr(f'http://127.0.0.1:{args.puerto}', escuela, args.admins, args.segundos, args.calentamiento)
+    finally:
+        proceso.terminate()
+        proceso.wait()
+        db.client.drop_database(NOMBRE_BD)
+
+    imprimir(resultados)
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump({'fecha': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                       'parametros': parametros, 'resultados': resultados}, archivo, indent=2, ensure_ascii=False)
+        print(f"✅ Línea base guardada en {args.guardar}")
+    if base is not None:
+        if base.get('parametros') != parametros:
+            print(f"⚠️  La línea base se tomó con otros parámetros: {base.get('parametros')}")
+        regresiones = comparar(resultados, base, args.tolerancia)
+        if regresiones:
+            print(f"❌ {len(regresiones)} regresiones contra {args.comparar} (tolerancia {args.tolerancia:.0%}):")
+            for regresion in regresiones:
+                print(f"   - {regresion}")
+            sys.exit(1)
+        print(f"✅ Sin regresiones contra {args.comparar} (tolerancia {args.tolerancia:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import importlib.util
+import io
+import os
+import sys
+import unicodedata
+import zipfile
+
+from database import obtener_bd
+from escuela import (CALIFICACION_APROBATORIA, GRUPOS, MATERIAS, NOMBRES_MATERIAS, TRIMESTRES,
+                     calcular_promedio, es_calificacion_capturada, nombre_trimestre, redondear)
+from paginacion import ORDEN_ALUMNOS
+
+# Boletas en PDF: una por alumno con los tres trimestres y una combinada por
+# grupo. Se dibujan con reportlab, sin servicios externos. Para toda la escuela
+# cada grupo se genera en un proceso aparte (ProcessPoolExecutor); cada proceso
+# abre su propio cliente de MongoDB (obtener_cliente() detecta el fork).
+PROCESOS = int(os.environ.get('BOLETAS_PROCESOS', 0)) or os.cpu_count() or 1
+NOMBRE_ESCUELA = os.environ.get('NOMBRE_ESCUELA', 'Sistema de Calificaciones')
+
+CAMPOS_BOLETA = {'nombre': 1, 'apellidos': 1, 'grupo': 1, 'calificaciones': 1}
+
+
+class ErrorBoletas(RuntimeError):
+    pass
+
+
+def verificar_reportlab():
+    if importlib.util.find_spec('reportlab') is None:
+        raise ErrorBoletas("Para generar boletas instala reportlab (pip install reportlab)")
+
+
+def _formato(valor):
+    return f'{valor:g}' if valor else '-'
+
+
+def datos_boleta(alumno):
+    # Filas de la tabla: materia, una columna por trimestre y el promedio anual
+    calificaciones = alumno.get('calificaciones') or {}
+    filas = []
+    for materia in MATERIAS:
+        valores = [(calificaciones.get(trimestre) or {}).get(materia) for trimestre in TRIMESTRES]
+        capturadas = [valor for valor in valores if es_calificacion_capturada(valor)]
+        anual = redondear(sum(capturadas) / len(capturadas)) if capturadas else 0
+        filas.append([NOMBRES_MATERIAS[materia], *[valor if es_calificacion_capturada(valor) else 0 for valor in valores], anual])
+
+    promedios = [calcular_promedio(calificaciones.get(trimestre)) for trimestre in TRIMESTRES]
+    capturados = [promedio for promedio in promedios if promedio > 0]
+    final = redondear(sum(capturados) / len(capturados)) if capturados else 0
+    return filas, promedios, final
+
+
+def _historia_boleta(alumno, maestro, estilos):
+    from reportlab.lib import colors
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+    filas, promedios, final = datos_boleta(alumno)
+    encabezado = ['Materia', *[nombre_trimestre(trimestre) for trimestre in TRIMESTRES], 'Promedio']
+    cuerpo = [[fila[0], *[_formato(valor) for valor in fila[1:]]] for fila in filas]
+    pie = ['Promedio', *[_formato(promedio) for promedio in promedios], _formato(final)]
+
+    tabla = Table([encabezado, *cuerpo, pie], colWidths=[5 * cm] + [3 * cm] * 4)
+    tabla.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f8f9fa')),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+
+    if not final:
+        situacion = 'Sin calificaciones capturadas'
+    else:
+        situacion = 'Aprobado' if final >= CALIFICACION_APROBATORIA else 'Reprobado'
+
+    return [
+        Paragraph(NOMBRE_ESCUELA, estilos['Title']),
+        Paragraph('Boleta de Calificaciones', estilos['Heading2']),
+        Spacer(1, 0.4 * cm),
+        Paragraph(f"<b>Alumno:</b> {_escapar(alumno.get('nombre'))} {_escapar(alumno.get('apellidos'))}", estilos['Normal']),
+        Paragraph(f"<b>Grupo:</b> {_escapar(alumno.get('grupo'))}", estilos['Normal']),
+        Paragraph(f"<b>Maestro(a):</b> {_escapar(maestro or 'No asignado')}", estilos['Normal']),
+        Spacer(1, 0.6 * cm),
+        tabla,
+        Spacer(1, 0.6 * cm),
+        Paragraph(f"<b>Situación:</b> {situacion}", estilos['Normal']),
+    ]
+
+
+def _escapar(texto):
+    # Paragraph interpreta un subconjunto de HTML
+    return str(texto or '').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _pdf(historias):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import PageBreak, SimpleDocTemplate
+
+    salida = io.BytesIO()
+    documento = SimpleDocTemplate(salida, pagesize=letter, title='Boleta de Calificaciones')
+    elementos = []
+    for i, historia in enumerate(historias):
+        if i:
+            elementos.append(PageBreak())
+        elementos.extend(historia)
+    documento.build(elementos)
+    return salida.getvalue()
+
+
+def boleta_pdf(alumno, maestro=None):
+    from reportlab.lib.styles import getSampleStyleSheet
+    return _pdf([_historia_boleta(alumno, maestro, getSampleStyleSheet())])
+
+
+def nombre_seguro(texto):
+    # Nombres de archivo ASCII dentro del zip: "1°A" -> "1A", "Núñez" -> "Nunez"
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return ''.join(caracter if caracter.isalnum() else '_' for caracter in texto).strip('_') or 'sin_nombre'
+
+
+def boletas_grupo(db, grupo):
+    # Devuelve [(ruta en el zip, bytes)]: una boleta por alumno y la combinada del grupo
+    from reportlab.lib.styles import getSampleStyleSheet
+
+    estilos = getSampleStyleSheet()
+    maestro = db.maestros.find_one({'grupo': grupo}, {'nombre': 1})
+    nombre_maestro = maestro.get('nombre') if maestro else None
+    carpeta = nombre_seguro(grupo)
+
+    archivos = []
+    historias = []
+    for alumno in db.alumnos.find({'grupo': grupo}, CAMPOS_BOLETA).sort(ORDEN_ALUMNOS):
+        # Los flowables de reportlab no se reutilizan entre documentos
+        historia = _historia_boleta(alumno, nombre_maestro, estilos)
+        historias.append(_historia_boleta(alumno, nombre_maestro, estilos))
+        nombre = nombre_seguro(f"{alumno.get('apellidos')} {alumno.get('nombre')} {alumno['_id']}")
+        archivos.append((f'{carpeta}/{nombre}.pdf', _pdf([historia])))
+    if historias:
+        archivos.append((f'{carpeta}/{carpeta}_grupo_completo.pdf', _pdf(historias)))
+    return archivos
+
+
+def _boletas_grupo_en_proceso(grupo):
+    # Punto de entrada de cada proceso del pool
+    db = obtener_bd()
+    if db is None:
+        raise ErrorBoletas("No se pudo conectar a MongoDB")
+    return grupo, boletas_grupo(db, grupo)
+
+
+def generar_zip(grupos, destino, progreso=None, procesos=None):
+    # Escribe en `destino` (ruta o archivo binario) un zip con las boletas de
+    # `grupos`. progreso(hechos, total, grupo, boletas) se llama al terminar
+    # cada grupo. Devuelve el número de archivos PDF escritos.
+    verificar_reportlab()
+    procesos = min(procesos or PROCESOS, len(grupos)) or 1
+    escritos = 0
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+        if procesos == 1:
+            db = obtener_bd()
+            if db is None:
+                raise ErrorBoletas("No se pudo conectar a MongoDB")
+            resultados = ((grupo, boletas_grupo(db, grupo)) for grupo in grupos)
+            for hechos, (grupo, archivos) in enumerate(resultados, start=1):
+                escritos += _agregar(archivo_zip, archivos)
+                if progreso:
+                    progreso(hechos, len(grupos), grupo, len(archivos))
+        else:
+            pool = ProcessPoolExecutor(max_workers=procesos)
+            try:
+                pendientes = [pool.submit(_boletas_grupo_en_proceso, grupo) for grupo in grupos]
+                for hechos, futuro in enumerate(as_completed(pendientes), start=1):
+                    grupo, archivos = futuro.result()
+                    escritos += _agregar(archivo_zip, archivos)
+                    if progreso:
+                        progreso(hechos, len(grupos), grupo, len(archivos))
+            finally:
+                # Si progreso() interrumpe (p. ej. trabajo cancelado) no se
+                # esperan los grupos que aún no empezaban
+                pool.shutdown(cancel_futures=True)
+    return escritos
+
+
+def _agregar(archivo_zip, archivos):
+    for ruta, contenido in archivos:
+        # Los PDF ya vienen comprimidos: guardarlos tal cual es más rápido
+        archivo_zip.writestr(ruta, contenido, compress_type=zipfile.ZIP_STORED)
+    return len(archivos)
+
+
+def _imprimir_progreso(hechos, total, grupo, boletas):
+    print(f"📄 [{hechos}/{total}] {grupo}: {boletas} archivos")
+
+
+if __name__ == '__main__':
+    # python boletas.py boletas.zip [1°A 2°B ...]   (sin grupos: toda la escuela)
+    if len(sys.argv) < 2:
+        sys.exit("Uso: python boletas.py <destino.zip> [grupo ...]")
+
+    grupos = sys.argv[2:] or GRUPOS
+    desconocidos = [grupo for grupo in grupos if grupo not in GRUPOS]
+    if desconocidos:
+        sys.exit(f"❌ Grupos desconocidos: {', '.join(desconocidos)}")
+
+    try:
+        total = generar_zip(grupos, sys.argv[1], progreso=_imprimir_progreso)
+    except ErrorBoletas as e:
+        sys.exit(f"❌ {e}")
+    print(f"✅ {total} PDF escritos en {sys.argv[1]}")
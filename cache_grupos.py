@@ -0,0 +1,184 @@
+from collections import OrderedDict
+from datetime import datetime
+from pymongo import UpdateOne
+import os
+import threading
+import time
+
+from escuela import GRUPOS
+from estadisticas import iterar_alumnos_con_promedio
+from paginacion import ORDEN_ALUMNOS, CursorInvalido, Pagina, decodificar_cursor
+
+# Caché por worker de la lista de alumnos de un grupo en un trimestre (con
+# promedios), que es lo que leen /calificaciones de un maestro, /reportes y
+# la API por grupo. Es un LRU con TTL: como mucho CACHE_GRUPOS_TAMANO listas,
+# cada una válida CACHE_GRUPOS_TTL segundos.
+#
+# Cada escritura de alumnos o calificaciones incrementa la versión del grupo
+# en la colección versiones_grupos (invalidar_grupos). El worker que escribe
+# borra su copia de inmediato; los demás revisan las versiones cada
+# CACHE_GRUPOS_SINCRONIZAR segundos con una consulta pequeña (funciona sin
+# replica set, a diferencia de los change streams).
+#
+# Para que quien escribe vea su cambio aunque la siguiente petición (p. ej. el
+# redirect después de guardar) la atienda otro worker, invalidar_grupos avisa
+# a oyentes_invalidacion con la versión nueva de cada grupo; app.py la guarda
+# en la sesión y, al recibir la siguiente petición de ese usuario, el worker
+# relee las versiones si conoce alguna anterior (exigir_versiones).
+# CACHE_GRUPOS_TAMANO=0 desactiva la caché. La misma versión sirve de ETag
+# para las páginas de un grupo (ver etiqueta_grupo en app.py).
+TAMANO = int(os.environ.get('CACHE_GRUPOS_TAMANO', 128))
+TTL = float(os.environ.get('CACHE_GRUPOS_TTL', 300))
+SINCRONIZAR = float(os.environ.get('CACHE_GRUPOS_SINCRONIZAR', 2))
+
+# Funciones que reciben {grupo: versión nueva} después de cada invalidación
+oyentes_invalidacion = []
+
+
+class CacheGrupos:
+    def __init__(self, tamano=TAMANO, ttl=TTL, sincronizar=SINCRONIZAR):
+        self.tamano = tamano
+        self.ttl = ttl
+        self.sincronizar = sincronizar
+        self.entradas = OrderedDict()   # (grupo, trimestre) -> (expira, alumnos)
+        self.versiones = None           # grupo -> {version, actualizado} de la última revisión
+        self.revisado = 0.0
+        self.generacion = 0             # cambia con cada invalidación
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    def obtener(self, db, grupo, trimestre):
+        # Devuelve la lista de alumnos del grupo; la carga de MongoDB si no
+        # está en caché o ya expiró
+        if not self.tamano:
+            return _cargar(db, grupo, trimestre)
+
+        self.revisar_versiones(db)
+        llave = (grupo, trimestre)
+        with self.lock:
+            entrada = self.entradas.get(llave)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self.entradas.move_to_end(llave)
+                self.aciertos += 1
+                return entrada[1]
+            self.fallos += 1
+            generacion = self.generacion
+
+        # La consulta se hace fuera del lock. Si hubo una invalidación mientras
+        # tanto el resultado puede ser viejo y no se guarda
+        alumnos = _cargar(db, grupo, trimestre)
+        with self.lock:
+            if generacion != self.generacion:
+                return alumnos
+            self.entradas[llave] = (time.monotonic() + self.ttl, alumnos)
+            self.entradas.move_to_end(llave)
+            while len(self.entradas) > self.tamano:
+                self.entradas.popitem(last=False)
+                self.expulsiones += 1
+        return alumnos
+
+    def descartar(self, grupos=None):
+        # Borra las listas de `grupos` (todas si es None) solo en este worker
+        with self.lock:
+            self.generacion += 1
+            for llave in list(self.entradas):
+                if grupos is None or llave[0] in grupos:
+                    del self.entradas[llave]
+                    self.invalidaciones += 1
+
+    def revisar_versiones(self, db, forzar=False):
+        if not forzar and (not self.sincronizar or time.monotonic() - self.revisado < self.sincronizar):
+            return
+        self.revisado = time.monotonic()
+        versiones = {documento.pop('_id'): documento for documento in db.versiones_grupos.find()}
+        if self.versiones is None:
+            # Primera revisión con listas ya guardadas (sin sincronización
+            # periódica): no se sabe de qué versión son
+            if self.entradas:
+                self.descartar()
+        else:
+            cambiados = {grupo for grupo in set(versiones) | set(self.versiones)
+                         if versiones.get(grupo, {}).get('version') != self.versiones.get(grupo, {}).get('version')}
+            if cambiados:
+                self.descartar(cambiados)
+        self.versiones = versiones
+
+    def exigir_versiones(self, db, minimas):
+        # minimas: {grupo: versión} que el usuario ya escribió, quizá desde
+        # otro worker. Si aquí se conoce alguna anterior se revisan ya
+        conocidas = self.versiones or {}
+        if any(conocidas.get(grupo, {}).get('version', 0) < version for grupo, version in minimas.items()):
+            self.revisar_versiones(db, forzar=True)
+
+    def version(self, db, grupo):
+        # (versión, fecha de la última escritura) del grupo según la última
+        # revisión; sin sincronización periódica se consulta cada vez
+        if self.sincronizar:
+            self.revisar_versiones(db)
+            documento = (self.versiones or {}).get(grupo) or {}
+        else:
+            documento = db.versiones_grupos.find_one({'_id': grupo}) or {}
+        return documento.get('version', 0), documento.get('actualizado')
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'pid': os.getpid(),
+            'entradas': len(self.entradas),
+            'tamano_maximo': self.tamano,
+            'ttl': self.ttl,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else None,
+            'expulsiones': self.expulsiones,
+            'invalidaciones': self.invalidaciones,
+        }
+
+
+def _cargar(db, grupo, trimestre):
+    return list(iterar_alumnos_con_promedio(db, {'grupo': grupo}, trimestre, ORDEN_ALUMNOS))
+
+
+cache = CacheGrupos()
+
+
+def invalidar_grupos(db, grupos=None):
+    # Llamar después de escribir alumnos o calificaciones. grupos=None
+    # significa todos (p. ej. tras una importación o una reparación)
+    if grupos is not None:
+        grupos = {grupo for grupo in grupos if grupo}
+    cache.descartar(grupos)
+    # La siguiente petición de este worker vuelve a leer las versiones
+    cache.revisado = 0.0
+    if grupos is None:
+        grupos = GRUPOS
+    # `actualizado` sale como Last-Modified, que es GMT: va en UTC
+    operaciones = [
+        UpdateOne({'_id': grupo}, {'$inc': {'version': 1}, '$set': {'actualizado': datetime.utcnow()}}, upsert=True)
+        for grupo in set(grupos)
+    ]
+    if not operaciones:
+        return {}
+    db.versiones_grupos.bulk_write(operaciones, ordered=False)
+    versiones = {documento['_id']: documento['version']
+                 for documento in db.versiones_grupos.find({'_id': {'$in': list(set(grupos))}}, {'version': 1})}
+    for oyente in oyentes_invalidacion:
+        oyente(versiones)
+    return versiones
+
+
+def pagina_grupo(db, grupo, trimestre, despues=None, limite=None):
+    # Igual que pagina_alumnos(db, {'grupo': grupo}, ...) pero sobre la lista
+    # en caché. Lanza CursorInvalido si `despues` no es un cursor válido
+    alumnos = cache.obtener(db, grupo, trimestre)
+    if despues:
+        desde = tuple(decodificar_cursor(despues))
+        llave = lambda alumno: tuple(alumno.get(campo) for campo, _ in ORDEN_ALUMNOS)
+        try:
+            alumnos = [alumno for alumno in alumnos if llave(alumno) > desde]
+        except TypeError:
+            raise CursorInvalido("Cursor de paginación inválido")
+    return Pagina(iter(alumnos), limite)
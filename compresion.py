@@ -0,0 +1,113 @@
+from flask import request
+import importlib.util
+import os
+import zlib
+
+# Compresión negociada (br o gzip según Accept-Encoding) de las respuestas
+# de texto. Las respuestas normales se comprimen completas si superan
+# COMPRESION_MINIMO bytes; las que van en flujo (tabla del admin, CSV) se
+# comprimen fragmento por fragmento con un flush en cada uno, así el
+# navegador sigue recibiendo filas conforme se generan.
+# Brotli es opcional: sin el paquete `brotli` solo se ofrece gzip.
+#
+# Los estáticos (CSS, JS) no pasan por aquí: send_from_directory los envía
+# con direct_passthrough y se sirven tal cual. Si hace falta comprimirlos,
+# que lo haga el proxy frente a la app o se publiquen ya comprimidos.
+ACTIVA = os.environ.get('COMPRESION', '1') == '1'
+MINIMO = int(os.environ.get('COMPRESION_MINIMO', 1024))
+NIVEL_GZIP = int(os.environ.get('COMPRESION_NIVEL_GZIP', 6))
+NIVEL_BROTLI = int(os.environ.get('COMPRESION_NIVEL_BROTLI', 5))
+TIPOS = {'text/html', 'application/json', 'text/csv'}
+
+BROTLI_DISPONIBLE = importlib.util.find_spec('brotli') is not None
+CODIFICACIONES = (['br'] if BROTLI_DISPONIBLE else []) + ['gzip']
+
+
+class _Gzip:
+    def __init__(self):
+        # wbits=31: formato gzip (encabezado y CRC), no zlib crudo
+        self.compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos):
+        return self.compresor.compress(datos)
+
+    def vaciar(self):
+        return self.compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self):
+        return self.compresor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        import brotli
+        self.compresor = brotli.Compressor(quality=NIVEL_BROTLI)
+
+    def comprimir(self, datos):
+        return self.compresor.process(datos)
+
+    def vaciar(self):
+        return self.compresor.flush()
+
+    def terminar(self):
+        return self.compresor.finish()
+
+
+COMPRESORES = {'gzip': _Gzip, 'br': _Brotli}
+
+
+def elegir_codificacion():
+    # La preferida por el cliente entre las disponibles (respeta q=0)
+    return request.accept_encodings.best_match(CODIFICACIONES)
+
+
+def etiqueta_codificada(etag, codificacion):
+    # Cada codificación es otra representación: su ETag fuerte lleva sufijo
+    return f'{etag}-{codificacion}'
+
+
+def variantes_etag(etag):
+    return [etag] + [etiqueta_codificada(etag, codificacion) for codificacion in CODIFICACIONES]
+
+
+def _en_flujo(fragmentos, compresor):
+    try:
+        for fragmento in fragmentos:
+            if isinstance(fragmento, str):
+                fragmento = fragmento.encode('utf-8')
+            datos = compresor.comprimir(fragmento) + compresor.vaciar()
+            if datos:
+                yield datos
+        yield compresor.terminar()
+    finally:
+        if hasattr(fragmentos, 'close'):
+            fragmentos.close()
+
+
+def comprimir_respuesta(respuesta):
+    # Registrada con app.after_request
+    if (not ACTIVA or respuesta.direct_passthrough or 'Content-Encoding' in respuesta.headers
+            or respuesta.status_code < 200 or respuesta.status_code in (204, 206, 304)
+            or respuesta.mimetype not in TIPOS or request.method == 'HEAD'):
+        return respuesta
+
+    respuesta.vary.add('Accept-Encoding')
+    codificacion = elegir_codificacion()
+    if codificacion is None:
+        return respuesta
+
+    compresor = COMPRESORES[codificacion]()
+    if respuesta.is_streamed:
+        respuesta.response = _en_flujo(respuesta.response, compresor)
+        respuesta.headers.pop('Content-Length', None)
+    else:
+        datos = respuesta.get_data()
+        if len(datos) < MINIMO:
+            return respuesta
+        respuesta.set_data(compresor.comprimir(datos) + compresor.terminar())
+
+    respuesta.headers['Content-Encoding'] = codificacion
+    etag, debil = respuesta.get_etag()
+    if etag:
+        respuesta.set_etag(etiqueta_codificada(etag, codificacion), weak=debil)
+    return respuesta
@@ -1,6 +1,79 @@
-import bcrypt
+from getpass import getpass
+import sys
 
-# Generar hash para la contraseña del admin
-password = "AdminSeguro2025!"
-hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-print("Hash para admin:", hashed.decode('utf-8'))
\ No newline at end of file
+from contrasenas import COSTO, costo_de, es_hash, hashear
+from database import obtener_bd
+
+# Administración de contraseñas (todas se guardan con bcrypt):
+#   python contra.py hash                 pide una contraseña e imprime su hash
+#   python contra.py cambiar <usuario>    pide una contraseña nueva y la guarda
+#   python contra.py revisar              lista cuentas en texto plano o con otro costo
+#   python contra.py migrar [--simular]   guarda con hash las que sigan en texto plano
+# BCRYPT_COSTO (12) fija el costo; las cuentas con otro costo se actualizan
+# solas en su siguiente inicio de sesión.
+
+
+def pedir_password():
+    password = getpass("Contraseña nueva: ")
+    if not password:
+        sys.exit("❌ La contraseña no puede estar vacía")
+    if getpass("Repite la contraseña: ") != password:
+        sys.exit("❌ Las contraseñas no coinciden")
+    return password
+
+
+def revisar(db):
+    pendientes = []
+    for maestro in db.maestros.find({}, {'usuario': 1, 'password': 1}):
+        guardado = maestro.get('password')
+        if not es_hash(guardado):
+            pendientes.append((maestro['usuario'], 'texto plano'))
+        elif costo_de(guardado) != COSTO:
+            pendientes.append((maestro['usuario'], f'costo {costo_de(guardado)}'))
+    return pendientes
+
+
+def migrar(db, simular=False):
+    # Idempotente: solo toca las contraseñas que no son hash de bcrypt
+    migradas = 0
+    for maestro in db.maestros.find({}, {'usuario': 1, 'password': 1}):
+        guardado = maestro.get('password')
+        if guardado is None or es_hash(guardado):
+            continue
+        if not simular:
+            # El filtro incluye el valor leído por si alguien la cambió mientras tanto
+            db.maestros.update_one({'_id': maestro['_id'], 'password': guardado}, {'$set': {'password': hashear(str(guardado))}})
+        print(f"🔐 {maestro['usuario']}")
+        migradas += 1
+    return migradas
+
+
+if __name__ == '__main__':
+    comando = sys.argv[1] if len(sys.argv) > 1 else None
+    if comando == 'hash':
+        print(hashear(pedir_password()))
+        sys.exit()
+    if comando not in ('cambiar', 'revisar', 'migrar') or (comando == 'cambiar' and len(sys.argv) < 3):
+        sys.exit("Uso: python contra.py hash | cambiar <usuario> | revisar | migrar [--simular]")
+
+    db = obtener_bd()
+    if db is None:
+        sys.exit("❌ No se pudo conectar a MongoDB")
+
+    if comando == 'cambiar':
+        usuario = sys.argv[2]
+        if db.maestros.find_one({'usuario': usuario}, {'_id': 1}) is None:
+            sys.exit(f"❌ No existe el usuario {usuario}")
+        db.maestros.update_one({'usuario': usuario}, {'$set': {'password': hashear(pedir_password())}})
+        print(f"✅ Contraseña de {usuario} actualizada")
+    elif comando == 'revisar':
+        pendientes = revisar(db)
+        for usuario, motivo in pendientes:
+            print(f"⚠️  {usuario}: {motivo}")
+        if not pendientes:
+            print(f"✅ Todas las contraseñas usan bcrypt con costo {COSTO}")
+    else:
+        simular = '--simular' in sys.argv
+        migradas = migrar(db, simular)
+        verbo = 'se migrarían' if simular else 'migradas'
+        print(f"✅ {migradas} contraseñas {verbo}")
@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TiempoAgotado
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+import bcrypt
+import hmac
+import os
+import threading
+
+# Contraseñas con bcrypt para todas las cuentas.
+#
+# bcrypt es lento a propósito (~250 ms con costo 12), así que la verificación
+# se hace en un pool de BCRYPT_HILOS hilos por worker (bcrypt suelta el GIL):
+# el worker sigue atendiendo otras peticiones mientras tanto. Si ya hay
+# BCRYPT_EN_ESPERA verificaciones pendientes se rechaza de inmediato
+# (ServidorOcupado) en lugar de formar una cola sin fin.
+#
+# Antes de calcular ningún hash se revisan los intentos fallidos recientes
+# por usuario y por IP (colección intentos_login, con índice TTL): una ola de
+# intentos adivinando contraseñas se rechaza sin gastar CPU.
+COSTO = int(os.environ.get('BCRYPT_COSTO', 12))
+HILOS = int(os.environ.get('BCRYPT_HILOS', 2))
+EN_ESPERA = int(os.environ.get('BCRYPT_EN_ESPERA', 16))
+ESPERA_MAXIMA = float(os.environ.get('BCRYPT_ESPERA_MAXIMA', 10))
+
+INTENTOS_USUARIO = int(os.environ.get('LOGIN_INTENTOS_USUARIO', 5))
+INTENTOS_IP = int(os.environ.get('LOGIN_INTENTOS_IP', 30))
+VENTANA_MINUTOS = int(os.environ.get('LOGIN_VENTANA_MINUTOS', 15))
+
+PREFIJOS_BCRYPT = ('$2a$', '$2b$', '$2y$')
+
+_ejecutor = None
+_pid_ejecutor = None
+_lock = threading.Lock()
+_lugares = threading.BoundedSemaphore(EN_ESPERA)
+_hash_ficticio = None
+
+
+class ServidorOcupado(RuntimeError):
+    pass
+
+
+def es_hash(valor):
+    return isinstance(valor, str) and valor.startswith(PREFIJOS_BCRYPT)
+
+
+def costo_de(hash_guardado):
+    # "$2b$12$..." -> 12
+    try:
+        return int(hash_guardado.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def hashear(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(COSTO)).decode('utf-8')
+
+
+def verificar(password, guardado):
+    # Devuelve (válida, necesita_rehash). Las contraseñas que aún estén en
+    # texto plano (datos anteriores a `python contra.py migrar`) se aceptan
+    # una vez y se marcan para guardarse con hash
+    global _hash_ficticio
+    if guardado is None:
+        # Usuario inexistente: se compara contra un hash cualquiera para que
+        # la respuesta tarde lo mismo y no revele qué usuarios existen
+        if _hash_ficticio is None:
+            _hash_ficticio = bcrypt.hashpw(b'usuario-inexistente', bcrypt.gensalt(COSTO))
+        bcrypt.checkpw(password.encode('utf-8'), _hash_ficticio)
+        return False, False
+    if not es_hash(guardado):
+        valida = hmac.compare_digest(password.encode('utf-8'), str(guardado).encode('utf-8'))
+        return valida, valida
+    try:
+        valida = bcrypt.checkpw(password.encode('utf-8'), guardado.encode('utf-8'))
+    except ValueError as e:
+        print(f"❌ Error verificando password: {e}")
+        return False, False
+    return valida, valida and costo_de(guardado) != COSTO
+
+
+def _pool():
+    global _ejecutor, _pid_ejecutor
+    pid = os.getpid()
+    if _ejecutor is None or _pid_ejecutor != pid:
+        with _lock:
+            if _ejecutor is None or _pid_ejecutor != pid:
+                _ejecutor = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix='bcrypt')
+                _pid_ejecutor = pid
+    return _ejecutor
+
+
+def en_pool(funcion, *argumentos):
+    # Ejecuta un cálculo de bcrypt en el pool; ServidorOcupado si ya hay
+    # demasiados pendientes en este worker o si no terminó en ESPERA_MAXIMA.
+    # El lugar se libera cuando el cálculo termina de verdad, no cuando se
+    # deja de esperarlo: si no, los que siguen en el pool tras un tiempo
+    # agotado no contarían y la cola crecería sin límite.
+    # En Python < 3.11 el TimeoutError de concurrent.futures no es el
+    # integrado, por eso se convierte aquí
+    if not _lugares.acquire(blocking=False):
+        raise ServidorOcupado("Demasiados inicios de sesión a la vez")
+    try:
+        futuro = _pool().submit(funcion, *argumentos)
+    except BaseException:
+        _lugares.release()
+        raise
+    futuro.add_done_callback(lambda _: _lugares.release())
+    try:
+        return futuro.result(timeout=ESPERA_MAXIMA)
+    except TiempoAgotado:
+        # Si aún no empezó, se quita de la cola (y el callback libera el lugar)
+        futuro.cancel()
+        raise ServidorOcupado(f"La verificación tardó más de {ESPERA_MAXIMA:g} s")
+
+
+def verificar_en_pool(password, guardado):
+    return en_pool(verificar, password, guardado)
+
+
+def actualizar_hash(db, maestro_id, password):
+    # Rehash oportunista: texto plano o costo distinto de BCRYPT_COSTO
+    try:
+        db.maestros.update_one({'_id': maestro_id}, {'$set': {'password': en_pool(hashear, password)}})
+        print(f"🔐 Contraseña del usuario {maestro_id} guardada con costo {COSTO}")
+    except (ServidorOcupado, PyMongoError) as e:
+        # No es urgente: se reintentará en el siguiente inicio de sesión
+        print(f"⚠️  No se pudo actualizar el hash de {maestro_id}: {e}")
+
+
+# --- Límite de intentos ---
+
+def _llaves(usuario, ip):
+    return {f'usuario:{usuario.lower()}': INTENTOS_USUARIO, f'ip:{ip}': INTENTOS_IP}
+
+
+def minutos_bloqueado(db, usuario, ip):
+    # Minutos que faltan si el usuario o la IP superaron sus intentos; 0 si no
+    llaves = _llaves(usuario, ip)
+    ahora = datetime.utcnow()
+    restantes = [
+        documento['expira'] - ahora
+        for documento in db.intentos_login.find({'_id': {'$in': list(llaves)}})
+        if documento.get('fallos', 0) >= llaves[documento['_id']] and documento.get('expira', ahora) > ahora
+    ]
+    if not restantes:
+        return 0
+    return max(1, round(max(restantes).total_seconds() / 60))
+
+
+def registrar_fallo(db, usuario, ip):
+    # La ventana empieza con el primer fallo; el índice TTL borra el
+    # documento cuando termina. En UTC: MongoDB compara el TTL en UTC y
+    # pymongo devuelve las fechas sin zona, también en UTC
+    expira = datetime.utcnow() + timedelta(minutes=VENTANA_MINUTOS)
+    db.intentos_login.bulk_write([
+        UpdateOne({'_id': llave}, {'$inc': {'fallos': 1}, '$setOnInsert': {'expira': expira}}, upsert=True)
+        for llave in _llaves(usuario, ip)
+    ], ordered=False)
+
+
+def limpiar_fallos(db, usuario):
+    # Solo los del usuario: la IP puede ser la de toda la escuela
+    db.intentos_login.delete_one({'_id': f'usuario:{usuario.lower()}'})
@@ -1,13 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+import contextvars
 import os
+import threading
 
-def conectar_mongodb():
+import metricas
+
+NOMBRE_BD = os.environ.get('MONGO_BD', 'sistema_calificaciones')
+# Consultas independientes de una misma petición que se lanzan a la vez (en_paralelo)
+CONSULTAS_PARALELAS = int(os.environ.get('CONSULTAS_PARALELAS', 4))
+
+# Un solo MongoClient por proceso (por worker de gunicorn). MongoClient ya
+# mantiene su propio pool de conexiones y es seguro entre hilos, pero no es
+# seguro tras un fork(): si el proceso cambia de PID se crea uno nuevo.
+_cliente = None
+_pid_cliente = None
+_lock = threading.Lock()
+_ejecutor = None
+_pid_ejecutor = None
+
+
+def obtener_uri():
+    # Railway usa MONGO_URL o MONGODB_URI; MONGO_URI se mantiene por compatibilidad
+    return (os.environ.get('MONGO_URL')
+            or os.environ.get('MONGODB_URI')
+            or os.environ.get('MONGO_URI')
+            or 'mongodb://localhost:27017/')
+
+
+def opciones_cliente():
+    return {
+        'maxPoolSize': int(os.environ.get('MONGO_MAX_POOL', 20)),
+        'minPoolSize': int(os.environ.get('MONGO_MIN_POOL', 0)),
+        'maxIdleTimeMS': int(os.environ.get('MONGO_MAX_IDLE_MS', 60000)),
+        'serverSelectionTimeoutMS': int(os.environ.get('MONGO_TIMEOUT_MS', 5000)),
+        'connectTimeoutMS': int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        'retryWrites': True,
+        'retryReads': True,
+        # No bloquear el arranque: la primera operación abre las conexiones
+        'connect': False,
+        # Conteo y duración de comandos para /metrics (ver metricas.py)
+        'event_listeners': [metricas.oyente_mongo] if metricas.ACTIVAS else [],
+    }
+
+
+def obtener_cliente():
+    global _cliente, _pid_cliente
+    pid = os.getpid()
+    if _cliente is not None and _pid_cliente == pid:
+        return _cliente
+
+    with _lock:
+        if _cliente is None or _pid_cliente != pid:
+            if _cliente is not None:
+                # Cliente heredado del proceso padre: no se cierra aquí porque
+                # sus sockets pertenecen al padre, solo se descarta
+                print(f"ℹ️  MongoDB: nuevo cliente tras fork (pid {pid})")
+            _cliente = MongoClient(obtener_uri(), **opciones_cliente())
+            _pid_cliente = pid
+            print(f"✅ Cliente MongoDB creado (pid {pid}, pool máx. {opciones_cliente()['maxPoolSize']})")
+    return _cliente
+
+
+def obtener_bd():
     try:
-        # Usa variable de entorno o local
-        mongo_uri = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-        cliente = MongoClient(mongo_uri)
-        db = cliente['sistema_calificaciones']
-        return db
-    except Exception as e:
-        print(f"Error de conexión: {e}")
-        return None
\ No newline at end of file
+        return obtener_cliente()[NOMBRE_BD]
+    except PyMongoError as e:
+        print(f"⚠️  Error de conexión a MongoDB: {e}")
+        reiniciar_cliente()
+        return None
+
+
+def reiniciar_cliente():
+    # Descarta el cliente actual; el siguiente obtener_bd() crea uno nuevo.
+    # No se cierra: otros hilos del worker (gthread, gevent, en_paralelo)
+    # pueden estar usándolo y fallarían con InvalidOperation. Sus conexiones
+    # se liberan cuando ya nadie lo referencia
+    global _cliente, _pid_cliente
+    with _lock:
+        _cliente = None
+        _pid_cliente = None
+
+
+def en_paralelo(*consultas):
+    # Ejecuta funciones sin argumentos a la vez y devuelve sus resultados en
+    # el mismo orden. Cada una toma su propia conexión del pool, así que el
+    # tiempo total es el de la más lenta y no la suma. Con workers gevent los
+    # hilos son corrutinas y el efecto es el mismo que asyncio.gather
+    global _ejecutor, _pid_ejecutor
+    if len(consultas) < 2 or CONSULTAS_PARALELAS < 2:
+        return [consulta() for consulta in consultas]
+    pid = os.getpid()
+    if _ejecutor is None or _pid_ejecutor != pid:
+        with _lock:
+            if _ejecutor is None or _pid_ejecutor != pid:
+                _ejecutor = ThreadPoolExecutor(max_workers=CONSULTAS_PARALELAS, thread_name_prefix='consultas')
+                _pid_ejecutor = pid
+    # Cada consulta corre con una copia del contexto de la petición, así sus
+    # comandos cuentan en las métricas de esa petición
+    futuros = [_ejecutor.submit(contextvars.copy_context().run, consulta) for consulta in consultas]
+    return [futuro.result() for futuro in futuros]
+
+
+def verificar_conexion():
+    # Ping explícito para health checks; reconecta si el cliente quedó inservible
+    try:
+        obtener_cliente().admin.command('ping')
+        return True
+    except PyMongoError as e:
+        print(f"⚠️  MongoDB no responde: {e}")
+        reiniciar_cliente()
+        return False
+
+
+def conectar_bd():
+    # Punto de entrada de las rutas: reutiliza el cliente del worker y en la
+    # primera llamada asegura los índices declarados
+    from indices import asegurar_indices_una_vez
+
+    db = obtener_bd()
+    if db is not None:
+        asegurar_indices_una_vez(db)
+    return db
+
+
+def conectar_mongodb():
+    # Se mantiene por compatibilidad con código anterior
+    return obtener_bd()
@@ -0,0 +1,100 @@
+import math
+from datetime import datetime
+
+MATERIAS = ['matematicas', 'espanol', 'ingles', 'ciencias', 'formacion']
+TRIMESTRES = ['primer_trimestre', 'segundo_trimestre', 'tercer_trimestre']
+GRUPOS = [f'{grado}°{letra}' for grado in range(1, 7) for letra in 'ABC']
+
+NOMBRES_MATERIAS = {
+    'matematicas': 'Matemáticas',
+    'espanol': 'Español',
+    'ingles': 'Inglés',
+    'ciencias': 'Ciencias',
+    'formacion': 'Formación Cívica',
+}
+ICONOS_MATERIAS = {
+    'matematicas': '🔢',
+    'espanol': '📚',
+    'ingles': '🌐',
+    'ciencias': '🔬',
+    'formacion': '⭐',
+}
+
+CALIFICACION_MINIMA = 5
+CALIFICACION_MAXIMA = 10
+CALIFICACION_APROBATORIA = 6
+
+
+def es_calificacion_capturada(valor):
+    # Los alumnos nuevos se crean con 0 en cada materia: 0 significa "sin capturar"
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and valor > 0
+
+
+def promedio_sin_redondear(calificaciones_trimestre):
+    valores = [calificaciones_trimestre.get(materia) for materia in MATERIAS]
+    capturadas = [valor for valor in valores if es_calificacion_capturada(valor)]
+    if not capturadas:
+        return None
+    return sum(capturadas) / len(capturadas)
+
+
+def redondear(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+def calcular_promedio(calificaciones_trimestre):
+    # Promedio de las materias capturadas; 0 si todavía no hay ninguna
+    promedio = promedio_sin_redondear(calificaciones_trimestre or {})
+    return redondear(promedio) if promedio is not None else 0
+
+
+def calificaciones_vacias():
+    return {trimestre: {materia: 0 for materia in MATERIAS} for trimestre in TRIMESTRES}
+
+
+def nuevo_alumno(nombre, apellidos, grupo, calificaciones=None):
+    # Documento de un alumno recién inscrito (sin _id). `calificaciones` puede
+    # traer algunas materias ya capturadas: {trimestre: {materia: valor}}
+    documento = {
+        'nombre': nombre,
+        'apellidos': apellidos,
+        'grupo': grupo,
+        'calificaciones': calificaciones_vacias(),
+        'fecha_registro': datetime.now()
+    }
+    for trimestre, valores in (calificaciones or {}).items():
+        documento['calificaciones'][trimestre].update(valores)
+    return documento
+
+
+def nombre_trimestre(trimestre):
+    return trimestre.replace('_', ' ').title()
+
+
+def validar_calificaciones(datos, materias=MATERIAS):
+    # Convierte y valida las calificaciones de `materias` tomadas de `datos`
+    # (formulario o JSON). Devuelve (calificaciones, errores).
+    calificaciones = {}
+    errores = []
+    for materia in materias:
+        valor = datos.get(materia)
+        if valor is None or valor == '':
+            errores.append(f"Falta la calificación de {NOMBRES_MATERIAS[materia]}")
+            continue
+        try:
+            if isinstance(valor, bool):
+                raise ValueError
+            valor = float(valor)
+        except (TypeError, ValueError):
+            errores.append(f"La calificación de {NOMBRES_MATERIAS[materia]} no es un número")
+            continue
+        # float() acepta 'nan' e 'inf', y NaN pasaría la comparación de rango
+        if not math.isfinite(valor):
+            errores.append(f"La calificación de {NOMBRES_MATERIAS[materia]} no es un número")
+            continue
+        if valor < CALIFICACION_MINIMA or valor > CALIFICACION_MAXIMA:
+            errores.append(f"La calificación de {NOMBRES_MATERIAS[materia]} debe estar entre "
+                           f"{CALIFICACION_MINIMA} y {CALIFICACION_MAXIMA}")
+            continue
+        calificaciones[materia] = valor
+    return calificaciones, errores
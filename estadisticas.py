@@ -0,0 +1,402 @@
+import os
+import threading
+import time
+
+from database import en_paralelo
+from escuela import (
+    MATERIAS, TRIMESTRES, CALIFICACION_APROBATORIA,
+    es_calificacion_capturada, promedio_sin_redondear, redondear
+)
+
+# Con ESTADISTICAS_EN_PYTHON=1 los cálculos se hacen en Python sobre los
+# documentos (útil con mongomock, que no implementa todos los operadores)
+EN_PYTHON = os.environ.get('ESTADISTICAS_EN_PYTHON') == '1'
+
+# Con PROMEDIOS_MATERIALIZADOS=1 (por defecto) se leen los promedios que
+# promedios.py guarda al escribir: alumnos.promedios.<trimestre> y la
+# colección resumen_grupos. Si falta alguno se calcula como antes
+USAR_MATERIALIZADOS = os.environ.get('PROMEDIOS_MATERIALIZADOS', '1') == '1'
+
+# Segundos que se reutilizan las estadísticas del panel de administración
+TABLERO_TTL = float(os.environ.get('TABLERO_TTL', 30))
+GRADOS = range(1, 7)
+
+_tablero = {'valor': None, 'expira': 0.0}
+_lock_tablero = threading.Lock()
+
+
+# --- Expresiones de agregación ---
+
+def _ruta(trimestre, materia):
+    return f'$calificaciones.{trimestre}.{materia}'
+
+
+def _expr_capturada(valor):
+    return {'$and': [{'$isNumber': valor}, {'$gt': [valor, 0]}]}
+
+
+def _expr_promedio(trimestre):
+    # $avg con una lista de expresiones ignora los null (materias sin
+    # capturar) y devuelve null si no queda ninguna, igual que
+    # promedio_sin_redondear()
+    return {'$avg': [_expr_materia(trimestre, materia) for materia in MATERIAS]}
+
+
+def _expr_promedio_guardado(trimestre):
+    # Los alumnos que aún no tienen el promedio materializado lo calculan
+    if not USAR_MATERIALIZADOS:
+        return _expr_promedio(trimestre)
+    return {'$ifNull': [f'$promedios.{trimestre}', _expr_promedio(trimestre)]}
+
+
+def _expr_materia(trimestre, materia):
+    # null cuando la materia no está capturada, para que $avg la ignore
+    valor = _ruta(trimestre, materia)
+    return {'$cond': [_expr_capturada(valor), valor, None]}
+
+
+def pipeline_alumnos(filtro, trimestre, orden=None, limite=None):
+    pipeline = [{'$match': filtro}]
+    if orden:
+        pipeline.append({'$sort': dict(orden)})
+    if limite:
+        pipeline.append({'$limit': limite})
+    pipeline.append({'$project': {
+        'nombre': 1,
+        'apellidos': 1,
+        'grupo': 1,
+        'calificaciones': f'$calificaciones.{trimestre}',
+        'promedio': _expr_promedio_guardado(trimestre),
+    }})
+    return pipeline
+
+
+def pipeline_resumen(filtro, trimestre, por_grupo=False):
+    proyeccion = {'grupo': 1, 'promedio': _expr_promedio_guardado(trimestre)}
+    for materia in MATERIAS:
+        proyeccion[materia] = _expr_materia(trimestre, materia)
+
+    calificado = {'$ne': [{'$ifNull': ['$promedio', None]}, None]}
+    agrupacion = {
+        '_id': '$grupo' if por_grupo else None,
+        'total': {'$sum': 1},
+        'promedio': {'$avg': '$promedio'},
+        'aprobados': {'$sum': {'$cond': [
+            {'$and': [calificado, {'$gte': ['$promedio', CALIFICACION_APROBATORIA]}]}, 1, 0]}},
+        'reprobados': {'$sum': {'$cond': [
+            {'$and': [calificado, {'$lt': ['$promedio', CALIFICACION_APROBATORIA]}]}, 1, 0]}},
+    }
+    for materia in MATERIAS:
+        agrupacion[materia] = {'$avg': f'${materia}'}
+
+    pipeline = [{'$match': filtro}, {'$project': proyeccion}, {'$group': agrupacion}]
+    if por_grupo:
+        pipeline.append({'$sort': {'_id': 1}})
+    return pipeline
+
+
+def pipeline_tablero():
+    # Una sola consulta para todo el panel: se parte de los maestros activos,
+    # se unen los alumnos con $unionWith y $facet calcula cada bloque
+    es_alumno = {'$match': {'tipo': 'alumno'}}
+    proyeccion_alumnos = {'tipo': {'$literal': 'alumno'}, 'grupo': 1}
+    por_trimestre = {'_id': None}
+    for trimestre in TRIMESTRES:
+        proyeccion_alumnos[trimestre] = _expr_promedio(trimestre)
+        por_trimestre[f'{trimestre}_promedio'] = {'$avg': f'${trimestre}'}
+        por_trimestre[f'{trimestre}_reprobados'] = {'$sum': {'$cond': [
+            {'$and': [
+                {'$ne': [{'$ifNull': [f'${trimestre}', None]}, None]},
+                {'$lt': [f'${trimestre}', CALIFICACION_APROBATORIA]},
+            ]}, 1, 0]}}
+
+    return [
+        {'$match': {'rol': 'maestro', 'activo': True}},
+        {'$project': {'_id': 0, 'tipo': {'$literal': 'maestro'}}},
+        {'$unionWith': {'coll': 'alumnos', 'pipeline': [{'$project': proyeccion_alumnos}]}},
+        {'$facet': {
+            'maestros': [{'$match': {'tipo': 'maestro'}}, {'$count': 'total'}],
+            'alumnos': [es_alumno, {'$count': 'total'}],
+            'por_grado': [
+                es_alumno,
+                {'$group': {'_id': {'$substrCP': ['$grupo', 0, 1]}, 'total': {'$sum': 1}}},
+            ],
+            'por_grupo': [
+                es_alumno,
+                {'$group': {'_id': '$grupo', 'total': {'$sum': 1}}},
+                {'$sort': {'_id': 1}},
+            ],
+            'por_trimestre': [es_alumno, {'$group': por_trimestre}],
+        }},
+    ]
+
+
+# --- Equivalentes en Python (mismos resultados, para pruebas y mongomock) ---
+
+def promedio_guardado(alumno, trimestre):
+    promedios = alumno.get('promedios') or {}
+    if USAR_MATERIALIZADOS and promedios.get(trimestre) is not None:
+        return promedios[trimestre]
+    return promedio_sin_redondear(alumno.get('calificaciones', {}).get(trimestre) or {})
+
+
+def alumno_con_promedio_python(alumno, trimestre):
+    calificaciones = alumno.get('calificaciones', {}).get(trimestre)
+    resultado = {
+        '_id': alumno['_id'],
+        'nombre': alumno.get('nombre'),
+        'apellidos': alumno.get('apellidos'),
+        'grupo': alumno.get('grupo'),
+        'promedio': promedio_guardado(alumno, trimestre),
+    }
+    if calificaciones is not None:
+        resultado['calificaciones'] = calificaciones
+    return resultado
+
+
+def resumen_python(alumnos, trimestre, por_grupo=False):
+    acumulados = {}
+    for alumno in alumnos:
+        llave = alumno.get('grupo') if por_grupo else None
+        acumulado = acumulados.setdefault(llave, {
+            'total': 0, 'promedios': [], 'aprobados': 0, 'reprobados': 0,
+            'materias': {materia: [] for materia in MATERIAS},
+        })
+        calificaciones = alumno.get('calificaciones', {}).get(trimestre) or {}
+        promedio = promedio_sin_redondear(calificaciones)
+
+        acumulado['total'] += 1
+        if promedio is not None:
+            acumulado['promedios'].append(promedio)
+            if promedio >= CALIFICACION_APROBATORIA:
+                acumulado['aprobados'] += 1
+            else:
+                acumulado['reprobados'] += 1
+        for materia in MATERIAS:
+            if es_calificacion_capturada(calificaciones.get(materia)):
+                acumulado['materias'][materia].append(calificaciones[materia])
+
+    def media(valores):
+        return sum(valores) / len(valores) if valores else None
+
+    resultados = []
+    for llave in sorted(acumulados, key=lambda g: (g is None, g)):
+        acumulado = acumulados[llave]
+        resultado = {
+            '_id': llave,
+            'total': acumulado['total'],
+            'promedio': media(acumulado['promedios']),
+            'aprobados': acumulado['aprobados'],
+            'reprobados': acumulado['reprobados'],
+        }
+        for materia in MATERIAS:
+            resultado[materia] = media(acumulado['materias'][materia])
+        resultados.append(resultado)
+    return resultados
+
+
+def tablero_python(maestros, alumnos):
+    # Mismo resultado que pipeline_tablero() a partir de los documentos
+    maestros_activos = sum(1 for m in maestros if m.get('rol') == 'maestro' and m.get('activo') is True)
+    por_grado, por_grupo, promedios = {}, {}, {t: [] for t in TRIMESTRES}
+    total = 0
+    for alumno in alumnos:
+        total += 1
+        grupo = alumno.get('grupo') or ''
+        por_grado[grupo[:1]] = por_grado.get(grupo[:1], 0) + 1
+        por_grupo[grupo] = por_grupo.get(grupo, 0) + 1
+        for trimestre in TRIMESTRES:
+            promedio = promedio_sin_redondear(alumno.get('calificaciones', {}).get(trimestre) or {})
+            if promedio is not None:
+                promedios[trimestre].append(promedio)
+
+    trimestres = {'_id': None}
+    for trimestre, valores in promedios.items():
+        trimestres[f'{trimestre}_promedio'] = sum(valores) / len(valores) if valores else None
+        trimestres[f'{trimestre}_reprobados'] = sum(1 for v in valores if v < CALIFICACION_APROBATORIA)
+
+    return {
+        'maestros': [{'total': maestros_activos}] if maestros_activos else [],
+        'alumnos': [{'total': total}] if total else [],
+        'por_grado': [{'_id': g, 'total': n} for g, n in por_grado.items()],
+        'por_grupo': [{'_id': g, 'total': n} for g, n in sorted(por_grupo.items())],
+        'por_trimestre': [trimestres] if total else [],
+    }
+
+
+# --- Resúmenes materializados (colección resumen_grupos) ---
+
+def id_resumen(grupo, trimestre):
+    return f'{grupo}|{trimestre}'
+
+
+def resumen_materializado(documento):
+    # Mismo formato que pipeline_resumen() a partir de las sumas y conteos
+    def media(suma, cantidad):
+        return suma / cantidad if cantidad else None
+
+    materias = documento.get('materias') or {}
+    resumen = {
+        '_id': documento['grupo'],
+        'total': documento.get('alumnos', 0),
+        'promedio': media(documento.get('suma_promedios', 0), documento.get('calificados', 0)),
+        'aprobados': documento.get('aprobados', 0),
+        'reprobados': documento.get('reprobados', 0),
+    }
+    for materia in MATERIAS:
+        datos = materias.get(materia) or {}
+        resumen[materia] = media(datos.get('suma', 0), datos.get('capturadas', 0))
+    return resumen
+
+
+def tablero_materializado(maestros_activos, resumenes):
+    # Mismo resultado que pipeline_tablero() a partir de resumen_grupos: los
+    # conteos por grupo se toman del primer trimestre (son iguales en todos)
+    por_grupo, por_grado = {}, {}
+    trimestres = {'_id': None}
+    sumas = {t: [0, 0, 0] for t in TRIMESTRES}
+    for documento in resumenes:
+        if documento.get('alumnos', 0) <= 0:
+            continue
+        trimestre = documento['trimestre']
+        if trimestre == TRIMESTRES[0]:
+            grupo = documento['grupo']
+            por_grupo[grupo] = documento['alumnos']
+            por_grado[grupo[:1]] = por_grado.get(grupo[:1], 0) + documento['alumnos']
+        if trimestre in sumas:
+            sumas[trimestre][0] += documento.get('suma_promedios', 0)
+            sumas[trimestre][1] += documento.get('calificados', 0)
+            sumas[trimestre][2] += documento.get('reprobados', 0)
+    for trimestre, (suma, calificados, reprobados) in sumas.items():
+        trimestres[f'{trimestre}_promedio'] = suma / calificados if calificados else None
+        trimestres[f'{trimestre}_reprobados'] = reprobados
+
+    total = sum(por_grupo.values())
+    return {
+        'maestros': [{'total': maestros_activos}] if maestros_activos else [],
+        'alumnos': [{'total': total}] if total else [],
+        'por_grado': [{'_id': g, 'total': n} for g, n in por_grado.items()],
+        'por_grupo': [{'_id': g, 'total': n} for g, n in sorted(por_grupo.items())],
+        'por_trimestre': [trimestres] if total else [],
+    }
+
+
+# --- API usada por las rutas ---
+
+def _redondear_alumno(alumno):
+    alumno['promedio'] = redondear(alumno.get('promedio')) or 0
+    return alumno
+
+
+def _redondear_resumen(resumen):
+    resumen['grupo'] = resumen.pop('_id')
+    resumen['promedio'] = redondear(resumen.get('promedio'))
+    for materia in MATERIAS:
+        resumen[materia] = redondear(resumen.get(materia))
+    return resumen
+
+
+def iterar_alumnos_con_promedio(db, filtro, trimestre, orden=None, tamano_lote=None, limite=None):
+    # Solo viajan los campos mostrados y el promedio del trimestre pedido.
+    # Con tamano_lote el cursor se consume por lotes sin cargar todo en memoria
+    if EN_PYTHON:
+        cursor = db.alumnos.find(filtro, batch_size=tamano_lote or 0)
+        if orden:
+            cursor = cursor.sort(orden)
+        if limite:
+            cursor = cursor.limit(limite)
+        alumnos = (alumno_con_promedio_python(alumno, trimestre) for alumno in cursor)
+    else:
+        opciones = {'batchSize': tamano_lote} if tamano_lote else {}
+        alumnos = db.alumnos.aggregate(pipeline_alumnos(filtro, trimestre, orden, limite), **opciones)
+    for alumno in alumnos:
+        yield _redondear_alumno(alumno)
+
+
+def alumnos_con_promedio(db, filtro, trimestre, orden=None):
+    return list(iterar_alumnos_con_promedio(db, filtro, trimestre, orden))
+
+
+def resumen_grupo(db, grupo, trimestre):
+    if USAR_MATERIALIZADOS:
+        # Una lectura por _id en lugar de recorrer los alumnos del grupo
+        documento = db.resumen_grupos.find_one({'_id': id_resumen(grupo, trimestre)})
+        if documento is not None:
+            if documento.get('alumnos', 0) <= 0:
+                return None
+            return _redondear_resumen(resumen_materializado(documento))
+
+    filtro = {'grupo': grupo}
+    if EN_PYTHON:
+        resultados = resumen_python(db.alumnos.find(filtro), trimestre)
+    else:
+        resultados = list(db.alumnos.aggregate(pipeline_resumen(filtro, trimestre)))
+    if not resultados:
+        return None
+    resumen = _redondear_resumen(resultados[0])
+    resumen['grupo'] = grupo
+    return resumen
+
+
+def resumen_por_grupo(db, trimestre, filtro=None):
+    filtro = filtro or {}
+    if EN_PYTHON:
+        resultados = resumen_python(db.alumnos.find(filtro), trimestre, por_grupo=True)
+    else:
+        resultados = db.alumnos.aggregate(pipeline_resumen(filtro, trimestre, por_grupo=True))
+    return [_redondear_resumen(resumen) for resumen in resultados]
+
+
+def _formatear_tablero(facetas):
+    def total(faceta):
+        return facetas[faceta][0]['total'] if facetas[faceta] else 0
+
+    conteo_grados = {item['_id']: item['total'] for item in facetas['por_grado']}
+    trimestres = facetas['por_trimestre'][0] if facetas['por_trimestre'] else {}
+    return {
+        'total_maestros': total('maestros'),
+        'total_alumnos': total('alumnos'),
+        'alumnos_por_grado': {f'{grado}°': conteo_grados.get(str(grado), 0) for grado in GRADOS},
+        'alumnos_por_grupo': {item['_id']: item['total'] for item in facetas['por_grupo']},
+        'trimestres': {
+            trimestre: {
+                'promedio': redondear(trimestres.get(f'{trimestre}_promedio')),
+                'reprobados': trimestres.get(f'{trimestre}_reprobados', 0),
+            }
+            for trimestre in TRIMESTRES
+        },
+    }
+
+
+def calcular_tablero(db):
+    if USAR_MATERIALIZADOS:
+        # Las dos consultas son independientes: se lanzan a la vez
+        resumenes, maestros = en_paralelo(
+            lambda: list(db.resumen_grupos.find()),
+            lambda: db.maestros.count_documents({'rol': 'maestro', 'activo': True})
+        )
+        if resumenes:
+            return _formatear_tablero(tablero_materializado(maestros, resumenes))
+
+    if EN_PYTHON:
+        facetas = tablero_python(db.maestros.find(), db.alumnos.find())
+    else:
+        facetas = next(db.maestros.aggregate(pipeline_tablero()))
+    return _formatear_tablero(facetas)
+
+
+def obtener_tablero(db):
+    # Cacheado por worker durante TABLERO_TTL segundos: recargar el panel
+    # cuesta como mucho una consulta por intervalo
+    ahora = time.monotonic()
+    if _tablero['valor'] is not None and ahora < _tablero['expira']:
+        return _tablero['valor']
+    with _lock_tablero:
+        if _tablero['valor'] is None or time.monotonic() >= _tablero['expira']:
+            _tablero['valor'] = calcular_tablero(db)
+            _tablero['expira'] = time.monotonic() + TABLERO_TTL
+        return _tablero['valor']
+
+
+def invalidar_tablero():
+    _tablero['expira'] = 0.0
@@ -0,0 +1,142 @@
+import csv
+import importlib.util
+import io
+import os
+import tempfile
+
+from escuela import CALIFICACION_APROBATORIA, MATERIAS, NOMBRES_MATERIAS, es_calificacion_capturada
+from estadisticas import iterar_alumnos_con_promedio
+from paginacion import ORDEN_ALUMNOS
+
+# Exportación de reportes a CSV/XLSX directamente desde el cursor de MongoDB.
+# Nunca se arma la lista completa de alumnos: el CSV sale en flujo cada
+# EXPORTAR_FILAS_POR_ENVIO filas. El XLSX no sale en flujo: es un zip que
+# openpyxl solo puede escribir al final (save), así que el primer byte sale
+# cuando el libro está completo. Las filas se escriben en modo write_only (van
+# a disco, no a memoria) y el libro se guarda en un SpooledTemporaryFile (en
+# memoria hasta EXPORTAR_XLSX_EN_MEMORIA bytes) que se envía por fragmentos.
+# Para toda la escuela conviene el trabajo en segundo plano (trabajos.py).
+TAMANO_LOTE = int(os.environ.get('MONGO_TAMANO_LOTE', 200))
+FILAS_POR_ENVIO = int(os.environ.get('EXPORTAR_FILAS_POR_ENVIO', 500))
+XLSX_EN_MEMORIA = int(os.environ.get('EXPORTAR_XLSX_EN_MEMORIA', 4 * 1024 * 1024))
+TAMANO_FRAGMENTO = 64 * 1024
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+ENCABEZADO = ['Grupo', 'Apellidos', 'Nombre'] + [NOMBRES_MATERIAS[materia] for materia in MATERIAS] + ['Promedio', 'Situación']
+
+
+class ErrorExportacion(ValueError):
+    pass
+
+
+def situacion(promedio):
+    if not promedio:
+        return 'Sin calificaciones'
+    return 'Aprobado' if promedio >= CALIFICACION_APROBATORIA else 'Reprobado'
+
+
+def _texto_seguro(valor):
+    # Evita que Excel interprete nombres como fórmulas (=, +, -, @)
+    if isinstance(valor, str) and valor[:1] in ('=', '+', '-', '@'):
+        return "'" + valor
+    return valor
+
+
+def iterar_filas(db, filtro, trimestre):
+    # Una fila por alumno, en el orden del índice (grupo, apellidos, nombre)
+    for alumno in iterar_alumnos_con_promedio(db, filtro, trimestre, ORDEN_ALUMNOS, TAMANO_LOTE):
+        calificaciones = alumno.get('calificaciones') or {}
+        valores = [calificaciones.get(materia) for materia in MATERIAS]
+        yield [
+            alumno.get('grupo'), _texto_seguro(alumno.get('apellidos')), _texto_seguro(alumno.get('nombre')),
+            *[valor if es_calificacion_capturada(valor) else None for valor in valores],
+            alumno['promedio'] or None,
+            situacion(alumno['promedio']),
+        ]
+
+
+def exportar_csv(filas):
+    # BOM para que Excel reconozca UTF-8 (acentos y °)
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    escritor = csv.writer(buffer)
+    escritor.writerow(ENCABEZADO)
+    for i, fila in enumerate(filas, start=1):
+        escritor.writerow(['' if valor is None else valor for valor in fila])
+        if i % FILAS_POR_ENVIO == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def verificar_xlsx():
+    if importlib.util.find_spec('openpyxl') is None:
+        raise ErrorExportacion("Para exportar a .xlsx instala openpyxl (pip install openpyxl)")
+
+
+def exportar_xlsx(filas, titulo):
+    # Una hoja por grupo: las filas ya vienen ordenadas por grupo, así que
+    # cada hoja se abre cuando cambia el grupo y no hay que volver atrás
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = None
+    grupo_actual = object()
+    for fila in filas:
+        if fila[0] != grupo_actual:
+            grupo_actual = fila[0]
+            hoja = libro.create_sheet(title=_nombre_hoja(grupo_actual))
+            hoja.append(ENCABEZADO)
+        hoja.append(fila)
+    if hoja is None:
+        libro.create_sheet(title=_nombre_hoja(titulo)).append(ENCABEZADO)
+
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_EN_MEMORIA) as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            fragmento = archivo.read(TAMANO_FRAGMENTO)
+            if not fragmento:
+                break
+            yield fragmento
+
+
+def _nombre_hoja(texto):
+    # Excel no admite []:*?/\ en el nombre de la hoja y lo limita a 31 caracteres
+    for caracter in '[]:*?/\\':
+        texto = texto.replace(caracter, '')
+    return texto[:31] or 'Reporte'
+
+
+def nombre_archivo(grupo, trimestre, formato):
+    base = 'escuela' if grupo is None else grupo.replace('°', '')
+    return f'calificaciones_{base}_{trimestre}.{formato}'
+
+
+def _con_progreso(filas, progreso):
+    for i, fila in enumerate(filas, start=1):
+        if i % FILAS_POR_ENVIO == 0:
+            progreso(i)
+        yield fila
+
+
+def exportar(db, grupo, trimestre, formato, progreso=None):
+    # grupo=None exporta toda la escuela. Devuelve un generador de bytes;
+    # lanza ErrorExportacion antes de tocar la base si el formato no sirve.
+    # progreso(filas) se llama cada EXPORTAR_FILAS_POR_ENVIO filas
+    if formato not in FORMATOS:
+        raise ErrorExportacion(f"Formato no soportado: {formato}")
+    if formato == 'xlsx':
+        verificar_xlsx()
+
+    filas = iterar_filas(db, {} if grupo is None else {'grupo': grupo}, trimestre)
+    if progreso:
+        filas = _con_progreso(filas, progreso)
+    if formato == 'csv':
+        return exportar_csv(filas)
+    return exportar_xlsx(filas, grupo or 'Escuela')
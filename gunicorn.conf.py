@@ -0,0 +1,30 @@
+import os
+
+# Configuración de gunicorn (se carga sola desde la carpeta del proyecto).
+# GUNICORN_MODO elige cómo atiende peticiones cada worker:
+#   sync   - una petición a la vez por worker (comportamiento anterior)
+#   hilos  - gthread: GUNICORN_HILOS peticiones a la vez por worker. pymongo
+#            suelta el GIL mientras espera a MongoDB, así que las peticiones
+#            que esperan a la base no bloquean a las demás
+#   gevent - corrutinas (requiere `pip install gevent`): GUNICORN_CONEXIONES
+#            peticiones en espera por worker con el mismo código síncrono;
+#            pymongo es compatible con el monkey patching de gevent
+# El número de workers sigue saliendo de WEB_CONCURRENCY (por defecto 1).
+MODO = os.environ.get('GUNICORN_MODO', 'sync')
+
+if MODO == 'hilos':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_HILOS', 8))
+elif MODO == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_CONEXIONES', 200))
+elif MODO != 'sync':
+    raise RuntimeError(f"GUNICORN_MODO desconocido: {MODO} (usa sync, hilos o gevent)")
+
+
+def on_starting(server):
+    # Con METRICAS_DIR, los contadores volcados por los workers de la
+    # ejecución anterior no se suman a los nuevos (ver metricas.py)
+    import metricas
+    if metricas.DIRECTORIO:
+        metricas.limpiar_directorio()
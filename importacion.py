@@ -0,0 +1,259 @@
+from pymongo.errors import BulkWriteError
+import codecs
+import csv
+import os
+import sys
+
+from cache_grupos import invalidar_grupos
+from database import obtener_bd
+from escuela import GRUPOS, MATERIAS, TRIMESTRES, nombre_trimestre, nuevo_alumno, validar_calificaciones
+from estadisticas import invalidar_tablero
+from promedios import preparar_alta, registrar_altas
+from secuencias import reservar_ids
+
+# Importación masiva de alumnos desde CSV o XLSX. Columnas obligatorias:
+# nombre, apellidos, grupo. Opcionales, una por materia y trimestre:
+# primer_trimestre.matematicas, segundo_trimestre.ingles, ... (vacío = sin capturar)
+#
+# El archivo se procesa por bloques: cada bloque se valida en memoria, los
+# duplicados contra la base se buscan con una sola consulta $in, los ids se
+# reservan de una vez y se inserta con insert_many(ordered=False).
+TAMANO_BLOQUE = int(os.environ.get('IMPORTAR_TAMANO_BLOQUE', 1000))
+MAXIMO_ERRORES = int(os.environ.get('IMPORTAR_MAXIMO_ERRORES', 500))
+
+COLUMNAS_OBLIGATORIAS = ['nombre', 'apellidos', 'grupo']
+COLUMNAS_CALIFICACIONES = {
+    f'{trimestre}.{materia}': (trimestre, materia)
+    for trimestre in TRIMESTRES for materia in MATERIAS
+}
+
+
+class ErrorImportacion(ValueError):
+    pass
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _filas_csv(archivo):
+    # codecs.getreader solo necesita read() y seek(): io.TextIOWrapper exige la
+    # interfaz io completa, y el SpooledTemporaryFile de las subidas de Werkzeug
+    # no tiene readable() en Python < 3.11
+    texto = codecs.getreader('utf-8-sig')(archivo)
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    yield from lector
+
+
+def _filas_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorImportacion("Para importar archivos .xlsx instala openpyxl (pip install openpyxl)")
+    # read_only recorre la hoja sin cargarla completa en memoria
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        for fila in libro.worksheets[0].iter_rows(values_only=True):
+            yield fila
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre_archivo):
+    # Genera (número de fila, {columna: texto}) con la numeración del archivo:
+    # la fila 1 es el encabezado
+    if nombre_archivo.lower().endswith('.xlsx'):
+        filas = _filas_xlsx(archivo)
+    elif nombre_archivo.lower().endswith(('.csv', '.txt')):
+        filas = _filas_csv(archivo)
+    else:
+        raise ErrorImportacion("Formato no soportado: usa un archivo .csv o .xlsx")
+
+    encabezado = next(filas, None)
+    if not encabezado:
+        raise ErrorImportacion("El archivo está vacío")
+    columnas = [_texto(columna).lower() for columna in encabezado]
+    faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in columnas]
+    if faltantes:
+        raise ErrorImportacion(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    desconocidas = [c for c in columnas if c and c not in COLUMNAS_OBLIGATORIAS and c not in COLUMNAS_CALIFICACIONES]
+    if desconocidas:
+        raise ErrorImportacion(f"Columnas desconocidas: {', '.join(desconocidas)}")
+
+    for numero, fila in enumerate(filas, start=2):
+        valores = {columna: _texto(valor) for columna, valor in zip(columnas, fila) if columna}
+        if any(valores.values()):
+            yield numero, valores
+
+
+def validar_fila(valores):
+    # Devuelve (documento, errores) para una fila del archivo
+    errores = [f"Falta '{columna}'" for columna in COLUMNAS_OBLIGATORIAS if not valores.get(columna)]
+    grupo = valores.get('grupo')
+    if grupo and grupo not in GRUPOS:
+        errores.append(f"Grupo desconocido: {grupo}")
+
+    calificaciones = {}
+    for columna, (trimestre, materia) in COLUMNAS_CALIFICACIONES.items():
+        if not valores.get(columna):
+            continue
+        convertidas, errores_materia = validar_calificaciones({materia: valores[columna]}, [materia])
+        errores.extend(f"{nombre_trimestre(trimestre)}: {error}" for error in errores_materia)
+        calificaciones.setdefault(trimestre, {}).update(convertidas)
+
+    if errores:
+        return None, errores
+    return nuevo_alumno(valores['nombre'], valores['apellidos'], grupo, calificaciones), []
+
+
+def _llave(documento):
+    return (documento['grupo'], documento['apellidos'], documento['nombre'])
+
+
+class Importacion:
+    def __init__(self, db, simular=False, progreso=None):
+        self.db = db
+        self.simular = simular
+        self.progreso = progreso
+        self.filas = 0
+        self.insertados = 0
+        self.errores = []
+        self.errores_omitidos = 0
+        self.vistas = set()
+        self.grupos = set()
+
+    def error(self, numero, errores):
+        if len(self.errores) < MAXIMO_ERRORES:
+            self.errores.append({'fila': numero, 'errores': errores})
+        else:
+            self.errores_omitidos += 1
+
+    def procesar(self, filas):
+        bloque = []
+        for numero, valores in filas:
+            bloque.append((numero, valores))
+            if len(bloque) == TAMANO_BLOQUE:
+                self.procesar_bloque(bloque)
+                bloque = []
+                if self.progreso:
+                    self.progreso(self.filas, self.insertados)
+        if bloque:
+            self.procesar_bloque(bloque)
+        if self.insertados and not self.simular:
+            invalidar_tablero()
+            invalidar_grupos(self.db, self.grupos)
+        return self.resultado()
+
+    def procesar_bloque(self, bloque):
+        self.filas += len(bloque)
+        candidatos = []
+        for numero, valores in bloque:
+            documento, errores = validar_fila(valores)
+            if errores:
+                self.error(numero, errores)
+            elif _llave(documento) in self.vistas:
+                self.error(numero, ["Alumno repetido en el archivo"])
+            else:
+                self.vistas.add(_llave(documento))
+                candidatos.append((numero, documento))
+        if not candidatos:
+            return
+
+        # Una consulta por bloque; el filtro usa el prefijo del índice único
+        # (grupo, apellidos, nombre) y el cruce exacto se hace aquí
+        documentos = [documento for _, documento in candidatos]
+        existentes = {
+            _llave(alumno) for alumno in self.db.alumnos.find(
+                {
+                    'grupo': {'$in': list({d['grupo'] for d in documentos})},
+                    'apellidos': {'$in': list({d['apellidos'] for d in documentos})},
+                    'nombre': {'$in': list({d['nombre'] for d in documentos})},
+                },
+                {'_id': 0, 'grupo': 1, 'apellidos': 1, 'nombre': 1}
+            )
+        }
+        nuevos = []
+        for numero, documento in candidatos:
+            if _llave(documento) in existentes:
+                self.error(numero, [f"El alumno ya existe en el grupo {documento['grupo']}"])
+            else:
+                nuevos.append((numero, documento))
+        if not nuevos or self.simular:
+            self.insertados += len(nuevos)
+            return
+
+        for alumno_id, (_, documento) in zip(reservar_ids(self.db, 'alumnos', len(nuevos)), nuevos):
+            documento['_id'] = alumno_id
+            preparar_alta(documento)
+        fallidos = set()
+        try:
+            resultado = self.db.alumnos.insert_many([documento for _, documento in nuevos], ordered=False)
+            self.insertados += len(resultado.inserted_ids)
+        except BulkWriteError as e:
+            # Con ordered=False se insertan todas las demás; las que chocaron
+            # (p. ej. otro admin inscribió al mismo alumno) se reportan
+            self.insertados += e.details.get('nInserted', 0)
+            for fallo in e.details.get('writeErrors', []):
+                fallidos.add(fallo['index'])
+                numero, documento = nuevos[fallo['index']]
+                mensaje = (f"El alumno ya existe en el grupo {documento['grupo']}"
+                           if fallo.get('code') == 11000 else fallo.get('errmsg', 'Error al insertar'))
+                self.error(numero, [mensaje])
+        # Un solo $inc por grupo y trimestre para todo el bloque
+        insertados = [documento for i, (_, documento) in enumerate(nuevos) if i not in fallidos]
+        registrar_altas(self.db, insertados)
+        self.grupos.update(documento['grupo'] for documento in insertados)
+
+    def resultado(self):
+        return {
+            'filas': self.filas,
+            'insertados': self.insertados,
+            'con_errores': len(self.errores) + self.errores_omitidos,
+            'errores': sorted(self.errores, key=lambda error: error['fila']),
+            'simulacion': self.simular,
+        }
+
+
+def importar_alumnos(db, archivo, nombre_archivo, simular=False, progreso=None):
+    # Lanza ErrorImportacion si el archivo no se puede leer; los errores por
+    # fila no detienen la importación y se devuelven en el resultado.
+    # progreso(filas, insertados) se llama al terminar cada bloque
+    return Importacion(db, simular, progreso).procesar(leer_filas(archivo, nombre_archivo))
+
+
+def plantilla_csv(con_calificaciones=True):
+    columnas = COLUMNAS_OBLIGATORIAS + (list(COLUMNAS_CALIFICACIONES) if con_calificaciones else [])
+    return ','.join(columnas) + '\r\n'
+
+
+if __name__ == '__main__':
+    # python importacion.py alumnos.csv [--simular]
+    argumentos = [argumento for argumento in sys.argv[1:] if not argumento.startswith('--')]
+    if len(argumentos) != 1:
+        sys.exit("Uso: python importacion.py <archivo.csv|archivo.xlsx> [--simular]")
+
+    db = obtener_bd()
+    if db is None:
+        sys.exit("❌ No se pudo conectar a MongoDB")
+
+    try:
+        with open(argumentos[0], 'rb') as archivo:
+            resultado = importar_alumnos(db, archivo, argumentos[0], simular='--simular' in sys.argv)
+    except ErrorImportacion as e:
+        sys.exit(f"❌ {e}")
+
+    for error in resultado['errores']:
+        print(f"⚠️  Fila {error['fila']}: {'; '.join(error['errores'])}")
+    verbo = 'se insertarían' if resultado['simulacion'] else 'insertados'
+    print(f"✅ {resultado['filas']} filas leídas, {resultado['insertados']} alumnos {verbo}, "
+          f"{resultado['con_errores']} con errores")
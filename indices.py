@@ -0,0 +1,232 @@
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+import os
+import sys
+import threading
+
+from database import obtener_bd
+
+# Índices declarados por colección: nombre -> (llaves, opciones)
+INDICES = {
+    'alumnos': {
+        'grupo_apellidos_nombre_unico': (
+            [('grupo', ASCENDING), ('apellidos', ASCENDING), ('nombre', ASCENDING)],
+            {'unique': True}
+        ),
+        # Orden de las páginas (paginacion.ORDEN_ALUMNOS), con _id al final.
+        # Repite a propósito las llaves del índice único: el _id de desempate
+        # (datos viejos con homónimos, ver paginacion.py) solo se resuelve sin
+        # ordenar en memoria si un índice cubre el orden completo, y el único
+        # no lo cubre. Cuesta una entrada de índice más por alumno.
+        'grupo_apellidos_nombre_id': (
+            [('grupo', ASCENDING), ('apellidos', ASCENDING), ('nombre', ASCENDING), ('_id', ASCENDING)],
+            {}
+        ),
+    },
+    'maestros': {
+        'usuario_unico': ([('usuario', ASCENDING)], {'unique': True}),
+        'grupo': ([('grupo', ASCENDING)], {}),
+    },
+    'trabajos': {
+        'estado_creado': ([('estado', ASCENDING), ('creado', ASCENDING)], {}),
+    },
+    'sesiones': {
+        # Borra en lote las sesiones vencidas (ver sesiones.py)
+        'expira_ttl': ([('expira', ASCENDING)], {'expireAfterSeconds': 0}),
+    },
+    'intentos_login': {
+        # Borra cada ventana de intentos fallidos cuando termina
+        'expira_ttl': ([('expira', ASCENDING)], {'expireAfterSeconds': 0}),
+    },
+}
+
+# Consultas de las rutas que deben resolverse con un índice (sin COLLSCAN
+# ni ordenamiento en memoria): (descripción, colección, filtro, orden)
+CONSULTAS_CRITICAS = [
+    ('ver_calificaciones / reportes (grupo)', 'alumnos',
+     {'grupo': '1°A'}, [('grupo', ASCENDING), ('apellidos', ASCENDING), ('nombre', ASCENDING), ('_id', ASCENDING)]),
+    ('ver_calificaciones (admin, todos los grupos)', 'alumnos',
+     {}, [('grupo', ASCENDING), ('apellidos', ASCENDING), ('nombre', ASCENDING), ('_id', ASCENDING)]),
+    ('agregar_alumno (duplicados)', 'alumnos',
+     {'nombre': 'N', 'apellidos': 'A', 'grupo': '1°A'}, None),
+    ('iniciar_sesion', 'maestros',
+     {'usuario': 'm1a', 'activo': True}, None),
+    ('reportes (maestro del grupo)', 'maestros',
+     {'grupo': '1°A'}, None),
+    ('trabajos.py (siguiente en la cola)', 'trabajos',
+     {'estado': 'pendiente'}, [('creado', ASCENDING)]),
+]
+
+_asegurados = False
+_lock = threading.Lock()
+
+
+class PlanSinIndiceError(Exception):
+    pass
+
+
+class IndiceNoAplicable(Exception):
+    pass
+
+
+def _opciones_relevantes(opciones):
+    # Las opciones que cambian el comportamiento del índice, tanto de las
+    # declaradas como de index_information() (que trae además `v`, `ns`...)
+    return {
+        'unique': bool(opciones.get('unique', False)),
+        'expireAfterSeconds': opciones.get('expireAfterSeconds'),
+    }
+
+
+def _opciones_para_crear(info):
+    return {opcion: valor for opcion, valor in _opciones_relevantes(info).items() if valor not in (None, False)}
+
+
+def _hay_repetidos(coleccion, llaves):
+    grupo = {'_id': {campo.replace('.', '_'): f'${campo}' for campo, _ in llaves}, 'n': {'$sum': 1}}
+    repetidos = coleccion.aggregate([{'$group': grupo}, {'$match': {'n': {'$gt': 1}}}, {'$limit': 1}])
+    return next(iter(repetidos), None) is not None
+
+
+def _reemplazar(coleccion, viejo, info_viejo, nombre, llaves, opciones):
+    # MongoDB no admite dos índices con las mismas llaves, así que el nuevo no
+    # puede construirse junto al viejo para luego quitar este. En su lugar se
+    # descarta antes lo que haría fallar la creación (valores repetidos en un
+    # índice único) y, si aun así falla, se restaura el índice anterior: la
+    # colección nunca se queda sin él.
+    if opciones.get('unique') and _hay_repetidos(coleccion, llaves):
+        raise IndiceNoAplicable(
+            f"{coleccion.name}.{nombre}: hay documentos repetidos en "
+            f"{', '.join(campo for campo, _ in llaves)}; corrígelos antes de crear el índice único "
+            f"(se conserva {viejo})"
+        )
+    coleccion.drop_index(viejo)
+    try:
+        coleccion.create_index(llaves, name=nombre, **opciones)
+    except PyMongoError as e:
+        coleccion.create_index(list(info_viejo['key']), name=viejo, **_opciones_para_crear(info_viejo))
+        raise IndiceNoAplicable(f"{coleccion.name}.{nombre}: no se pudo crear ({e}); se restauró {viejo}") from e
+
+
+def asegurar_indices(db, podar=False):
+    # Crea los índices que faltan y recrea los que cambiaron de definición.
+    # Con podar=True elimina también los índices que ya no están declarados.
+    # IndiceNoAplicable si un índice no se pudo recrear (el anterior se queda)
+    acciones = []
+    for coleccion, declarados in INDICES.items():
+        existentes = db[coleccion].index_information()
+
+        for nombre, (llaves, opciones) in declarados.items():
+            actual = existentes.get(nombre)
+            deseado = _opciones_relevantes(opciones)
+
+            if actual is None:
+                # Mismas llaves con otro nombre (p. ej. creado a mano en mongosh)
+                otro = next((otro for otro, info in existentes.items()
+                             if otro != '_id_' and list(info['key']) == llaves), None)
+                if otro is None:
+                    db[coleccion].create_index(llaves, name=nombre, **opciones)
+                    acciones.append(f"{coleccion}.{nombre}: creado")
+                else:
+                    _reemplazar(db[coleccion], otro, existentes[otro], nombre, llaves, opciones)
+                    acciones.append(f"{coleccion}.{otro}: reemplazado por {nombre}")
+                continue
+
+            relevantes = _opciones_relevantes(actual)
+            if list(actual['key']) == llaves and relevantes == deseado:
+                continue
+            if (list(actual['key']) == llaves and relevantes['unique'] == deseado['unique']
+                    and None not in (relevantes['expireAfterSeconds'], deseado['expireAfterSeconds'])):
+                # Solo cambió la vigencia del TTL: collMod la ajusta en su lugar
+                db.command('collMod', coleccion, index={'name': nombre, 'expireAfterSeconds': deseado['expireAfterSeconds']})
+                acciones.append(f"{coleccion}.{nombre}: vigencia TTL cambiada")
+            else:
+                _reemplazar(db[coleccion], nombre, actual, nombre, llaves, opciones)
+                acciones.append(f"{coleccion}.{nombre}: recreado")
+
+        if podar:
+            for nombre in db[coleccion].index_information():
+                if nombre != '_id_' and nombre not in declarados:
+                    db[coleccion].drop_index(nombre)
+                    acciones.append(f"{coleccion}.{nombre}: eliminado (no declarado)")
+
+    return acciones
+
+
+def asegurar_indices_una_vez(db):
+    # Se llama desde conectar_bd(): solo la primera petición de cada worker
+    # paga el costo, y un fallo (p. ej. duplicados) no tumba la aplicación
+    global _asegurados
+    if _asegurados or os.environ.get('ASEGURAR_INDICES', '1') != '1':
+        return
+    with _lock:
+        if _asegurados:
+            return
+        try:
+            for accion in asegurar_indices(db):
+                print(f"🗂️  Índice {accion}")
+        except (PyMongoError, IndiceNoAplicable) as e:
+            print(f"⚠️  No se pudieron asegurar los índices: {e}")
+        _asegurados = True
+
+
+def _etapas(plan):
+    # Recorre el árbol del plan (motor clásico y SBE)
+    if not isinstance(plan, dict):
+        return
+    yield plan
+    for llave in ('inputStage', 'queryPlan', 'thenStage', 'elseStage'):
+        if llave in plan:
+            yield from _etapas(plan[llave])
+    for subplan in plan.get('inputStages', []):
+        yield from _etapas(subplan)
+
+
+def explicar_consulta(db, coleccion, filtro, orden=None):
+    cursor = db[coleccion].find(filtro)
+    if orden:
+        cursor = cursor.sort(orden)
+    plan = cursor.explain()['queryPlanner']['winningPlan']
+    etapas = list(_etapas(plan))
+    return {
+        'etapas': [etapa.get('stage') for etapa in etapas],
+        'indices': [etapa['indexName'] for etapa in etapas if 'indexName' in etapa],
+    }
+
+
+def verificar_planes(db):
+    # Falla si alguna consulta crítica dejó de usar su índice
+    problemas = []
+    for descripcion, coleccion, filtro, orden in CONSULTAS_CRITICAS:
+        resultado = explicar_consulta(db, coleccion, filtro, orden)
+        if 'COLLSCAN' in resultado['etapas']:
+            problemas.append(f"{descripcion}: recorre toda la colección {coleccion}")
+        elif 'SORT' in resultado['etapas']:
+            problemas.append(f"{descripcion}: ordena en memoria ({', '.join(resultado['indices'])})")
+        else:
+            print(f"✅ {descripcion}: usa {', '.join(resultado['indices'])}")
+
+    if problemas:
+        raise PlanSinIndiceError("Consultas sin índice:\n  - " + "\n  - ".join(problemas))
+
+
+if __name__ == '__main__':
+    # python indices.py [--podar] [--verificar]
+    db = obtener_bd()
+    if db is None:
+        sys.exit("❌ No se pudo conectar a MongoDB")
+
+    try:
+        acciones = asegurar_indices(db, podar='--podar' in sys.argv)
+    except IndiceNoAplicable as e:
+        sys.exit(f"❌ {e}")
+    for accion in acciones:
+        print(f"🗂️  Índice {accion}")
+    if not acciones:
+        print("✅ Los índices ya están al día")
+
+    if '--verificar' in sys.argv:
+        try:
+            verificar_planes(db)
+        except PlanSinIndiceError as e:
+            sys.exit(f"❌ {e}")
@@ -0,0 +1,325 @@
+from contextvars import ContextVar
+from flask import Response, request, session
+from pymongo import monitoring
+from werkzeug.wsgi import ClosingIterator
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+
+# Métricas en formato Prometheus (GET /metrics) y registro de peticiones
+# lentas:
+#   - latencia y número de peticiones por ruta (endpoint de Flask), método y
+#     código de respuesta; incluye el envío completo de las páginas en flujo
+#   - comandos de MongoDB (CommandListener de pymongo) por comando y
+#     colección, y cuántos emite cada petición
+# Una petición que tarda más de METRICAS_LENTAS_MS se imprime con el
+# desglose de sus consultas.
+#
+# Cada worker de gunicorn lleva sus propios contadores. Con METRICAS_DIR
+# cada worker vuelca los suyos a ese directorio cada METRICAS_VOLCADO
+# segundos y /metrics suma los de todos; sin él, /metrics solo muestra los
+# del worker que atendió la petición.
+# /metrics pide `Authorization: Bearer <METRICAS_TOKEN>`; sin token
+# configurado solo lo puede ver el admin con su sesión.
+ACTIVAS = os.environ.get('METRICAS', '1') == '1'
+LENTAS_MS = float(os.environ.get('METRICAS_LENTAS_MS', 1000))
+DIRECTORIO = os.environ.get('METRICAS_DIR', '')
+VOLCADO = float(os.environ.get('METRICAS_VOLCADO', 5))
+TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTAS = (0, 1, 2, 4, 8, 16, 32, 64)
+# Comandos de conexión y autenticación: no son consultas de la aplicación
+COMANDOS_IGNORADOS = {'hello', 'ismaster', 'isMaster', 'saslStart', 'saslContinue', 'authenticate', 'endSessions'}
+
+_lock = threading.Lock()
+_actual = ContextVar('peticion_metricas', default=None)
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.valores = {}   # tupla de etiquetas -> total
+
+    def incrementar(self, etiquetas, cantidad=1):
+        with _lock:
+            self.valores[etiquetas] = self.valores.get(etiquetas, 0) + cantidad
+
+    def sumar(self, valores, otros):
+        for llave, total in otros.items():
+            valores[llave] = valores.get(llave, 0) + total
+
+    def lineas(self, valores):
+        for llave, total in sorted(valores.items()):
+            yield f'{self.nombre}{_etiquetas(self.etiquetas, llave)} {_numero(total)}'
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas, limites):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.limites = limites
+        self.valores = {}   # tupla de etiquetas -> [cuenta por intervalo..., cuenta > último, suma]
+
+    def observar(self, etiquetas, valor):
+        intervalo = next((i for i, limite in enumerate(self.limites) if valor <= limite), len(self.limites))
+        with _lock:
+            cuentas = self.valores.get(etiquetas)
+            if cuentas is None:
+                cuentas = self.valores[etiquetas] = [0] * (len(self.limites) + 2)
+            cuentas[intervalo] += 1
+            cuentas[-1] += valor
+
+    def sumar(self, valores, otros):
+        for llave, cuentas in otros.items():
+            if llave in valores:
+                valores[llave] = [a + b for a, b in zip(valores[llave], cuentas)]
+            else:
+                valores[llave] = list(cuentas)
+
+    def lineas(self, valores):
+        for llave, cuentas in sorted(valores.items()):
+            acumulado = 0
+            for limite, cuenta in zip(self.limites + ('+Inf',), cuentas):
+                acumulado += cuenta
+                etiquetas = _etiquetas(self.etiquetas + ('le',), llave + (_numero(limite),))
+                yield f'{self.nombre}_bucket{etiquetas} {acumulado}'
+            yield f'{self.nombre}_sum{_etiquetas(self.etiquetas, llave)} {_numero(cuentas[-1])}'
+            yield f'{self.nombre}_count{_etiquetas(self.etiquetas, llave)} {acumulado}'
+
+
+PETICIONES = Contador('calificaciones_http_peticiones_total', 'Peticiones atendidas',
+                      ('ruta', 'metodo', 'codigo'))
+DURACION = Histograma('calificaciones_http_duracion_segundos', 'Latencia de las peticiones hasta enviar el último byte',
+                      ('ruta', 'metodo'), LIMITES_SEGUNDOS)
+CONSULTAS = Histograma('calificaciones_http_consultas_mongo', 'Comandos de MongoDB emitidos por petición',
+                       ('ruta', 'metodo'), LIMITES_CONSULTAS)
+LENTAS = Contador('calificaciones_http_lentas_total', 'Peticiones más lentas que METRICAS_LENTAS_MS', ('ruta',))
+COMANDOS = Contador('calificaciones_mongo_comandos_total', 'Comandos de MongoDB',
+                    ('comando', 'coleccion', 'resultado'))
+DURACION_COMANDOS = Histograma('calificaciones_mongo_duracion_segundos', 'Duración de los comandos de MongoDB',
+                               ('comando', 'coleccion'), LIMITES_SEGUNDOS)
+METRICAS = (PETICIONES, DURACION, CONSULTAS, LENTAS, COMANDOS, DURACION_COMANDOS)
+
+
+def _numero(valor):
+    if isinstance(valor, str):
+        return valor
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+def _etiquetas(nombres, valores):
+    pares = (f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores))
+    return '{' + ','.join(pares) + '}'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# --- Peticiones ---
+
+class Peticion:
+    def __init__(self, metodo, ruta_url):
+        self.metodo = metodo
+        self.ruta_url = ruta_url
+        self.ruta = 'sin_ruta'
+        self.codigo = '500'
+        self.inicio = time.perf_counter()
+        self.comandos = []   # (comando, colección, segundos)
+        self.terminada = False
+
+
+class MedirPeticiones:
+    # Middleware WSGI: mide desde que llega la petición hasta que el servidor
+    # cierra la respuesta (incluye la lectura de la sesión y el flujo)
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        peticion = Peticion(environ.get('REQUEST_METHOD', ''), environ.get('PATH_INFO', ''))
+        _actual.set(peticion)
+
+        def con_codigo(estado, encabezados, exc_info=None):
+            peticion.codigo = estado.split(' ', 1)[0]
+            return start_response(estado, encabezados, exc_info)
+
+        try:
+            cuerpo = self.wsgi_app(environ, con_codigo)
+        except BaseException:
+            terminar(peticion)
+            raise
+        return ClosingIterator(cuerpo, lambda: terminar(peticion))
+
+
+def nombrar_ruta():
+    # before_request: la ruta se etiqueta con el endpoint de Flask
+    # (admin_panel, api.actualizar_calificaciones...) y no con la URL, que
+    # lleva ids
+    peticion = _actual.get()
+    if peticion is not None and request.endpoint:
+        peticion.ruta = request.endpoint
+
+
+def terminar(peticion):
+    if peticion.terminada:
+        return
+    peticion.terminada = True
+    segundos = time.perf_counter() - peticion.inicio
+    PETICIONES.incrementar((peticion.ruta, peticion.metodo, peticion.codigo))
+    DURACION.observar((peticion.ruta, peticion.metodo), segundos)
+    CONSULTAS.observar((peticion.ruta, peticion.metodo), len(peticion.comandos))
+    if LENTAS_MS and segundos * 1000 >= LENTAS_MS:
+        LENTAS.incrementar((peticion.ruta,))
+        print(f"🐢 Petición lenta: {descripcion_lenta(peticion, segundos)}")
+    if DIRECTORIO:
+        volcar()
+
+
+def descripcion_lenta(peticion, segundos):
+    total_mongo = sum(duracion for _, _, duracion in peticion.comandos)
+    texto = (f"{peticion.metodo} {peticion.ruta_url} ({peticion.ruta}) {peticion.codigo} en {segundos * 1000:.0f} ms; "
+             f"{len(peticion.comandos)} consultas a MongoDB, {total_mongo * 1000:.0f} ms")
+    desglose = {}
+    for comando, coleccion, duracion in peticion.comandos:
+        veces, acumulado = desglose.get((comando, coleccion), (0, 0.0))
+        desglose[(comando, coleccion)] = (veces + 1, acumulado + duracion)
+    if desglose:
+        ordenado = sorted(desglose.items(), key=lambda par: par[1][1], reverse=True)
+        texto += ': ' + ', '.join(f"{comando} {coleccion} ×{veces} {acumulado * 1000:.0f} ms"
+                                  for (comando, coleccion), (veces, acumulado) in ordenado)
+    return texto
+
+
+# --- MongoDB ---
+
+class OyenteMongo(monitoring.CommandListener):
+    # Se registra en el MongoClient (database.opciones_cliente). pymongo llama
+    # a estos métodos en el hilo que ejecuta el comando; en_paralelo copia el
+    # contexto a sus hilos para que las consultas cuenten en su petición
+    def __init__(self):
+        self.colecciones = {}   # (conexión, request_id) -> colección
+
+    def started(self, evento):
+        if evento.command_name in COMANDOS_IGNORADOS:
+            return
+        coleccion = evento.command.get(evento.command_name)
+        if not isinstance(coleccion, str):
+            # getMore lleva el id del cursor; la colección va aparte
+            coleccion = evento.command.get('collection', '')
+        self.colecciones[(evento.connection_id, evento.request_id)] = coleccion
+
+    def succeeded(self, evento):
+        self.registrar(evento, 'ok')
+
+    def failed(self, evento):
+        self.registrar(evento, 'error')
+
+    def registrar(self, evento, resultado):
+        if evento.command_name in COMANDOS_IGNORADOS:
+            return
+        coleccion = self.colecciones.pop((evento.connection_id, evento.request_id), '')
+        segundos = evento.duration_micros / 1e6
+        COMANDOS.incrementar((evento.command_name, coleccion, resultado))
+        DURACION_COMANDOS.observar((evento.command_name, coleccion), segundos)
+        peticion = _actual.get()
+        if peticion is not None and not peticion.terminada:
+            peticion.comandos.append((evento.command_name, coleccion, segundos))
+
+
+oyente_mongo = OyenteMongo()
+
+
+# --- Exposición ---
+
+_ultimo_volcado = 0.0
+
+
+def instantanea():
+    with _lock:
+        return {metrica.nombre: {json.dumps(llave): valores if isinstance(valores, (int, float)) else list(valores)
+                                 for llave, valores in metrica.valores.items()}
+                for metrica in METRICAS}
+
+
+def volcar(forzar=False):
+    # Escribe los contadores de este worker en METRICAS_DIR/<pid>.json
+    global _ultimo_volcado
+    if not forzar and time.monotonic() - _ultimo_volcado < VOLCADO:
+        return
+    _ultimo_volcado = time.monotonic()
+    archivo = os.path.join(DIRECTORIO, f'{os.getpid()}.json')
+    try:
+        os.makedirs(DIRECTORIO, exist_ok=True)
+        with open(archivo + '.tmp', 'w') as salida:
+            json.dump(instantanea(), salida)
+        os.replace(archivo + '.tmp', archivo)
+    except OSError as e:
+        print(f"⚠️  No se pudieron volcar las métricas: {e}")
+
+
+def limpiar_directorio():
+    # Al arrancar gunicorn (gunicorn.conf.py): descarta lo de la ejecución anterior
+    for archivo in glob.glob(os.path.join(DIRECTORIO, '*.json')):
+        os.remove(archivo)
+
+
+def recolectar():
+    # {nombre: {tupla de etiquetas: valores}} de este worker o, con
+    # METRICAS_DIR, de todos (incluidos los que ya terminaron: los contadores
+    # de Prometheus no deben bajar)
+    if not DIRECTORIO:
+        with _lock:
+            return {metrica.nombre: dict(metrica.valores) for metrica in METRICAS}
+    volcar(forzar=True)
+    total = {metrica.nombre: {} for metrica in METRICAS}
+    por_nombre = {metrica.nombre: metrica for metrica in METRICAS}
+    for archivo in glob.glob(os.path.join(DIRECTORIO, '*.json')):
+        try:
+            with open(archivo) as entrada:
+                datos = json.load(entrada)
+        except (OSError, ValueError):
+            continue
+        for nombre, valores in datos.items():
+            if nombre in por_nombre:
+                por_nombre[nombre].sumar(total[nombre], {tuple(json.loads(llave)): v for llave, v in valores.items()})
+    return total
+
+
+def texto_prometheus():
+    datos = recolectar()
+    lineas = []
+    for metrica in METRICAS:
+        lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+        lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+        lineas.extend(metrica.lineas(datos[metrica.nombre]))
+    return '\n'.join(lineas) + '\n'
+
+
+def ver_metricas():
+    if TOKEN:
+        autorizacion = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(autorizacion.encode('utf-8'), f'Bearer {TOKEN}'.encode('utf-8')):
+            return Response('No autorizado\n', status=401, mimetype='text/plain')
+    elif not session.get('logueado') or session.get('rol') != 'admin':
+        return Response('No autorizado\n', status=401, mimetype='text/plain')
+    return Response(texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8',
+                    headers={'Cache-Control': 'no-store'})
+
+
+def instalar(app):
+    if not ACTIVAS:
+        return
+    app.wsgi_app = MedirPeticiones(app.wsgi_app)
+    app.before_request(nombrar_ruta)
+    app.add_url_rule('/metrics', 'metricas', ver_metricas)
@@ -0,0 +1,108 @@
+from itertools import groupby
+from operator import itemgetter
+import base64
+import json
+import os
+
+from estadisticas import iterar_alumnos_con_promedio
+
+# Paginación por llave (keyset): en lugar de skip() se continúa desde la
+# última fila vista, así cada página es un rango del índice sin importar
+# qué tan adelante esté. El _id al final desempata: si el índice único no
+# llegó a crearse (datos viejos con duplicados) el orden sigue siendo total y
+# ninguna fila se repite ni se salta entre páginas. El índice
+# grupo_apellidos_nombre_id cubre el orden completo, sin ordenar en memoria.
+ORDEN_ALUMNOS = [('grupo', 1), ('apellidos', 1), ('nombre', 1), ('_id', 1)]
+
+# TAMANO_PAGINA=0 desactiva la paginación (la tabla completa sale en flujo)
+TAMANO_PAGINA = int(os.environ.get('TAMANO_PAGINA', 100))
+TAMANO_PAGINA_MAXIMO = int(os.environ.get('TAMANO_PAGINA_MAXIMO', 500))
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _valor(documento, campo):
+    for parte in campo.split('.'):
+        documento = documento.get(parte) if isinstance(documento, dict) else None
+    return documento
+
+
+def codificar_cursor(documento, orden=ORDEN_ALUMNOS):
+    valores = [_valor(documento, campo) for campo, _ in orden]
+    crudo = json.dumps(valores, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token, orden=ORDEN_ALUMNOS):
+    try:
+        relleno = '=' * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno).decode('utf-8'))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalido(f"Cursor de paginación inválido: {e}")
+    if not isinstance(valores, list) or len(valores) != len(orden):
+        raise CursorInvalido("Cursor de paginación inválido")
+    return valores
+
+
+def filtro_despues(valores, orden=ORDEN_ALUMNOS):
+    # (a, b, c) > (va, vb, vc)  ==  a > va  OR  (a = va AND b > vb)  OR  ...
+    condiciones = []
+    for i, (campo, direccion) in enumerate(orden):
+        condicion = {orden[j][0]: valores[j] for j in range(i)}
+        condicion[campo] = {'$gt' if direccion == 1 else '$lt': valores[i]}
+        condiciones.append(condicion)
+    return {'$or': condiciones}
+
+
+def tamano_pagina(solicitado=None):
+    # ?limite= nunca supera TAMANO_PAGINA_MAXIMO
+    try:
+        limite = int(solicitado) if solicitado else TAMANO_PAGINA
+    except ValueError:
+        limite = TAMANO_PAGINA
+    if limite <= 0:
+        return None
+    return min(limite, TAMANO_PAGINA_MAXIMO)
+
+
+def aplicar_cursor(filtro, despues, orden=ORDEN_ALUMNOS):
+    if not despues:
+        return filtro
+    condicion = filtro_despues(decodificar_cursor(despues, orden), orden)
+    return {'$and': [filtro, condicion]} if filtro else condicion
+
+
+class Pagina:
+    # Itera a lo sumo `limite` documentos. Se piden limite + 1 a MongoDB: el
+    # extra solo indica que hay otra página y deja listo el cursor `siguiente`.
+    # Funciona igual con plantillas en flujo, que leen `siguiente` tras el ciclo.
+    def __init__(self, documentos, limite, orden=ORDEN_ALUMNOS):
+        self.documentos = documentos
+        self.limite = limite
+        self.orden = orden
+        self.siguiente = None
+
+    def __iter__(self):
+        ultimo = None
+        for i, documento in enumerate(self.documentos):
+            if self.limite is not None and i == self.limite:
+                self.siguiente = codificar_cursor(ultimo, self.orden)
+                break
+            ultimo = documento
+            yield documento
+
+
+def pagina_alumnos(db, filtro, trimestre, despues=None, limite=None, tamano_lote=None):
+    # Lanza CursorInvalido si `despues` no es un cursor válido
+    documentos = iterar_alumnos_con_promedio(
+        db, aplicar_cursor(filtro, despues), trimestre, ORDEN_ALUMNOS,
+        tamano_lote, limite + 1 if limite else None
+    )
+    return Pagina(documentos, limite)
+
+
+def agrupar_por_grupo(pagina):
+    # Secciones (grupo, filas) perezosas sobre la misma página ya ordenada por grupo
+    return groupby(pagina, key=itemgetter('grupo'))
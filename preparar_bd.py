@@ -0,0 +1,297 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+import argparse
+import os
+import random
+import secrets
+import sys
+import time
+
+import contra
+from cache_grupos import invalidar_grupos
+from contrasenas import hashear
+import database
+from escuela import GRUPOS, MATERIAS, TRIMESTRES, nuevo_alumno
+from indices import IndiceNoAplicable, asegurar_indices
+import promedios
+from secuencias import reservar_ids, sembrar_contadores
+
+# Preparación de la base (reemplaza pegar comandos_mongo.txt en mongosh):
+#   python preparar_bd.py sembrar [--password]   migraciones pendientes + cuentas
+#   python preparar_bd.py migrar [--reintentar]  solo las migraciones pendientes
+#   python preparar_bd.py estado                 migraciones aplicadas y conteos
+#   python preparar_bd.py sintetico --alumnos 300000 [--lote 10000] [--borrar]
+#
+# Todo es repetible: sembrar solo crea las cuentas que faltan (no toca
+# contraseñas ni datos de las que ya existen) y cada migración se registra
+# en la colección `migraciones` y no se vuelve a aplicar.
+LOTE = int(os.environ.get('PREPARAR_LOTE', 10000))
+# Lotes de alumnos sintéticos insertándose a la vez mientras se genera el siguiente
+INSERCIONES_PARALELAS = int(os.environ.get('PREPARAR_INSERCIONES', 2))
+# Procesos que generan los alumnos sintéticos
+PROCESOS = int(os.environ.get('PREPARAR_PROCESOS', os.cpu_count() or 1))
+BD_PRODUCCION = 'sistema_calificaciones'
+
+ADMIN = {'usuario': 'admin', 'nombre': 'Administrador del Sistema', 'grupo': 'Todos', 'grado': 'Admin', 'rol': 'admin'}
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Sofía', 'Diego', 'Valeria', 'Carlos', 'Fernanda', 'Jorge',
+           'Camila', 'Miguel', 'Regina', 'Andrés', 'Ximena', 'Emiliano', 'Renata', 'Santiago', 'Paula', 'Mateo']
+APELLIDOS = ['García', 'Hernández', 'López', 'Martínez', 'González', 'Pérez', 'Rodríguez', 'Sánchez',
+             'Ramírez', 'Cruz', 'Flores', 'Gómez', 'Morales', 'Vázquez', 'Reyes', 'Jiménez', 'Torres', 'Ruiz']
+
+
+# --- Migraciones ---
+# Se aplican en orden y cada una una sola vez. Deben poder repetirse sin
+# daño: si una falla a medias, `migrar --reintentar` la vuelve a correr.
+# Para agregar una, añádela al final con el siguiente número; nunca
+# renumeres ni cambies una ya publicada.
+
+def _migrar_contrasenas(db):
+    return f"{contra.migrar(db)} contraseñas guardadas con bcrypt"
+
+
+def _materializar_promedios(db):
+    diferencias = promedios.verificar(db, reparar=True)
+    if diferencias:
+        invalidar_grupos(db)
+    return f"{len(diferencias)} diferencias corregidas"
+
+
+def _borrar_calificaciones_antiguas(db):
+    # Colección del esquema original; las calificaciones viven en cada alumno.
+    # Solo se borra si está vacía: si tiene datos se conserva y se avisa
+    if 'calificaciones' not in db.list_collection_names():
+        return "no hay colección calificaciones"
+    documentos = db.calificaciones.count_documents({})
+    if documentos:
+        print(f"⚠️  La colección calificaciones tiene {documentos} documentos y no se borró. "
+              "Si ya no los necesitas, respáldala y bórrala a mano (db.calificaciones.drop() en mongosh)")
+        return f"colección calificaciones conservada ({documentos} documentos)"
+    db.calificaciones.drop()
+    return "colección calificaciones vacía eliminada"
+
+
+MIGRACIONES = [
+    ('001_indices', 'Índices declarados en indices.py',
+     lambda db: f"{len(asegurar_indices(db))} cambios de índices"),
+    ('002_contadores', 'Contadores de ids de alumnos y maestros',
+     lambda db: ', '.join(f"{coleccion} desde {maximo}" for coleccion, maximo in sembrar_contadores(db).items())),
+    ('003_contrasenas_bcrypt', 'Contraseñas en texto plano a bcrypt', _migrar_contrasenas),
+    ('004_promedios_materializados', 'Promedios por alumno y resúmenes por grupo', _materializar_promedios),
+    ('005_sin_coleccion_calificaciones', 'Eliminar la colección calificaciones si quedó vacía', _borrar_calificaciones_antiguas),
+]
+
+
+class MigracionPendiente(Exception):
+    pass
+
+
+def migrar(db, reintentar=False):
+    # Aplica las migraciones que faltan. La marca 'aplicando' se inserta antes
+    # de correr cada una (el _id es único): dos procesos a la vez no aplican
+    # la misma migración
+    if reintentar:
+        db.migraciones.delete_many({'estado': 'aplicando'})
+    aplicadas = []
+    for identificador, descripcion, funcion in MIGRACIONES:
+        try:
+            db.migraciones.insert_one({'_id': identificador, 'estado': 'aplicando', 'inicio': datetime.now()})
+        except DuplicateKeyError:
+            marca = db.migraciones.find_one({'_id': identificador}) or {}
+            if marca.get('estado') == 'aplicada':
+                continue
+            raise MigracionPendiente(
+                f"La migración {identificador} está en curso o quedó a medias desde {marca.get('inicio')}. "
+                "Si ningún otro proceso la está aplicando, ejecuta `python preparar_bd.py migrar --reintentar`")
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(db)
+        except Exception:
+            db.migraciones.delete_one({'_id': identificador, 'estado': 'aplicando'})
+            raise
+        db.migraciones.update_one({'_id': identificador}, {'$set': {
+            'estado': 'aplicada', 'descripcion': descripcion, 'resultado': resultado, 'aplicada': datetime.now()}})
+        print(f"✅ {identificador}: {resultado} ({time.perf_counter() - inicio:.1f} s)")
+        aplicadas.append(identificador)
+    return aplicadas
+
+
+# --- Cuentas ---
+
+def cuentas_escuela():
+    # El admin y un maestro por grupo: m1a para 1°A, m6c para 6°C...
+    cuentas = [dict(ADMIN)]
+    for grupo in GRUPOS:
+        cuentas.append({'usuario': f'm{grupo[:1]}{grupo[-1].lower()}', 'nombre': f'Maestro {grupo}',
+                        'grupo': grupo, 'grado': grupo[:1], 'rol': 'maestro'})
+    return cuentas
+
+
+def sembrar_cuentas(db, password=None):
+    # Crea las cuentas que no existen. Sin `password` cada una recibe una
+    # contraseña aleatoria. Devuelve [(usuario, contraseña)] de las creadas
+    cuentas = cuentas_escuela()
+    existentes = {m['usuario'] for m in db.maestros.find(
+        {'usuario': {'$in': [c['usuario'] for c in cuentas]}}, {'usuario': 1})}
+    nuevas = [c for c in cuentas if c['usuario'] not in existentes]
+    if not nuevas:
+        return []
+
+    passwords = [password or secrets.token_urlsafe(9) for _ in nuevas]
+    # bcrypt suelta el GIL: los hashes se calculan en paralelo
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as ejecutor:
+        hashes = list(ejecutor.map(hashear, passwords))
+    ids = reservar_ids(db, 'maestros', len(nuevas))
+    # upsert por usuario con $setOnInsert: si otro proceso la creó mientras
+    # tanto, se queda la suya
+    resultado = db.maestros.bulk_write([
+        UpdateOne({'usuario': cuenta['usuario']},
+                  {'$setOnInsert': {**cuenta, '_id': maestro_id, 'password': hash_password, 'activo': True}},
+                  upsert=True)
+        for cuenta, maestro_id, hash_password in zip(nuevas, ids, hashes)
+    ], ordered=False)
+    creadas = set(resultado.upserted_ids) if resultado.upserted_ids else set()
+    return [(cuenta['usuario'], password_cuenta)
+            for i, (cuenta, password_cuenta) in enumerate(zip(nuevas, passwords)) if i in creadas]
+
+
+# --- Datos sintéticos ---
+
+def alumno_sintetico(aleatorio, alumno_id):
+    # Primer trimestre completo, segundo a medias y tercero sin capturar. El
+    # id en los apellidos evita choques con el índice único por grupo y nombre
+    capturadas = aleatorio.sample(MATERIAS, aleatorio.randint(0, len(MATERIAS)))
+    calificaciones = {
+        TRIMESTRES[0]: {materia: round(aleatorio.uniform(5, 10), 1) for materia in MATERIAS},
+        TRIMESTRES[1]: {materia: round(aleatorio.uniform(5, 10), 1) for materia in capturadas},
+    }
+    documento = nuevo_alumno(aleatorio.choice(NOMBRES), f'{aleatorio.choice(APELLIDOS)} {alumno_id:07d}',
+                             GRUPOS[alumno_id % len(GRUPOS)], calificaciones)
+    documento['_id'] = alumno_id
+    documento['sintetico'] = True
+    return promedios.preparar_alta(documento)
+
+
+def generar_lote(ids, semilla):
+    # Corre en un proceso aparte: documentos del lote y su aporte a los resúmenes.
+    # La semilla depende del lote, así el resultado no cambia con el número de procesos
+    aleatorio = random.Random(f'{semilla}-{ids.start}' if semilla is not None else None)
+    documentos = [alumno_sintetico(aleatorio, alumno_id) for alumno_id in ids]
+    deltas = promedios.Deltas()
+    for documento in documentos:
+        deltas.alta(documento)
+    return documentos, deltas.cambios
+
+
+def generar_sinteticos(db, total, lote=LOTE, semilla=None):
+    # Inserta `total` alumnos por lotes. Generar es lo que más CPU consume,
+    # así que los lotes se generan en PREPARAR_PROCESOS procesos mientras
+    # los anteriores se escriben; los resúmenes de grupo se ajustan una sola
+    # vez al final
+    ids = reservar_ids(db, 'alumnos', total)
+    lotes = [ids[desde:desde + lote] for desde in range(0, total, lote)]
+    deltas = promedios.Deltas()
+    insertados = 0
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=PROCESOS) as generador, \
+            ThreadPoolExecutor(max_workers=INSERCIONES_PARALELAS) as escritor:
+        # Como mucho unos cuantos lotes en memoria a la vez
+        en_espera = PROCESOS + INSERCIONES_PARALELAS
+        generando = deque(generador.submit(generar_lote, ids_lote, semilla) for ids_lote in lotes[:en_espera])
+        siguientes = iter(lotes[en_espera:])
+        escribiendo = deque()
+        while generando:
+            documentos, cambios = generando.popleft().result()
+            for (grupo, trimestre), campos in cambios.items():
+                deltas.sumar(grupo, trimestre, campos)
+            escribiendo.append(escritor.submit(db.alumnos.insert_many, documentos, ordered=False))
+            ids_lote = next(siguientes, None)
+            if ids_lote is not None:
+                generando.append(generador.submit(generar_lote, ids_lote, semilla))
+            while len(escribiendo) >= INSERCIONES_PARALELAS or (escribiendo and not generando):
+                insertados += len(escribiendo.popleft().result().inserted_ids)
+                print(f"📥 {insertados}/{total} alumnos ({time.perf_counter() - inicio:.1f} s)")
+    deltas.aplicar(db)
+    invalidar_grupos(db)
+    return insertados
+
+
+def borrar_sinteticos(db):
+    # Los resúmenes se reconstruyen desde cero después de borrar
+    borrados = db.alumnos.delete_many({'sintetico': True}).deleted_count
+    if borrados:
+        promedios.verificar(db, reparar=True)
+        invalidar_grupos(db)
+    return borrados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prepara la base de datos del sistema de calificaciones')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    sembrar = comandos.add_parser('sembrar', help='migraciones pendientes y cuentas del admin y los maestros')
+    sembrar.add_argument('--password', action='store_true',
+                         help='pide una contraseña inicial común en lugar de generar una por cuenta')
+    migrar_cmd = comandos.add_parser('migrar', help='aplica las migraciones pendientes')
+    migrar_cmd.add_argument('--reintentar', action='store_true', help='vuelve a correr las que quedaron a medias')
+    comandos.add_parser('estado', help='migraciones aplicadas y conteos')
+    sintetico = comandos.add_parser('sintetico', help='alumnos sintéticos para pruebas de rendimiento')
+    sintetico.add_argument('--alumnos', type=int, default=100000)
+    sintetico.add_argument('--lote', type=int, default=LOTE)
+    sintetico.add_argument('--semilla', type=int)
+    sintetico.add_argument('--borrar', action='store_true', help='borra antes los sintéticos existentes')
+    sintetico.add_argument('--forzar', action='store_true', help=f'permite usar la base {BD_PRODUCCION}')
+    args = parser.parse_args()
+
+    db = database.obtener_bd()
+    if db is None or not database.verificar_conexion():
+        sys.exit("❌ No se pudo conectar a MongoDB")
+    print(f"ℹ️  Base de datos: {database.NOMBRE_BD}")
+
+    try:
+        if args.comando in ('sembrar', 'migrar'):
+            aplicadas = migrar(db, reintentar=getattr(args, 'reintentar', False))
+            if not aplicadas:
+                print("✅ No hay migraciones pendientes")
+    except (MigracionPendiente, IndiceNoAplicable) as e:
+        sys.exit(f"❌ {e}")
+
+    if args.comando == 'sembrar':
+        password = contra.pedir_password() if args.password else None
+        creadas = sembrar_cuentas(db, password)
+        if not creadas:
+            print("✅ Todas las cuentas ya existen")
+        for usuario, password_cuenta in creadas:
+            print(f"🔐 {usuario:<8} {'(contraseña común)' if password else password_cuenta}")
+        if creadas and not password:
+            print("⚠️  Entrega estas contraseñas a cada maestro: no se vuelven a mostrar")
+
+    elif args.comando == 'estado':
+        aplicadas = {m['_id']: m for m in db.migraciones.find()}
+        for identificador, descripcion, _ in MIGRACIONES:
+            marca = aplicadas.get(identificador)
+            if marca is None:
+                print(f"⏳ {identificador}: pendiente ({descripcion})")
+            elif marca.get('estado') != 'aplicada':
+                print(f"⚠️  {identificador}: a medias desde {marca.get('inicio')}")
+            else:
+                print(f"✅ {identificador}: {marca['aplicada']:%Y-%m-%d %H:%M} {marca.get('resultado', '')}")
+        print(f"ℹ️  {db.maestros.count_documents({})} cuentas, {db.alumnos.estimated_document_count()} alumnos "
+              f"({db.alumnos.count_documents({'sintetico': True})} sintéticos)")
+
+    elif args.comando == 'sintetico':
+        if database.NOMBRE_BD == BD_PRODUCCION and not args.forzar:
+            sys.exit("❌ Usa otra base con MONGO_BD (p. ej. MONGO_BD=calificaciones_pruebas) o agrega --forzar")
+        if args.alumnos < 1 or args.lote < 1:
+            sys.exit("❌ --alumnos y --lote deben ser mayores que cero")
+        if args.borrar:
+            print(f"🗑️  {borrar_sinteticos(db)} alumnos sintéticos borrados")
+        inicio = time.perf_counter()
+        insertados = generar_sinteticos(db, args.alumnos, args.lote, args.semilla)
+        print(f"✅ {insertados} alumnos sintéticos en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+from pymongo import DeleteOne, ReplaceOne, ReturnDocument, UpdateOne
+import math
+import os
+import sys
+
+from database import obtener_bd
+from escuela import (CALIFICACION_APROBATORIA, MATERIAS, TRIMESTRES,
+                     es_calificacion_capturada, promedio_sin_redondear)
+from estadisticas import id_resumen
+
+# Valores materializados que se mantienen al escribir:
+#   - alumnos.promedios.<trimestre>: promedio sin redondear (null si no hay
+#     materias capturadas), escrito en el mismo update que las calificaciones.
+#   - resumen_grupos: un documento por (grupo, trimestre) con sumas y conteos
+#     que se ajustan con $inc según la diferencia entre el alumno antes y
+#     después de cada escritura. Los promedios se derivan de las sumas al leer.
+#
+# La diferencia se calcula a partir del documento anterior devuelto por la
+# misma operación (find_one_and_update / find_one_and_delete) o, en las
+# escrituras por lotes dentro de una transacción, del trimestre releído en ella.
+#
+# Editar o eliminar un alumno hace las dos escrituras (alumno y resumen) en una
+# transacción cuando el despliegue la soporta (replica set o mongos). En un
+# servidor standalone se hacen una tras otra: si el proceso muere entre ambas
+# el resumen queda desfasado y `python promedios.py verificar --reparar` lo
+# reconstruye. Lo mismo aplica a las escrituras por lotes.
+INTENTOS = 5
+TOLERANCIA = 1e-6
+TRANSACCIONES = os.environ.get('PROMEDIOS_TRANSACCIONES', '1') == '1'
+# verificar() escribe las reparaciones y reporta su avance cada tantos alumnos
+LOTE_VERIFICAR = int(os.environ.get('PROMEDIOS_LOTE_VERIFICAR', 1000))
+TOPOLOGIAS_CON_TRANSACCIONES = ('ReplicaSetWithPrimary', 'Sharded')
+
+
+def promedios_de(calificaciones):
+    return {trimestre: promedio_sin_redondear((calificaciones or {}).get(trimestre) or {})
+            for trimestre in TRIMESTRES}
+
+
+def contribucion(calificaciones_trimestre):
+    # Lo que un alumno aporta al resumen de su grupo en un trimestre
+    calificaciones_trimestre = calificaciones_trimestre or {}
+    promedio = promedio_sin_redondear(calificaciones_trimestre)
+    aporte = {
+        'alumnos': 1,
+        'calificados': 0 if promedio is None else 1,
+        'suma_promedios': promedio or 0,
+        'aprobados': int(promedio is not None and promedio >= CALIFICACION_APROBATORIA),
+        'reprobados': int(promedio is not None and promedio < CALIFICACION_APROBATORIA),
+    }
+    for materia in MATERIAS:
+        valor = calificaciones_trimestre.get(materia)
+        capturada = es_calificacion_capturada(valor)
+        aporte[f'materias.{materia}.suma'] = valor if capturada else 0
+        aporte[f'materias.{materia}.capturadas'] = int(capturada)
+    return aporte
+
+
+class Deltas:
+    # Acumula los $inc por (grupo, trimestre) y los aplica en un solo bulk_write
+    def __init__(self):
+        self.cambios = {}
+
+    def sumar(self, grupo, trimestre, aporte, signo=1):
+        if not grupo:
+            return
+        acumulado = self.cambios.setdefault((grupo, trimestre), {})
+        for campo, valor in aporte.items():
+            acumulado[campo] = acumulado.get(campo, 0) + signo * valor
+
+    def alta(self, alumno):
+        for trimestre in TRIMESTRES:
+            self.sumar(alumno.get('grupo'), trimestre, contribucion(_trimestre(alumno, trimestre)))
+
+    def baja(self, alumno):
+        for trimestre in TRIMESTRES:
+            self.sumar(alumno.get('grupo'), trimestre, contribucion(_trimestre(alumno, trimestre)), -1)
+
+    def cambio(self, antes, despues):
+        # Solo los trimestres que cambiaron, salvo que el alumno cambie de grupo
+        for trimestre in TRIMESTRES:
+            anterior, nuevo = _trimestre(antes, trimestre), _trimestre(despues, trimestre)
+            if antes.get('grupo') == despues.get('grupo') and anterior == nuevo:
+                continue
+            self.sumar(antes.get('grupo'), trimestre, contribucion(anterior), -1)
+            self.sumar(despues.get('grupo'), trimestre, contribucion(nuevo))
+
+    def aplicar(self, db, sesion=None):
+        operaciones = []
+        for (grupo, trimestre), campos in self.cambios.items():
+            campos = {campo: valor for campo, valor in campos.items() if valor}
+            if campos:
+                operaciones.append(UpdateOne(
+                    {'_id': id_resumen(grupo, trimestre)},
+                    {'$inc': campos, '$setOnInsert': {'grupo': grupo, 'trimestre': trimestre}},
+                    upsert=True
+                ))
+        if operaciones:
+            db.resumen_grupos.bulk_write(operaciones, ordered=False, session=sesion)
+        self.cambios = {}
+
+
+def _trimestre(alumno, trimestre):
+    return (alumno.get('calificaciones') or {}).get(trimestre) or {}
+
+
+def soporta_transacciones(db):
+    if not TRANSACCIONES:
+        return False
+    cliente = db.client
+    if cliente.topology_description.topology_type_name == 'Unknown':
+        # Con connect=False (database.py) aún no se ha hablado con el servidor
+        cliente.admin.command('ping')
+    return cliente.topology_description.topology_type_name in TOPOLOGIAS_CON_TRANSACCIONES
+
+
+def _en_transaccion(db, escribir):
+    # escribir(sesion) hace todas las escrituras pasando `session=sesion`; sin
+    # soporte de transacciones recibe None. with_transaction la vuelve a
+    # ejecutar completa ante errores transitorios
+    if not soporta_transacciones(db):
+        return escribir(None)
+    with db.client.start_session() as sesion:
+        return sesion.with_transaction(escribir)
+
+
+def preparar_alta(documento):
+    # Agrega los promedios materializados a un alumno antes de insertarlo
+    documento['promedios'] = promedios_de(documento.get('calificaciones'))
+    return documento
+
+
+def registrar_altas(db, documentos):
+    deltas = Deltas()
+    for documento in documentos:
+        deltas.alta(documento)
+    deltas.aplicar(db)
+
+
+def eliminar_alumno(db, alumno_id):
+    def escribir(sesion):
+        alumno = db.alumnos.find_one_and_delete({'_id': alumno_id}, session=sesion)
+        if alumno is not None:
+            deltas = Deltas()
+            deltas.baja(alumno)
+            deltas.aplicar(db, sesion)
+        return alumno
+
+    return _en_transaccion(db, escribir)
+
+
+def actualizar_alumno(db, filtro, trimestre, calificaciones, datos=None):
+    # Reemplaza un trimestre completo (y opcionalmente nombre/grupo) junto
+    # con su promedio en una sola operación. Devuelve el alumno anterior o
+    # None si no existe
+    cambios = {
+        **(datos or {}),
+        f'calificaciones.{trimestre}': calificaciones,
+        f'promedios.{trimestre}': promedio_sin_redondear(calificaciones),
+    }
+
+    def escribir(sesion):
+        antes = db.alumnos.find_one_and_update(filtro, {'$set': cambios}, return_document=ReturnDocument.BEFORE,
+                                               session=sesion)
+        if antes is not None:
+            despues = {**antes, **(datos or {}),
+                       'calificaciones': {**(antes.get('calificaciones') or {}), trimestre: calificaciones}}
+            deltas = Deltas()
+            deltas.cambio(antes, despues)
+            deltas.aplicar(db, sesion)
+        return antes
+
+    return _en_transaccion(db, escribir)
+
+
+def _actualizacion_protegida(alumno_id, grupo, trimestre, anterior, cambios):
+    # Update que solo se aplica si el trimestre sigue igual al leído, así el
+    # promedio y la diferencia calculados aquí son exactos.
+    # Devuelve (trimestre nuevo, filtro, actualización)
+    nuevo = {**anterior, **cambios}
+    filtro = {'_id': alumno_id, 'grupo': grupo}
+    filtro[f'calificaciones.{trimestre}'] = anterior if anterior else {'$in': [None, {}]}
+    actualizacion = {'$set': {
+        **{f'calificaciones.{trimestre}.{materia}': valor for materia, valor in cambios.items()},
+        f'promedios.{trimestre}': promedio_sin_redondear(nuevo),
+    }}
+    return nuevo, filtro, actualizacion
+
+
+def escribir_calificaciones(db, grupo, trimestre, cambios_por_alumno, actuales):
+    # cambios_por_alumno: {alumno_id: {materia: valor}}; actuales: {alumno_id:
+    # trimestre leído antes}. Devuelve (encontrados, modificados).
+    #
+    # Con transacciones el lote va en un solo bulk_write, protegido con el
+    # trimestre releído dentro de la misma transacción: si otra escritura se
+    # cruza, with_transaction repite todo. Sin ellas un bulk_write no dice qué
+    # updates coincidieron, así que cada alumno se escribe con un
+    # find_one_and_update protegido que devuelve el trimestre que había y la
+    # diferencia sale de ese documento.
+    if soporta_transacciones(db):
+        return _en_transaccion(db, lambda sesion: _escribir_lote(db, grupo, trimestre, cambios_por_alumno, sesion))
+
+    deltas = Deltas()
+    encontrados = modificados = 0
+    for alumno_id, cambios in cambios_por_alumno.items():
+        modificado = _escribir_protegido(db, grupo, trimestre, alumno_id, actuales.get(alumno_id) or {}, cambios, deltas)
+        if modificado is None:
+            # Otra escritura lo cambió (o se eliminó) después de leerlo
+            modificado = _reintentar(db, grupo, trimestre, alumno_id, cambios, deltas)
+        if modificado is not None:
+            encontrados += 1
+            modificados += modificado
+    deltas.aplicar(db)
+    return encontrados, modificados
+
+
+def _escribir_lote(db, grupo, trimestre, cambios_por_alumno, sesion):
+    deltas = Deltas()
+    operaciones = []
+    for alumno in db.alumnos.find({'_id': {'$in': list(cambios_por_alumno)}, 'grupo': grupo},
+                                  {f'calificaciones.{trimestre}': 1}, session=sesion):
+        anterior = _trimestre(alumno, trimestre)
+        nuevo, filtro, actualizacion = _actualizacion_protegida(
+            alumno['_id'], grupo, trimestre, anterior, cambios_por_alumno[alumno['_id']])
+        operaciones.append(UpdateOne(filtro, actualizacion))
+        deltas.sumar(grupo, trimestre, contribucion(anterior), -1)
+        deltas.sumar(grupo, trimestre, contribucion(nuevo))
+    if not operaciones:
+        return 0, 0
+    resultado = db.alumnos.bulk_write(operaciones, ordered=False, session=sesion)
+    deltas.aplicar(db, sesion)
+    return resultado.matched_count, resultado.modified_count
+
+
+def _escribir_protegido(db, grupo, trimestre, alumno_id, anterior, cambios, deltas):
+    # None si el trimestre ya no es `anterior`; si se aplicó, suma la
+    # diferencia desde el documento previo y dice si cambió algo
+    nuevo, filtro, actualizacion = _actualizacion_protegida(alumno_id, grupo, trimestre, anterior, cambios)
+    previo = db.alumnos.find_one_and_update(filtro, actualizacion, {f'calificaciones.{trimestre}': 1},
+                                            return_document=ReturnDocument.BEFORE)
+    if previo is None:
+        return None
+    antes = _trimestre(previo, trimestre)
+    deltas.sumar(grupo, trimestre, contribucion(antes), -1)
+    deltas.sumar(grupo, trimestre, contribucion(nuevo))
+    return antes != nuevo
+
+
+def _reintentar(db, grupo, trimestre, alumno_id, cambios, deltas):
+    for _ in range(INTENTOS):
+        alumno = db.alumnos.find_one({'_id': alumno_id, 'grupo': grupo}, {f'calificaciones.{trimestre}': 1})
+        if alumno is None:
+            return None
+        modificado = _escribir_protegido(db, grupo, trimestre, alumno_id, _trimestre(alumno, trimestre), cambios, deltas)
+        if modificado is not None:
+            return modificado
+    print(f"⚠️  No se pudo actualizar al alumno {alumno_id} tras {INTENTOS} intentos")
+    return None
+
+
+# --- Verificación y reconstrucción ---
+
+def _distintos(a, b):
+    if a is None or b is None:
+        return (a is None) != (b is None)
+    return not math.isclose(a, b, abs_tol=TOLERANCIA)
+
+
+def calcular_resumenes(db, progreso=None):
+    # Resúmenes reconstruidos desde las calificaciones, recorriendo la colección una vez
+    deltas = Deltas()
+    total = db.alumnos.estimated_document_count() if progreso else None
+    for sumados, alumno in enumerate(db.alumnos.find({}, {'grupo': 1, 'calificaciones': 1}), start=1):
+        deltas.alta(alumno)
+        if progreso and sumados % LOTE_VERIFICAR == 0:
+            progreso(sumados, total, f"Resúmenes: {sumados} de {total} alumnos")
+    return {id_resumen(grupo, trimestre): campos for (grupo, trimestre), campos in deltas.cambios.items()}
+
+
+def _aplanar(documento, prefijo=''):
+    planos = {}
+    for campo, valor in documento.items():
+        if isinstance(valor, dict):
+            planos.update(_aplanar(valor, f'{prefijo}{campo}.'))
+        elif campo not in ('_id', 'grupo', 'trimestre'):
+            planos[f'{prefijo}{campo}'] = valor
+    return planos
+
+
+def verificar(db, reparar=False, progreso=None):
+    # Compara los valores materializados con los reconstruidos desde las
+    # calificaciones. Devuelve la lista de diferencias; con reparar=True
+    # además las corrige. progreso(hechos, total, mensaje) se llama cada
+    # LOTE_VERIFICAR alumnos en cada recorrido (trabajos.py lo usa de latido)
+    diferencias = []
+
+    operaciones = []
+    total = db.alumnos.estimated_document_count() if progreso else None
+    for revisados, alumno in enumerate(db.alumnos.find({}, {'calificaciones': 1, 'promedios': 1}), start=1):
+        esperados = promedios_de(alumno.get('calificaciones'))
+        guardados = alumno.get('promedios') or {}
+        distintos = [t for t in TRIMESTRES if t not in guardados or _distintos(guardados[t], esperados[t])]
+        if distintos:
+            diferencias.append(f"alumno {alumno['_id']}: promedios de {', '.join(distintos)}")
+            if reparar:
+                operaciones.append(UpdateOne({'_id': alumno['_id']}, {'$set': {'promedios': esperados}}))
+        if revisados % LOTE_VERIFICAR == 0:
+            if operaciones:
+                db.alumnos.bulk_write(operaciones, ordered=False)
+                operaciones = []
+            if progreso:
+                progreso(revisados, total, f"Promedios: {revisados} de {total} alumnos")
+    if operaciones:
+        db.alumnos.bulk_write(operaciones, ordered=False)
+
+    esperados = calcular_resumenes(db, progreso)
+    guardados = {documento['_id']: documento for documento in db.resumen_grupos.find()}
+    operaciones = []
+    for llave in sorted(set(esperados) | set(guardados)):
+        esperado = esperados.get(llave, {})
+        guardado = _aplanar(guardados.get(llave, {}))
+        campos = sorted(campo for campo in set(esperado) | set(guardado)
+                        if _distintos(guardado.get(campo, 0), esperado.get(campo, 0)))
+        if campos:
+            diferencias.append(f"resumen {llave}: {', '.join(campos)}")
+            grupo, trimestre = llave.split('|')
+            documento = {'grupo': grupo, 'trimestre': trimestre}
+            for campo, valor in esperado.items():
+                destino = documento
+                *rutas, ultimo = campo.split('.')
+                for ruta in rutas:
+                    destino = destino.setdefault(ruta, {})
+                destino[ultimo] = valor
+            # Los grupos que se quedaron sin alumnos se eliminan
+            operaciones.append(ReplaceOne({'_id': llave}, documento, upsert=True) if esperado else DeleteOne({'_id': llave}))
+    if reparar and operaciones:
+        db.resumen_grupos.bulk_write(operaciones, ordered=False)
+
+    return diferencias
+
+
+if __name__ == '__main__':
+    # python promedios.py verificar [--reparar]
+    if len(sys.argv) < 2 or sys.argv[1] != 'verificar':
+        sys.exit("Uso: python promedios.py verificar [--reparar]")
+
+    db = obtener_bd()
+    if db is None:
+        sys.exit("❌ No se pudo conectar a MongoDB")
+
+    reparar = '--reparar' in sys.argv
+    diferencias = verificar(db, reparar)
+    if reparar and diferencias:
+        from cache_grupos import invalidar_grupos
+        invalidar_grupos(db)
+    for diferencia in diferencias:
+        print(f"⚠️  {diferencia}")
+    if not diferencias:
+        print("✅ Los promedios materializados coinciden con las calificaciones")
+    elif reparar:
+        print(f"✅ {len(diferencias)} diferencias corregidas")
+    else:
+        sys.exit(f"❌ {len(diferencias)} diferencias (ejecuta con --reparar para corregirlas)")
@@ -0,0 +1,65 @@
+from pymongo import ReturnDocument
+import sys
+
+from database import obtener_bd
+
+# Colecciones con _id numérico que se asignan desde la colección contadores
+COLECCIONES_CON_SECUENCIA = ['alumnos', 'maestros']
+
+
+def reservar_ids(db, coleccion, cantidad=1):
+    # Reserva un bloque de `cantidad` ids consecutivos en una sola operación
+    # atómica y devuelve el rango reservado.
+    if cantidad < 1:
+        raise ValueError("La cantidad de ids a reservar debe ser mayor que cero")
+
+    contador = db.contadores.find_one_and_update(
+        {'_id': coleccion},
+        {'$inc': {'valor': cantidad}},
+        return_document=ReturnDocument.AFTER
+    )
+    if contador is None:
+        # Primer uso sin migración previa: sembrar desde el máximo actual
+        sembrar_contador(db, coleccion)
+        contador = db.contadores.find_one_and_update(
+            {'_id': coleccion},
+            {'$inc': {'valor': cantidad}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    ultimo = contador['valor']
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+def siguiente_id(db, coleccion):
+    return reservar_ids(db, coleccion, 1)[0]
+
+
+def sembrar_contador(db, coleccion):
+    # $max solo sube el contador: ejecutar la migración varias veces es seguro
+    ultimo = db[coleccion].find_one(sort=[('_id', -1)], projection={'_id': 1})
+    maximo = ultimo['_id'] if ultimo and isinstance(ultimo['_id'], int) else 0
+    db.contadores.update_one(
+        {'_id': coleccion},
+        {'$max': {'valor': maximo}},
+        upsert=True
+    )
+    return maximo
+
+
+def sembrar_contadores(db):
+    return {coleccion: sembrar_contador(db, coleccion) for coleccion in COLECCIONES_CON_SECUENCIA}
+
+
+if __name__ == '__main__':
+    # Migración: python secuencias.py sembrar
+    if len(sys.argv) < 2 or sys.argv[1] != 'sembrar':
+        sys.exit("Uso: python secuencias.py sembrar")
+
+    db = obtener_bd()
+    if db is None:
+        sys.exit("❌ No se pudo conectar a MongoDB")
+
+    for coleccion, maximo in sembrar_contadores(db).items():
+        valor = db.contadores.find_one({'_id': coleccion})['valor']
+        print(f"✅ Contador '{coleccion}': máximo actual {maximo}, siguiente id {valor + 1}")
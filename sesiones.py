@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta, timezone
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from pymongo.errors import PyMongoError
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from database import obtener_bd
+
+# Sesiones guardadas en el servidor: la cookie solo lleva un id aleatorio y
+# los datos (usuario, grupo, mensajes...) viven en el almacén elegido con
+# SESIONES:
+#   mongo  - colección `sesiones`; un índice TTL borra las vencidas
+#   sqlite - archivo local SESIONES_ARCHIVO (un solo servidor o desarrollo)
+#   cookie - la sesión firmada de Flask de siempre
+#
+# Solo se escribe al almacén si la sesión cambió o si ya pasó la mitad de su
+# vigencia (SESIONES_DURACION_HORAS), así que una página que solo lee la
+# sesión no genera escrituras ni un Set-Cookie nuevo.
+#
+# `expira` es siempre una fecha UTC sin zona: así la compara el índice TTL de
+# MongoDB y así la devuelve pymongo.
+ALMACEN = os.environ.get('SESIONES', 'mongo')
+DURACION = timedelta(hours=float(os.environ.get('SESIONES_DURACION_HORAS', 12)))
+ARCHIVO = os.environ.get('SESIONES_ARCHIVO', 'sesiones.sqlite3')
+# Rutas que nunca usan la sesión: no se consulta el almacén
+SIN_SESION = ('/static/', '/css.css')
+# Mismo formato que la cookie de Flask (conserva tuplas, bytes, fechas...)
+SERIALIZADOR = TaggedJSONSerializer()
+
+
+class SesionServidor(SecureCookieSession):
+    # SecureCookieSession ya marca `modified` y `accessed` en cada cambio
+    def __init__(self, datos=None, sid=None, expira=None):
+        super().__init__(datos or {})
+        self.sid = sid
+        self.expira = expira
+        self.regenerar = False
+
+
+def renovar_id(sesion):
+    # Llamar al iniciar sesión: la sesión conserva sus datos con un id nuevo
+    # y el anterior se borra (evita fijación de sesión)
+    if isinstance(sesion, SesionServidor):
+        sesion.regenerar = True
+        sesion.modified = True
+
+
+class AlmacenMongo:
+    def coleccion(self):
+        db = obtener_bd()
+        if db is None:
+            raise PyMongoError("Base de datos no disponible")
+        return db.sesiones
+
+    def leer(self, sid):
+        documento = self.coleccion().find_one({'_id': sid, 'expira': {'$gt': datetime.utcnow()}})
+        return (documento['datos'], documento['expira']) if documento else None
+
+    def guardar(self, sid, datos, expira):
+        self.coleccion().replace_one({'_id': sid}, {'datos': datos, 'expira': expira}, upsert=True)
+
+    def borrar(self, sid):
+        self.coleccion().delete_one({'_id': sid})
+
+
+class AlmacenSQLite:
+    # Una conexión por operación (sqlite3 no comparte conexiones entre hilos).
+    # Las vencidas se borran en lote como mucho una vez por LIMPIEZA segundos
+    LIMPIEZA = 600
+
+    def __init__(self, archivo=ARCHIVO):
+        self.archivo = archivo
+        self.ultima_limpieza = 0.0
+        self.lock = threading.Lock()
+        with self.conectar() as conexion:
+            conexion.execute('CREATE TABLE IF NOT EXISTS sesiones (id TEXT PRIMARY KEY, datos TEXT NOT NULL, expira REAL NOT NULL)')
+
+    def conectar(self):
+        return sqlite3.connect(self.archivo, timeout=5)
+
+    def leer(self, sid):
+        with self.conectar() as conexion:
+            fila = conexion.execute('SELECT datos, expira FROM sesiones WHERE id = ? AND expira > ?', (sid, time.time())).fetchone()
+        if fila is None:
+            return None
+        return SERIALIZADOR.loads(fila[0]), datetime.utcfromtimestamp(fila[1])
+
+    def guardar(self, sid, datos, expira):
+        with self.conectar() as conexion:
+            conexion.execute('INSERT OR REPLACE INTO sesiones (id, datos, expira) VALUES (?, ?, ?)',
+                             (sid, SERIALIZADOR.dumps(datos), expira.replace(tzinfo=timezone.utc).timestamp()))
+            if self.toca_limpiar():
+                conexion.execute('DELETE FROM sesiones WHERE expira <= ?', (time.time(),))
+
+    def toca_limpiar(self):
+        with self.lock:
+            if time.monotonic() - self.ultima_limpieza < self.LIMPIEZA:
+                return False
+            self.ultima_limpieza = time.monotonic()
+            return True
+
+    def borrar(self, sid):
+        with self.conectar() as conexion:
+            conexion.execute('DELETE FROM sesiones WHERE id = ?', (sid,))
+
+
+class InterfazSesiones(SessionInterface):
+    def __init__(self, almacen):
+        self.almacen = almacen
+
+    def open_session(self, app, request):
+        if request.path.startswith(SIN_SESION):
+            return SesionServidor()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            try:
+                guardada = self.almacen.leer(sid)
+            except (PyMongoError, sqlite3.Error) as e:
+                print(f"⚠️  No se pudo leer la sesión: {e}")
+                guardada = None
+            if guardada is not None:
+                datos, expira = guardada
+                return SesionServidor(datos, sid, expira)
+        return SesionServidor()
+
+    def save_session(self, app, session, response):
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # Sesión vaciada (cerrar sesión): se borra del almacén y la cookie
+        if not session:
+            if session.modified and session.sid:
+                self._intentar(self.almacen.borrar, session.sid)
+                response.delete_cookie(nombre, domain=dominio, path=ruta)
+            return
+
+        ahora = datetime.utcnow()
+        nueva = session.sid is None or session.regenerar
+        por_vencer = session.expira is not None and session.expira - ahora < DURACION / 2
+        if not (nueva or session.modified or por_vencer):
+            return
+
+        if session.regenerar and session.sid:
+            self._intentar(self.almacen.borrar, session.sid)
+        sid = secrets.token_urlsafe(32) if nueva else session.sid
+        if not self._intentar(self.almacen.guardar, sid, dict(session), ahora + DURACION):
+            return
+        if nueva:
+            response.set_cookie(
+                nombre, sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=dominio, path=ruta,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+    def _intentar(self, operacion, *argumentos):
+        try:
+            operacion(*argumentos)
+            return True
+        except (PyMongoError, sqlite3.Error) as e:
+            print(f"⚠️  No se pudo guardar la sesión: {e}")
+            return False
+
+
+def instalar(app):
+    # Configura app.session_interface según SESIONES
+    if ALMACEN == 'cookie':
+        return
+    if ALMACEN == 'mongo':
+        almacen = AlmacenMongo()
+    elif ALMACEN == 'sqlite':
+        almacen = AlmacenSQLite()
+    else:
+        raise RuntimeError(f"SESIONES desconocido: {ALMACEN} (usa mongo, sqlite o cookie)")
+    app.session_interface = InterfazSesiones(almacen)
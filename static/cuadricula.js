@@ -0,0 +1,221 @@
+// Captura en cuadrícula: cada celda editada queda pendiente y, tras una pausa
+// en la escritura, todas las pendientes se envían juntas en un solo PATCH a
+// /api/v1/grupos/<grupo>/calificaciones/<trimestre> con solo las materias que
+// cambiaron. El servidor las aplica con un único bulk_write.
+(function () {
+    var tabla = document.getElementById('cuadricula');
+    if (!tabla) {
+        return;
+    }
+
+    var ESPERA_MS = 800;
+    var REINTENTO_MS = 5000;
+    var MINIMA = 5;
+    var MAXIMA = 10;
+
+    var url = '/api/v1/grupos/' + encodeURIComponent(tabla.dataset.grupo)
+        + '/calificaciones/' + encodeURIComponent(tabla.dataset.trimestre);
+    var estado = document.getElementById('estado-guardado');
+
+    // alumno_id -> {materia: valor}
+    var pendientes = {};
+    var temporizador = null;
+    var enVuelo = false;
+
+    function mostrarEstado(texto) {
+        if (estado) {
+            estado.textContent = texto;
+        }
+    }
+
+    function celda(alumnoId, materia) {
+        return tabla.querySelector('tr[data-alumno-id="' + alumnoId + '"] .celda-calificacion[data-materia="' + materia + '"]');
+    }
+
+    function marcar(input, clase, mensaje) {
+        input.classList.remove('pendiente', 'guardada', 'con-error');
+        if (clase) {
+            input.classList.add(clase);
+        }
+        input.title = mensaje || '';
+    }
+
+    function hayPendientes() {
+        return Object.keys(pendientes).length > 0;
+    }
+
+    function programarGuardado(espera) {
+        clearTimeout(temporizador);
+        temporizador = setTimeout(guardar, espera);
+    }
+
+    function reencolar(lote) {
+        // Lo que falló vuelve a pendientes sin pisar ediciones más recientes
+        Object.keys(lote).forEach(function (alumnoId) {
+            var cambios = pendientes[alumnoId] || (pendientes[alumnoId] = {});
+            Object.keys(lote[alumnoId]).forEach(function (materia) {
+                if (!(materia in cambios)) {
+                    cambios[materia] = lote[alumnoId][materia];
+                }
+            });
+        });
+    }
+
+    function aplicarGuardado(lote, datos) {
+        Object.keys(lote).forEach(function (alumnoId) {
+            Object.keys(lote[alumnoId]).forEach(function (materia) {
+                var input = celda(alumnoId, materia);
+                if (input && parseFloat(input.value) === lote[alumnoId][materia]) {
+                    marcar(input, 'guardada');
+                }
+            });
+        });
+        Object.keys(datos.promedios || {}).forEach(function (alumnoId) {
+            var promedio = datos.promedios[alumnoId];
+            var destino = tabla.querySelector('tr[data-alumno-id="' + alumnoId + '"] .celda-promedio');
+            if (destino) {
+                destino.textContent = promedio > 0 ? promedio : 'N/A';
+            }
+        });
+    }
+
+    function aplicarErrores(lote, ids, errores) {
+        // Ninguna fila se guardó: las que tienen error se marcan y el resto
+        // se vuelve a enviar en el siguiente lote
+        var conError = {};
+        errores.forEach(function (error) {
+            var alumnoId = ids[error.fila];
+            conError[alumnoId] = true;
+            Object.keys(lote[alumnoId] || {}).forEach(function (materia) {
+                var input = celda(alumnoId, materia);
+                if (input) {
+                    marcar(input, 'con-error', error.errores.join('\n'));
+                }
+            });
+        });
+        ids.forEach(function (alumnoId) {
+            if (!conError[alumnoId]) {
+                var reenviar = {};
+                reenviar[alumnoId] = lote[alumnoId];
+                reencolar(reenviar);
+            }
+        });
+    }
+
+    function guardar() {
+        if (enVuelo) {
+            // Un lote a la vez: lo nuevo sale cuando termine el actual
+            programarGuardado(ESPERA_MS);
+            return;
+        }
+        if (!hayPendientes()) {
+            return;
+        }
+        var lote = pendientes;
+        pendientes = {};
+        var ids = Object.keys(lote);
+        var filas = ids.map(function (alumnoId) {
+            var fila = { alumno_id: parseInt(alumnoId, 10) };
+            Object.keys(lote[alumnoId]).forEach(function (materia) {
+                fila[materia] = lote[alumnoId][materia];
+            });
+            return fila;
+        });
+
+        var espera = ESPERA_MS;
+        enVuelo = true;
+        mostrarEstado('💾 Guardando…');
+        fetch(url, {
+            method: 'PATCH',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ calificaciones: filas })
+        })
+            .then(function (respuesta) {
+                return respuesta.json().then(function (datos) {
+                    if (respuesta.ok) {
+                        aplicarGuardado(lote, datos);
+                        mostrarEstado('✅ Guardado');
+                    } else if (respuesta.status === 422) {
+                        aplicarErrores(lote, ids, datos.errores || []);
+                        mostrarEstado('❌ Revisa las celdas marcadas');
+                    } else {
+                        throw new Error(datos.error || respuesta.statusText);
+                    }
+                });
+            })
+            .catch(function () {
+                reencolar(lote);
+                mostrarEstado('⚠️ Sin conexión, reintentando…');
+                espera = REINTENTO_MS;
+            })
+            .finally(function () {
+                enVuelo = false;
+                if (hayPendientes()) {
+                    programarGuardado(espera);
+                }
+            });
+    }
+
+    // Delegación: también cubre las filas que agrega paginacion.js
+    tabla.addEventListener('input', function (evento) {
+        var input = evento.target;
+        if (!input.classList.contains('celda-calificacion')) {
+            return;
+        }
+        var alumnoId = input.closest('tr').dataset.alumnoId;
+        var materia = input.dataset.materia;
+        var valor = parseFloat(input.value);
+        var cambios = pendientes[alumnoId] || (pendientes[alumnoId] = {});
+
+        if (input.value === '' || isNaN(valor) || valor < MINIMA || valor > MAXIMA) {
+            // Las celdas inválidas no se envían hasta corregirlas
+            delete cambios[materia];
+            if (!Object.keys(cambios).length) {
+                delete pendientes[alumnoId];
+            }
+            marcar(input, input.value === '' ? null : 'con-error',
+                'La calificación debe estar entre ' + MINIMA + ' y ' + MAXIMA);
+            return;
+        }
+
+        cambios[materia] = valor;
+        marcar(input, 'pendiente');
+        mostrarEstado('✏️ Cambios sin guardar');
+        programarGuardado(ESPERA_MS);
+    });
+
+    // Enter baja a la misma materia del siguiente alumno, como en una hoja de cálculo
+    tabla.addEventListener('keydown', function (evento) {
+        var input = evento.target;
+        if (evento.key !== 'Enter' || !input.classList.contains('celda-calificacion')) {
+            return;
+        }
+        evento.preventDefault();
+        var fila = input.closest('tr').nextElementSibling;
+        var siguiente = fila && fila.querySelector('.celda-calificacion[data-materia="' + input.dataset.materia + '"]');
+        if (siguiente) {
+            siguiente.focus();
+            siguiente.select();
+        }
+    });
+
+    // Al salir se envía lo pendiente sin esperar la pausa
+    window.addEventListener('beforeunload', function (evento) {
+        if (!hayPendientes()) {
+            return;
+        }
+        var filas = Object.keys(pendientes).map(function (alumnoId) {
+            return Object.assign({ alumno_id: parseInt(alumnoId, 10) }, pendientes[alumnoId]);
+        });
+        fetch(url, {
+            method: 'PATCH',
+            credentials: 'same-origin',
+            keepalive: true,
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ calificaciones: filas })
+        });
+        evento.preventDefault();
+        evento.returnValue = '';
+    });
+})();
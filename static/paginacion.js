@@ -0,0 +1,40 @@
+// Paginación por cursor: al acercarse al final de la tabla se pide la
+// siguiente página en JSON (?formato=json&despues=...) y se agregan sus filas.
+// Sin JavaScript sigue funcionando el enlace "Siguiente página".
+document.querySelectorAll('tr[data-siguiente]').forEach(function (centinela) {
+    var cargando = false;
+
+    function cargarSiguiente() {
+        if (cargando || !centinela.dataset.siguiente) {
+            return;
+        }
+        cargando = true;
+
+        var url = new URL(window.location.href);
+        url.searchParams.set('formato', 'json');
+        url.searchParams.set('despues', centinela.dataset.siguiente);
+
+        fetch(url, { credentials: 'same-origin' })
+            .then(function (respuesta) { return respuesta.json(); })
+            .then(function (datos) {
+                centinela.insertAdjacentHTML('beforebegin', datos.html);
+                if (datos.siguiente) {
+                    centinela.dataset.siguiente = datos.siguiente;
+                    var enlace = new URL(window.location.href);
+                    enlace.searchParams.set('despues', datos.siguiente);
+                    centinela.querySelector('a').href = enlace;
+                } else {
+                    observador.disconnect();
+                    centinela.remove();
+                }
+            })
+            .finally(function () { cargando = false; });
+    }
+
+    var observador = new IntersectionObserver(function (entradas) {
+        if (entradas.some(function (entrada) { return entrada.isIntersecting; })) {
+            cargarSiguiente();
+        }
+    }, { rootMargin: '400px' });
+    observador.observe(centinela);
+});
@@ -0,0 +1,98 @@
+import os
+import sys
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+mongomock = pytest.importorskip('mongomock')
+
+import cache_grupos
+import contrasenas
+import database
+import estadisticas
+import indices
+import promedios
+from escuela import MATERIAS, nuevo_alumno
+
+# Las pruebas corren sobre mongomock: un cliente nuevo por prueba, con los
+# índices declarados y las cachés por worker vacías. mongomock no implementa
+# todos los operadores de agregación, así que las rutas usan los equivalentes
+# en Python (ESTADISTICAS_EN_PYTHON); ver test_estadisticas.py para la
+# comparación contra MongoDB real.
+URL_PRUEBAS = os.environ.get('MONGO_URL_PRUEBAS', 'mongodb://localhost:27017')
+
+
+@pytest.fixture
+def bd(monkeypatch):
+    cliente = mongomock.MongoClient()
+    monkeypatch.setattr(database, 'MongoClient', lambda *argumentos, **opciones: cliente)
+    monkeypatch.setattr(database, '_cliente', None)
+    monkeypatch.setattr(database, '_pid_cliente', None)
+    monkeypatch.setattr(indices, '_asegurados', False)
+    monkeypatch.setattr(estadisticas, 'EN_PYTHON', True)
+    monkeypatch.setattr(contrasenas, 'COSTO', 4)
+    cache_grupos.cache.descartar()
+    estadisticas.invalidar_tablero()
+    db = database.obtener_bd()
+    indices.asegurar_indices(db)
+    yield db
+    cache_grupos.cache.descartar()
+    estadisticas.invalidar_tablero()
+
+
+@pytest.fixture(scope='session')
+def cliente_mongodb():
+    # MongoDB real para las pruebas que mongomock no puede cubrir; se busca
+    # una sola vez por sesión y se saltan si no hay servidor
+    cliente = MongoClient(URL_PRUEBAS, serverSelectionTimeoutMS=1000)
+    try:
+        cliente.admin.command('ping')
+    except PyMongoError:
+        cliente.close()
+        pytest.skip(f"sin MongoDB en {URL_PRUEBAS} (MONGO_URL_PRUEBAS)")
+    yield cliente
+    cliente.close()
+
+
+def calificaciones(*valores):
+    return dict(zip(MATERIAS, valores))
+
+
+def sembrar(db, alumnos):
+    # alumnos: [(nombre, apellidos, grupo, {trimestre: calificaciones})]
+    documentos = []
+    for i, (nombre, apellidos, grupo, capturadas) in enumerate(alumnos, start=1):
+        documentos.append(promedios.preparar_alta({'_id': i, **nuevo_alumno(nombre, apellidos, grupo, capturadas)}))
+    if documentos:
+        db.alumnos.insert_many(documentos)
+        promedios.registrar_altas(db, documentos)
+    db.maestros.insert_many([
+        {'_id': 1, 'usuario': 'admin', 'password': contrasenas.hashear('admin'), 'nombre': 'Admin',
+         'grupo': 'Todos', 'grado': 'Admin', 'rol': 'admin', 'activo': True},
+        {'_id': 2, 'usuario': 'm1a', 'password': contrasenas.hashear('1234'), 'nombre': 'Maestro 1°A',
+         'grupo': '1°A', 'grado': '1', 'rol': 'maestro', 'activo': True},
+    ])
+    return documentos
+
+
+@pytest.fixture
+def app(bd):
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+def iniciar_sesion(app, usuario, password):
+    cliente = app.test_client()
+    respuesta = cliente.post('/iniciar_sesion', data={'usuario': usuario, 'password': password})
+    assert respuesta.status_code == 302 and respuesta.location != '/', respuesta.location
+    return cliente
+
+
+def mensajes(cliente):
+    # Textos de los mensajes pendientes (se muestran en la siguiente página)
+    with cliente.session_transaction() as sesion:
+        return [mensaje['texto'] for mensaje in sesion.get('mensajes', [])]
@@ -0,0 +1,43 @@
+from conftest import calificaciones, iniciar_sesion, mensajes, sembrar
+
+TRIMESTRE = {materia: 8 for materia in ('matematicas', 'espanol', 'ingles', 'ciencias', 'formacion')}
+
+
+def test_agregar_alumno_duplicado_muestra_mensaje(app, bd):
+    sembrar(bd, [('Ana', 'López', '1°A', {})])
+    cliente = iniciar_sesion(app, 'admin', 'admin')
+    mensajes(cliente)
+
+    respuesta = cliente.post('/agregar_alumno', data={'nombre': 'Ana', 'apellidos': 'López', 'grupo': '1°A'})
+
+    assert respuesta.status_code == 302
+    assert any('ya existe' in texto for texto in mensajes(cliente))
+    assert bd.alumnos.count_documents({}) == 1
+
+
+def test_agregar_alumno_duplicado_en_carrera(app, bd, monkeypatch):
+    # Otro admin lo insertó entre la consulta previa y el insert: lo detecta el índice único
+    sembrar(bd, [('Ana', 'López', '1°A', {})])
+    cliente = iniciar_sesion(app, 'admin', 'admin')
+    coleccion = type(bd.alumnos)
+    original = coleccion.find_one
+    with monkeypatch.context() as carrera:
+        carrera.setattr(coleccion, 'find_one', lambda self, filtro=None, *argumentos, **opciones:
+                        None if self.name == 'alumnos' and 'nombre' in (filtro or {})
+                        else original(self, filtro, *argumentos, **opciones))
+        respuesta = cliente.post('/agregar_alumno', data={'nombre': 'Ana', 'apellidos': 'López', 'grupo': '1°A'})
+
+    assert respuesta.status_code == 302
+    assert any('ya existe' in texto for texto in mensajes(cliente))
+    assert bd.alumnos.count_documents({}) == 1
+
+
+def test_renombrar_a_alumno_existente_no_falla(app, bd):
+    sembrar(bd, [('Ana', 'López', '1°A', {}), ('Beto', 'Ruiz', '1°A', {'primer_trimestre': calificaciones(7, 7, 7, 7, 7)})])
+    cliente = iniciar_sesion(app, 'admin', 'admin')
+
+    respuesta = cliente.post('/modificar_alumno/2', data={'nombre': 'Ana', 'apellidos': 'López', 'grupo': '1°A', **TRIMESTRE})
+
+    assert respuesta.status_code == 302
+    assert any('ya existe' in texto for texto in mensajes(cliente))
+    assert bd.alumnos.find_one({'_id': 2})['nombre'] == 'Beto'
@@ -0,0 +1,48 @@
+import json
+from urllib.parse import quote
+
+import pytest
+
+from conftest import calificaciones, iniciar_sesion, sembrar
+
+TRIMESTRE = 'primer_trimestre'
+URL_GRUPO = f"/api/v1/grupos/{quote('1°A')}/calificaciones/{TRIMESTRE}"
+
+
+@pytest.fixture
+def maestro(app, bd):
+    sembrar(bd, [('Ana', 'López', '1°A', {TRIMESTRE: calificaciones(6, 6, 6, 6, 6)})])
+    return iniciar_sesion(app, 'm1a', '1234')
+
+
+def enviar(cliente, metodo, filas):
+    # json.dumps escribe NaN e Infinity tal cual, como haría un cliente
+    # JavaScript descuidado; Flask los vuelve a leer como float
+    return cliente.open(URL_GRUPO, method=metodo, data=json.dumps({'calificaciones': filas}),
+                        content_type='application/json')
+
+
+@pytest.mark.parametrize('metodo,fila', [
+    ('PUT', {'alumno_id': 1, **calificaciones(float('nan'), 8, 8, 8, 8)}),
+    ('PUT', {'alumno_id': 1, **calificaciones('nan', 8, 8, 8, 8)}),
+    ('PUT', {'alumno_id': 1, **calificaciones(8, 8, 8, 8, float('inf'))}),
+    ('PUT', {'alumno_id': 1, **calificaciones(11, 8, 8, 8, 8)}),
+    ('PATCH', {'alumno_id': 1, 'ingles': float('nan')}),
+    ('PATCH', {'alumno_id': 1, 'ingles': '-Infinity'}),
+    ('PATCH', {'alumno_id': 1, 'ingles': 4}),
+])
+def test_rechaza_calificaciones_no_finitas_o_fuera_de_rango(maestro, bd, metodo, fila):
+    respuesta = enviar(maestro, metodo, [fila])
+
+    assert respuesta.status_code == 422, respuesta.get_data(as_text=True)
+    assert respuesta.get_json()['errores'][0]['alumno_id'] == 1
+    # No se escribió nada
+    assert bd.alumnos.find_one({'_id': 1})['calificaciones'][TRIMESTRE] == calificaciones(6, 6, 6, 6, 6)
+
+
+def test_patch_valido_guarda_y_devuelve_el_promedio(maestro, bd):
+    respuesta = enviar(maestro, 'PATCH', [{'alumno_id': 1, 'ingles': 10}])
+
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert respuesta.get_json()['promedios'] == {'1': 6.8}
+    assert bd.alumnos.find_one({'_id': 1})['calificaciones'][TRIMESTRE]['ingles'] == 10
@@ -0,0 +1,53 @@
+from urllib.parse import quote
+
+import promedios
+from cache_grupos import cache
+from conftest import calificaciones, iniciar_sesion, sembrar
+
+TRIMESTRE = 'primer_trimestre'
+URL_GRUPO = f"/api/v1/grupos/{quote('1°A')}/calificaciones/{TRIMESTRE}"
+
+
+def promedio_de_ana(cliente):
+    respuesta = cliente.get(URL_GRUPO)
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    return respuesta.get_json()['alumnos'][0]['promedio']
+
+
+def escribir_en_otro_worker(bd):
+    # Lo que hace invalidar_grupos en otro proceso: la versión sube en MongoDB
+    # pero la copia en memoria de este worker no se entera
+    promedios.actualizar_alumno(bd, {'_id': 1}, TRIMESTRE, calificaciones(10, 10, 10, 10, 10))
+    bd.versiones_grupos.update_one({'_id': '1°A'}, {'$inc': {'version': 1}}, upsert=True)
+    return bd.versiones_grupos.find_one({'_id': '1°A'})['version']
+
+
+def test_quien_escribio_ve_su_cambio_en_otro_worker(app, bd, monkeypatch):
+    sembrar(bd, [('Ana', 'López', '1°A', {TRIMESTRE: calificaciones(6, 6, 6, 6, 6)})])
+    # Sin revisión periódica durante la prueba: solo la sesión puede forzarla
+    monkeypatch.setattr(cache, 'sincronizar', 3600)
+    maestro = iniciar_sesion(app, 'm1a', '1234')
+    otro = iniciar_sesion(app, 'm1a', '1234')
+    assert promedio_de_ana(maestro) == 6
+
+    version = escribir_en_otro_worker(bd)
+    with maestro.session_transaction() as sesion:
+        sesion['versiones_escritas'] = {'1°A': version}
+
+    # Otra sesión sin escrituras recibe la copia en memoria hasta la siguiente
+    # sincronización; quien escribió no
+    assert promedio_de_ana(otro) == 6
+    assert promedio_de_ana(maestro) == 10
+
+
+def test_guardar_recuerda_la_version_en_la_sesion(app, bd):
+    sembrar(bd, [('Ana', 'López', '1°A', {TRIMESTRE: calificaciones(6, 6, 6, 6, 6)})])
+    maestro = iniciar_sesion(app, 'm1a', '1234')
+
+    respuesta = maestro.post('/modificar_calificaciones/1', data={'trimestre': TRIMESTRE, **calificaciones(9, 9, 9, 9, 9)})
+
+    assert respuesta.status_code == 302
+    with maestro.session_transaction() as sesion:
+        escritas = sesion['versiones_escritas']
+    assert escritas == {'1°A': bd.versiones_grupos.find_one({'_id': '1°A'})['version']}
+    assert promedio_de_ana(maestro) == 9
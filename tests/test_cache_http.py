@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import CACHE_INMUTABLE, HUELLAS_ESTATICOS
+from cache_grupos import invalidar_grupos
+from conftest import calificaciones, iniciar_sesion, sembrar
+
+URL = '/calificaciones?trimestre=primer_trimestre'
+
+
+@pytest.fixture
+def maestro(app, bd):
+    sembrar(bd, [('Ana', 'López', '1°A', {'primer_trimestre': calificaciones(6, 6, 6, 6, 6)})])
+    invalidar_grupos(bd, ['1°A'])
+    cliente = iniciar_sesion(app, 'm1a', '1234')
+    # La primera visita guarda el trimestre en la sesión; a partir de aquí la
+    # página solo depende de la versión del grupo
+    cliente.get(URL).close()
+    return cliente
+
+
+def test_pagina_del_grupo_lleva_etag_y_last_modified_en_utc(maestro):
+    respuesta = maestro.get(URL)
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag']
+    assert respuesta.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Cookie' in respuesta.vary
+    # Last-Modified es GMT: la hora guardada tiene que ser UTC
+    assert abs(respuesta.last_modified - datetime.now(timezone.utc)) < timedelta(minutes=1)
+
+
+def test_misma_version_responde_304_y_una_escritura_la_cambia(maestro, bd):
+    etag = maestro.get(URL).headers['ETag']
+
+    sin_cambios = maestro.get(URL, headers={'If-None-Match': etag})
+    assert sin_cambios.status_code == 304 and sin_cambios.get_data() == b''
+    assert sin_cambios.headers['ETag'] == etag
+
+    invalidar_grupos(bd, ['1°A'])
+    cambiada = maestro.get(URL, headers={'If-None-Match': etag})
+    assert cambiada.status_code == 200 and cambiada.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('url,cache_control', [
+    (f"/static/css.css?v={HUELLAS_ESTATICOS['css.css']}", CACHE_INMUTABLE),
+    ('/static/css.css?v=huellavieja', 'no-cache'),
+    ('/static/css.css', 'no-cache'),
+    ('/css.css', 'no-cache'),
+])
+def test_estaticos_solo_son_inmutables_con_la_huella_vigente(app, url, cache_control):
+    respuesta = app.test_client().get(url)
+    respuesta.close()
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers['Cache-Control'] == cache_control
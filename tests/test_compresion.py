@@ -0,0 +1,89 @@
+import gzip
+import zlib
+
+import pytest
+
+import compresion
+from conftest import calificaciones, iniciar_sesion, sembrar
+
+PAGINA = '/calificaciones?trimestre=primer_trimestre'
+EXPORTACION = '/reportes/export?grupo=todos&trimestre=primer_trimestre&formato=csv'
+
+
+@pytest.fixture
+def alumnos(bd):
+    sembrar(bd, [(f'Alumno {i}', f'Apellido {i:03d}', '1°A', {'primer_trimestre': calificaciones(8, 8, 8, 8, 8)})
+                 for i in range(60)])
+
+
+def descargar(cliente, url, codificacion):
+    respuesta = cliente.get(url, headers={'Accept-Encoding': codificacion} if codificacion else {})
+    respuesta.close()
+    return respuesta
+
+
+def test_gzip_negociado_con_vary_y_etag_propio(app, alumnos):
+    maestro = iniciar_sesion(app, 'm1a', '1234')
+    # La primera visita muestra el mensaje de bienvenida
+    descargar(maestro, PAGINA, None)
+    plana = descargar(maestro, PAGINA, None)
+    comprimida = descargar(maestro, PAGINA, 'gzip, deflate')
+
+    assert 'Content-Encoding' not in plana.headers
+    assert comprimida.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in plana.vary and 'Accept-Encoding' in comprimida.vary
+    assert gzip.decompress(comprimida.get_data()) == plana.get_data()
+    assert len(comprimida.get_data()) < len(plana.get_data())
+    assert comprimida.headers['ETag'] == plana.headers['ETag'][:-1] + '-gzip"'
+
+
+def test_sin_gzip_aceptado_no_comprime(app, alumnos):
+    maestro = iniciar_sesion(app, 'm1a', '1234')
+
+    respuesta = descargar(maestro, PAGINA, 'gzip;q=0, identity')
+
+    assert 'Content-Encoding' not in respuesta.headers
+    assert 'Accept-Encoding' in respuesta.vary
+
+
+def test_respuesta_menor_al_minimo_no_se_comprime(app, alumnos, monkeypatch):
+    maestro = iniciar_sesion(app, 'm1a', '1234')
+    monkeypatch.setattr(compresion, 'MINIMO', 10 ** 9)
+
+    respuesta = descargar(maestro, PAGINA, 'gzip')
+
+    assert 'Content-Encoding' not in respuesta.headers
+
+
+def test_flujo_gzip_se_puede_leer_por_fragmentos(app, alumnos):
+    admin = iniciar_sesion(app, 'admin', 'admin')
+    plana = descargar(admin, EXPORTACION, None).get_data()
+
+    respuesta = admin.get(EXPORTACION, headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    try:
+        assert respuesta.is_streamed
+        assert respuesta.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in respuesta.headers
+        assert 'Accept-Encoding' in respuesta.vary
+        descompresor = zlib.decompressobj(31)
+        fragmentos = iter(respuesta.response)
+        # Cada fragmento lleva un flush: el primero ya se descomprime solo
+        primero = descompresor.decompress(next(fragmentos))
+        assert primero and plana.startswith(primero)
+        resto = b''.join(descompresor.decompress(fragmento) for fragmento in fragmentos)
+    finally:
+        respuesta.close()
+
+    assert primero + resto + descompresor.flush() == plana
+
+
+def test_brotli_preferido_si_esta_instalado(app, alumnos):
+    brotli = pytest.importorskip('brotli')
+    maestro = iniciar_sesion(app, 'm1a', '1234')
+    descargar(maestro, PAGINA, None)
+    plana = descargar(maestro, PAGINA, None)
+
+    respuesta = descargar(maestro, PAGINA, 'gzip, br')
+
+    assert respuesta.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(respuesta.get_data()) == plana.get_data()
@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+import contrasenas
+from conftest import iniciar_sesion, mensajes, sembrar
+
+
+def test_tiempo_agotado_en_pool_es_servidor_ocupado(monkeypatch):
+    monkeypatch.setattr(contrasenas, 'ESPERA_MAXIMA', 0.01)
+    with pytest.raises(contrasenas.ServidorOcupado):
+        contrasenas.en_pool(time.sleep, 0.2)
+
+
+def test_lugar_se_libera_cuando_termina_el_calculo(monkeypatch):
+    monkeypatch.setattr(contrasenas, '_lugares', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(contrasenas, 'ESPERA_MAXIMA', 0.01)
+    with pytest.raises(contrasenas.ServidorOcupado, match='tardó'):
+        contrasenas.en_pool(time.sleep, 0.2)
+
+    # El cálculo sigue en el pool: su lugar sigue ocupado
+    with pytest.raises(contrasenas.ServidorOcupado, match='a la vez'):
+        contrasenas.en_pool(time.sleep, 0)
+
+    time.sleep(0.3)
+    assert contrasenas.en_pool(abs, -1) == 1
+
+
+def test_lugar_se_libera_si_falla_submit(monkeypatch):
+    class PoolCerrado:
+        def submit(self, *argumentos):
+            raise RuntimeError("cannot schedule new futures after shutdown")
+
+    monkeypatch.setattr(contrasenas, '_lugares', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(contrasenas, '_pool', PoolCerrado)
+    with pytest.raises(RuntimeError):
+        contrasenas.en_pool(abs, -1)
+
+    assert contrasenas._lugares.acquire(blocking=False)
+
+
+def test_login_con_pool_lento_no_falla(app, bd, monkeypatch):
+    sembrar(bd, [])
+    verificar = contrasenas.verificar
+    cliente = app.test_client()
+
+    with monkeypatch.context() as lento:
+        lento.setattr(contrasenas, 'ESPERA_MAXIMA', 0.01)
+        lento.setattr(contrasenas, 'verificar', lambda *argumentos: (time.sleep(0.2), verificar(*argumentos))[1])
+        respuesta = cliente.post('/iniciar_sesion', data={'usuario': 'admin', 'password': 'admin'})
+
+    assert respuesta.status_code == 302 and respuesta.location == '/'
+    assert any('muchos inicios de sesión' in texto for texto in mensajes(cliente))
+    iniciar_sesion(app, 'admin', 'admin')
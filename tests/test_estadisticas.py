@@ -0,0 +1,141 @@
+import random
+
+import mongomock
+import pytest
+
+import estadisticas
+import promedios
+from escuela import GRUPOS, MATERIAS, TRIMESTRES, nuevo_alumno
+
+# Cada estadística se calcula con la agregación y con su equivalente en Python
+# (ESTADISTICAS_EN_PYTHON) sobre los mismos datos y debe dar lo mismo. Corre
+# en mongomock y, si hay servidor, también en MongoDB real (MONGO_URL_PRUEBAS)
+BD_PRUEBAS = 'pruebas_estadisticas'
+ORDEN = [('grupo', 1), ('apellidos', 1), ('nombre', 1), ('_id', 1)]
+
+
+def calificacion(azar):
+    # 0 y None son "sin capturar"; hay enteros y decimales
+    return azar.choice([0, None, 5, 6, 7.5, 8, 9.3, 10, azar.randint(5, 10), round(azar.uniform(5, 10), 1)])
+
+
+def alumnos_de_prueba():
+    azar = random.Random(2024)
+    alumnos = []
+    for i in range(1, 121):
+        capturadas = {
+            trimestre: {materia: calificacion(azar) for materia in MATERIAS}
+            for trimestre in TRIMESTRES[:azar.randint(0, 3)]
+        }
+        alumno = {'_id': i, **nuevo_alumno(f'Alumno {i}', f'Apellido {i % 17}', azar.choice(GRUPOS[:8]), capturadas)}
+        # La mitad ya tiene los promedios materializados; la otra los calcula
+        alumnos.append(promedios.preparar_alta(alumno) if i % 2 else alumno)
+    # Sin ninguna materia capturada en ningún trimestre
+    alumnos.append({'_id': 999, **nuevo_alumno('Sin', 'Capturar', '6°C')})
+    return alumnos
+
+
+def maestros_de_prueba():
+    return [
+        {'_id': 1, 'usuario': 'admin', 'rol': 'admin', 'activo': True},
+        {'_id': 2, 'usuario': 'm1a', 'rol': 'maestro', 'activo': True},
+        {'_id': 3, 'usuario': 'm1b', 'rol': 'maestro', 'activo': True},
+        {'_id': 4, 'usuario': 'm2a', 'rol': 'maestro', 'activo': False},
+    ]
+
+
+@pytest.fixture(params=['mongomock', 'mongodb'])
+def bd_estadisticas(request):
+    if request.param == 'mongomock':
+        cliente = mongomock.MongoClient()
+    else:
+        cliente = request.getfixturevalue('cliente_mongodb')
+    cliente.drop_database(BD_PRUEBAS)
+    db = cliente[BD_PRUEBAS]
+    db.alumnos.insert_many(alumnos_de_prueba())
+    db.maestros.insert_many(maestros_de_prueba())
+    yield db
+    cliente.drop_database(BD_PRUEBAS)
+
+
+def es_mongomock(db):
+    return isinstance(db.client, mongomock.MongoClient)
+
+
+def en_ambos(monkeypatch, calcular):
+    # (resultado con la agregación, resultado en Python)
+    monkeypatch.setattr(estadisticas, 'EN_PYTHON', False)
+    agregacion = calcular()
+    monkeypatch.setattr(estadisticas, 'EN_PYTHON', True)
+    return agregacion, calcular()
+
+
+@pytest.fixture(params=[True, False], ids=['materializados', 'calculados'])
+def materializados(request, monkeypatch):
+    monkeypatch.setattr(estadisticas, 'USAR_MATERIALIZADOS', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('trimestre', TRIMESTRES)
+def test_alumnos_con_promedio(bd_estadisticas, materializados, monkeypatch, trimestre):
+    for filtro, limite in [({}, None), ({'grupo': GRUPOS[0]}, None), ({'grupo': {'$in': GRUPOS[2:5]}}, 7)]:
+        agregacion, python = en_ambos(monkeypatch, lambda: list(
+            estadisticas.iterar_alumnos_con_promedio(bd_estadisticas, filtro, trimestre, ORDEN, limite=limite)))
+        assert agregacion and agregacion == python
+
+
+@pytest.mark.parametrize('trimestre', TRIMESTRES)
+def test_resumen_grupo(bd_estadisticas, materializados, monkeypatch, trimestre):
+    # Sin documentos en resumen_grupos: se calcula sobre los alumnos.
+    # '6°B' no tiene alumnos: MongoDB no devuelve nada de $group sobre una
+    # entrada vacía, pero mongomock devuelve un grupo con total 0
+    vacios = [] if es_mongomock(bd_estadisticas) else ['6°B']
+    for grupo in GRUPOS[:8] + ['6°C'] + vacios:
+        agregacion, python = en_ambos(monkeypatch, lambda: estadisticas.resumen_grupo(bd_estadisticas, grupo, trimestre))
+        assert agregacion == python
+
+
+@pytest.mark.parametrize('trimestre', TRIMESTRES)
+def test_resumen_por_grupo(bd_estadisticas, materializados, monkeypatch, trimestre):
+    for filtro in [None, {'grupo': {'$in': GRUPOS[1:4]}}, {'grupo': '9°Z'}]:
+        agregacion, python = en_ambos(monkeypatch, lambda: estadisticas.resumen_por_grupo(bd_estadisticas, trimestre, filtro))
+        assert agregacion == python
+
+
+def facetas_tablero(db):
+    pipeline = estadisticas.pipeline_tablero()
+    if not es_mongomock(db):
+        return next(db.maestros.aggregate(pipeline))
+    # mongomock no implementa $unionWith ni $substrCP: la unión se arma con
+    # las mismas etapas en una colección aparte y $substrCP se cambia por
+    # $substr (igual para el primer carácter de '1°A'). El resto del
+    # pipeline corre tal cual
+    union = pipeline[2]['$unionWith']
+    db.union_tablero.insert_many(
+        list(db.maestros.aggregate(pipeline[:2])) + list(db[union['coll']].aggregate(union['pipeline'])))
+    facetas = pipeline[3]
+    for faceta in facetas['$facet']['por_grado']:
+        if '$group' in faceta:
+            faceta['$group']['_id'] = {'$substr': faceta['$group']['_id']['$substrCP']}
+    return next(db.union_tablero.aggregate([facetas] + pipeline[4:]))
+
+
+def test_tablero(bd_estadisticas, monkeypatch):
+    monkeypatch.setattr(estadisticas, 'USAR_MATERIALIZADOS', False)
+    agregacion = estadisticas._formatear_tablero(facetas_tablero(bd_estadisticas))
+    python = estadisticas._formatear_tablero(
+        estadisticas.tablero_python(bd_estadisticas.maestros.find(), bd_estadisticas.alumnos.find()))
+
+    assert agregacion == python
+    assert agregacion['total_maestros'] == 2 and agregacion['total_alumnos'] == 121
+
+
+def test_tablero_materializado(bd_estadisticas, monkeypatch):
+    # El tablero leído de resumen_grupos coincide con el calculado
+    promedios.verificar(bd_estadisticas, reparar=True)
+    monkeypatch.setattr(estadisticas, 'EN_PYTHON', True)
+    monkeypatch.setattr(estadisticas, 'USAR_MATERIALIZADOS', True)
+    materializado = estadisticas.calcular_tablero(bd_estadisticas)
+    monkeypatch.setattr(estadisticas, 'USAR_MATERIALIZADOS', False)
+
+    assert materializado == estadisticas.calcular_tablero(bd_estadisticas)
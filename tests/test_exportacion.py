@@ -0,0 +1,27 @@
+import io
+
+import pytest
+
+import exportacion
+from conftest import calificaciones, iniciar_sesion, sembrar
+
+openpyxl = pytest.importorskip('openpyxl')
+
+
+@pytest.mark.parametrize('en_memoria', [4 * 1024 * 1024, 1], ids=['en_memoria', 'en_disco'])
+def test_exportar_xlsx_por_grupo(app, bd, monkeypatch, en_memoria):
+    monkeypatch.setattr(exportacion, 'XLSX_EN_MEMORIA', en_memoria)
+    monkeypatch.setattr(exportacion, 'TAMANO_FRAGMENTO', 1024)
+    sembrar(bd, [('Ana', 'López', '1°A', {'primer_trimestre': calificaciones(9, 8, 0, 7, 6)}),
+                 ('=Beto', 'Ruiz', '2°B', {})])
+    admin = iniciar_sesion(app, 'admin', 'admin')
+
+    respuesta = admin.get('/reportes/export?grupo=todos&trimestre=primer_trimestre&formato=xlsx')
+
+    assert respuesta.status_code == 200
+    libro = openpyxl.load_workbook(io.BytesIO(respuesta.get_data()), read_only=True)
+    assert libro.sheetnames == ['1°A', '2°B']
+    filas = [list(fila) for fila in libro['1°A'].iter_rows(values_only=True)]
+    assert filas[0] == exportacion.ENCABEZADO
+    assert filas[1] == ['1°A', 'López', 'Ana', 9, 8, None, 7, 6, 7.5, 'Aprobado']
+    assert [list(fila) for fila in libro['2°B'].iter_rows(values_only=True)][1][:3] == ['2°B', 'Ruiz', "'=Beto"]
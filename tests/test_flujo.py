@@ -0,0 +1,49 @@
+import random
+import tracemalloc
+
+import app as app_modulo
+import paginacion
+import promedios
+from conftest import iniciar_sesion, sembrar
+from escuela import GRUPOS, MATERIAS, TRIMESTRES, nuevo_alumno
+
+ALUMNOS = 10000
+# La tabla de admin con 10 000 alumnos en flujo pica en ~9 MB con mongomock
+# (la mayor parte son las copias de los documentos que hace mongomock); la
+# página armada completa en memoria pica en ~70 MB. Ver benchmarks/bench_flujo.py
+PRESUPUESTO_MB = 20
+
+
+def pico_mb(cliente):
+    tracemalloc.start()
+    try:
+        respuesta = cliente.get('/calificaciones', buffered=False)
+        tamano = sum(len(fragmento) for fragmento in respuesta.response)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    respuesta.close()
+    assert respuesta.status_code == 200 and tamano > ALUMNOS * 500
+    return pico / 1024 / 1024
+
+
+def test_tabla_de_admin_en_flujo_dentro_del_presupuesto(app, bd, monkeypatch):
+    sembrar(bd, [])
+    # mongomock revisa los índices únicos documento por documento: sin ellos la
+    # siembra tarda segundos en lugar de minutos. No cambian lo que se mide
+    bd.alumnos.drop_indexes()
+    azar = random.Random(7)
+    bd.alumnos.insert_many([
+        promedios.preparar_alta({'_id': i, **nuevo_alumno(f'Alumno {i}', f'Apellido {i:05d}', azar.choice(GRUPOS), {
+            trimestre: {materia: round(azar.uniform(5, 10), 1) for materia in MATERIAS} for trimestre in TRIMESTRES
+        })})
+        for i in range(1, ALUMNOS + 1)
+    ])
+    # Toda la escuela en una sola respuesta, sin paginación
+    monkeypatch.setattr(paginacion, 'TAMANO_PAGINA', 0)
+    monkeypatch.setattr(app_modulo, 'FLUJO_ADMIN', True)
+    cliente = iniciar_sesion(app, 'admin', 'admin')
+
+    pico = pico_mb(cliente)
+
+    assert pico < PRESUPUESTO_MB, f"pico de {pico:.1f} MB con {ALUMNOS} alumnos (presupuesto {PRESUPUESTO_MB} MB)"
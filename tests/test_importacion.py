@@ -0,0 +1,60 @@
+import io
+
+import importacion
+from conftest import iniciar_sesion, sembrar
+
+
+class SoloLectura:
+    # Como el SpooledTemporaryFile de Python 3.9: read() y seek(), sin readable()
+    def __init__(self, contenido):
+        self._archivo = io.BytesIO(contenido)
+
+    def read(self, *argumentos):
+        return self._archivo.read(*argumentos)
+
+    def seek(self, *argumentos):
+        return self._archivo.seek(*argumentos)
+
+
+def test_csv_sin_interfaz_io_completa():
+    contenido = '﻿nombre;apellidos;grupo\r\nAna;"López\r\nRuiz";1°A\r\n'.encode('utf-8')
+
+    filas = list(importacion.leer_filas(SoloLectura(contenido), 'alumnos.csv'))
+
+    assert filas == [(2, {'nombre': 'Ana', 'apellidos': 'López\r\nRuiz', 'grupo': '1°A'})]
+
+
+def subir(cliente, contenido, nombre='alumnos.csv'):
+    return cliente.post('/importar_alumnos?formato=json',
+                        data={'archivo': (io.BytesIO(contenido), nombre)},
+                        content_type='multipart/form-data')
+
+
+def test_subir_csv(app, bd):
+    sembrar(bd, [])
+    cliente = iniciar_sesion(app, 'admin', 'admin')
+    contenido = ('nombre,apellidos,grupo,primer_trimestre.matematicas\r\n'
+                 'Ana,López,1°A,9\r\n'
+                 'Beto,Ruiz,7°Z,8\r\n').encode('utf-8-sig')
+
+    respuesta = subir(cliente, contenido)
+
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    resultado = respuesta.get_json()
+    assert (resultado['insertados'], resultado['con_errores']) == (1, 1)
+    assert bd.alumnos.find_one({'nombre': 'Ana'})['calificaciones']['primer_trimestre']['matematicas'] == 9
+
+
+def test_subir_csv_grande(app, bd):
+    # Más de 500 KB: Werkzeug lo guarda en un archivo temporal en disco
+    sembrar(bd, [])
+    cliente = iniciar_sesion(app, 'admin', 'admin')
+    filas = [f'Alumno{i},{"Apellido" * 150}{i},{"1°A" if i % 2 else "2°B"}' for i in range(500)]
+    contenido = ('nombre,apellidos,grupo\n' + '\n'.join(filas) + '\n').encode('utf-8')
+    assert len(contenido) > 500 * 1024
+
+    respuesta = subir(cliente, contenido)
+
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert respuesta.get_json()['insertados'] == 500
+    assert bd.alumnos.count_documents({}) == 500
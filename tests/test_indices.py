@@ -0,0 +1,47 @@
+import pytest
+from pymongo.errors import OperationFailure
+
+import indices
+from escuela import nuevo_alumno
+
+
+def test_vigencia_ttl_distinta_se_ajusta_en_su_lugar(bd, monkeypatch):
+    bd.sesiones.drop_index('expira_ttl')
+    bd.sesiones.create_index('expira', name='expira_ttl', expireAfterSeconds=3600)
+    comandos = []
+    # mongomock no implementa collMod
+    monkeypatch.setattr(type(bd), 'command', lambda self, *argumentos, **opciones: comandos.append((argumentos, opciones)))
+
+    acciones = indices.asegurar_indices(bd)
+
+    assert acciones == ['sesiones.expira_ttl: vigencia TTL cambiada']
+    assert comandos == [(('collMod', 'sesiones'), {'index': {'name': 'expira_ttl', 'expireAfterSeconds': 0}})]
+
+
+def test_indice_unico_con_repetidos_conserva_el_anterior(bd):
+    bd.alumnos.drop_index('grupo_apellidos_nombre_unico')
+    bd.alumnos.create_index([('grupo', 1), ('apellidos', 1), ('nombre', 1)], name='grupo_apellidos_nombre_unico')
+    bd.alumnos.insert_many([{'_id': i, **nuevo_alumno('Ana', 'López', '1°A')} for i in (1, 2)])
+
+    with pytest.raises(indices.IndiceNoAplicable, match='repetidos'):
+        indices.asegurar_indices(bd)
+
+    assert 'grupo_apellidos_nombre_unico' in bd.alumnos.index_information()
+
+
+def test_si_falla_la_creacion_se_restaura_el_anterior(bd, monkeypatch):
+    bd.maestros.drop_index('grupo')
+    bd.maestros.create_index('grado', name='grupo')
+    crear = type(bd.maestros).create_index
+
+    def crear_o_fallar(coleccion, llaves, **opciones):
+        if opciones.get('name') == 'grupo' and llaves == [('grupo', 1)]:
+            raise OperationFailure("index build aborted")
+        return crear(coleccion, llaves, **opciones)
+
+    monkeypatch.setattr(type(bd.maestros), 'create_index', crear_o_fallar)
+
+    with pytest.raises(indices.IndiceNoAplicable, match='se restauró grupo'):
+        indices.asegurar_indices(bd)
+
+    assert bd.maestros.index_information()['grupo']['key'] == [('grado', 1)]
@@ -0,0 +1,61 @@
+import pytest
+
+from cache_grupos import pagina_grupo
+from conftest import iniciar_sesion, sembrar
+from escuela import nuevo_alumno
+from paginacion import ORDEN_ALUMNOS, pagina_alumnos
+
+
+def sembrar_homonimos(bd):
+    # Sin el índice único (datos viejos con duplicados) hay alumnos con el
+    # mismo grupo, apellidos y nombre
+    bd.alumnos.drop_indexes()
+    bd.alumnos.insert_many([
+        {'_id': i, **nuevo_alumno('Ana' if i % 3 else 'Beto', 'López' if i % 2 else 'Ruiz', '1°A' if i < 20 else '2°B')}
+        for i in range(1, 31)
+    ])
+
+
+def recorrer(pagina_siguiente, limite):
+    vistos, despues = [], None
+    while True:
+        pagina = pagina_siguiente(despues, limite)
+        vistos.extend(alumno['_id'] for alumno in pagina)
+        if pagina.siguiente is None:
+            return vistos
+        despues = pagina.siguiente
+
+
+def test_orden_termina_en_id():
+    assert ORDEN_ALUMNOS[-1] == ('_id', 1)
+
+
+def test_paginas_con_homonimos_no_repiten_ni_saltan(bd):
+    sembrar_homonimos(bd)
+    esperados = [a['_id'] for a in bd.alumnos.find().sort(ORDEN_ALUMNOS)]
+
+    for limite in (1, 4, 7):
+        vistos = recorrer(lambda despues, limite: pagina_alumnos(bd, {}, 'primer_trimestre', despues, limite), limite)
+        assert vistos == esperados
+
+
+def test_paginas_del_grupo_en_cache_con_homonimos(bd):
+    sembrar_homonimos(bd)
+    esperados = [a['_id'] for a in bd.alumnos.find({'grupo': '1°A'}).sort(ORDEN_ALUMNOS)]
+
+    vistos = recorrer(lambda despues, limite: pagina_grupo(bd, '1°A', 'primer_trimestre', despues, limite), 4)
+
+    assert vistos == esperados
+
+
+@pytest.mark.parametrize('usuario,password,url', [
+    ('m1a', '1234', '/calificaciones?trimestre=cuarto_trimestre'),
+    ('admin', 'admin', '/reportes?grupo=1°A&trimestre=$where'),
+])
+def test_trimestre_desconocido_es_400(app, bd, usuario, password, url):
+    sembrar(bd, [])
+    cliente = iniciar_sesion(app, usuario, password)
+
+    assert cliente.get(url).status_code == 400
+    with cliente.session_transaction() as sesion:
+        assert sesion.get('trimestre_actual') != 'cuarto_trimestre'
@@ -0,0 +1,19 @@
+import preparar_bd
+
+
+def test_migracion_conserva_calificaciones_con_datos(bd):
+    bd.calificaciones.insert_one({'alumno_id': 1, 'matematicas': 9})
+
+    preparar_bd.migrar(bd)
+
+    assert bd.calificaciones.count_documents({}) == 1
+    marca = bd.migraciones.find_one({'_id': '005_sin_coleccion_calificaciones'})
+    assert marca['estado'] == 'aplicada' and 'conservada' in marca['resultado']
+
+
+def test_migracion_borra_calificaciones_vacia(bd):
+    bd.create_collection('calificaciones')
+
+    preparar_bd.migrar(bd)
+
+    assert 'calificaciones' not in bd.list_collection_names()
@@ -0,0 +1,103 @@
+import pytest
+
+import estadisticas
+import promedios
+from conftest import calificaciones, sembrar
+
+TRIMESTRE = 'primer_trimestre'
+
+
+class ProcesoMuerto(Exception):
+    pass
+
+
+def morir_antes_del_resumen(monkeypatch):
+    # El alumno ya se escribió y el proceso muere antes de ajustar resumen_grupos
+    def aplicar(self, db, sesion=None):
+        raise ProcesoMuerto()
+    monkeypatch.setattr(promedios.Deltas, 'aplicar', aplicar)
+
+
+def test_sin_transacciones_el_desfase_se_repara(bd, monkeypatch):
+    sembrar(bd, [('Ana', 'López', '1°A', {TRIMESTRE: calificaciones(6, 6, 6, 6, 6)}),
+                 ('Beto', 'Ruiz', '1°A', {TRIMESTRE: calificaciones(8, 8, 8, 8, 8)})])
+    assert not promedios.soporta_transacciones(bd)
+    assert promedios.verificar(bd) == []
+
+    with monkeypatch.context() as contexto:
+        morir_antes_del_resumen(contexto)
+        with pytest.raises(ProcesoMuerto):
+            promedios.actualizar_alumno(bd, {'_id': 1}, TRIMESTRE, calificaciones(10, 10, 10, 10, 10))
+
+    # Sin transacción el alumno quedó escrito y el resumen del grupo no
+    assert bd.alumnos.find_one({'_id': 1})['promedios'][TRIMESTRE] == 10
+    diferencias = promedios.verificar(bd)
+    assert diferencias and all(d.startswith('resumen 1°A|primer_trimestre') for d in diferencias)
+    assert estadisticas.resumen_grupo(bd, '1°A', TRIMESTRE)['promedio'] == 7
+
+    promedios.verificar(bd, reparar=True)
+
+    assert promedios.verificar(bd) == []
+    assert estadisticas.resumen_grupo(bd, '1°A', TRIMESTRE)['promedio'] == 9
+
+
+@pytest.fixture
+def bd_replica(cliente_mongodb):
+    db = cliente_mongodb['pruebas_promedios']
+    if not promedios.soporta_transacciones(db):
+        pytest.skip("MONGO_URL_PRUEBAS no es un replica set: no hay transacciones")
+    cliente_mongodb.drop_database(db.name)
+    yield db
+    cliente_mongodb.drop_database(db.name)
+
+
+def test_con_transaccion_no_queda_desfase(bd_replica, monkeypatch):
+    alumno = promedios.preparar_alta({'_id': 1, 'nombre': 'Ana', 'apellidos': 'López', 'grupo': '1°A',
+                                      'calificaciones': {TRIMESTRE: calificaciones(6, 6, 6, 6, 6)}})
+    bd_replica.alumnos.insert_one(alumno)
+    promedios.registrar_altas(bd_replica, [alumno])
+
+    with monkeypatch.context() as contexto:
+        morir_antes_del_resumen(contexto)
+        with pytest.raises(ProcesoMuerto):
+            promedios.actualizar_alumno(bd_replica, {'_id': 1}, TRIMESTRE, calificaciones(10, 10, 10, 10, 10))
+
+    # La transacción se abortó: el alumno no cambió
+    assert bd_replica.alumnos.find_one({'_id': 1})['promedios'][TRIMESTRE] == 6
+    assert promedios.verificar(bd_replica) == []
+
+
+@pytest.mark.parametrize('escrito_por_otro,modificados', [
+    (calificaciones(9, 9, 9, 9, 9), 1),
+    # El otro ya dejó exactamente lo que este lote iba a escribir: no se
+    # cuenta dos veces la misma diferencia
+    (calificaciones(10, 6, 6, 6, 6), 0),
+])
+def test_lote_con_lectura_vieja_ajusta_desde_el_trimestre_real(bd, escrito_por_otro, modificados):
+    sembrar(bd, [('Ana', 'López', '1°A', {TRIMESTRE: calificaciones(6, 6, 6, 6, 6)}),
+                 ('Beto', 'Ruiz', '1°A', {TRIMESTRE: calificaciones(8, 8, 8, 8, 8)})])
+    actuales = {1: calificaciones(6, 6, 6, 6, 6), 2: calificaciones(8, 8, 8, 8, 8)}
+    promedios.actualizar_alumno(bd, {'_id': 1}, TRIMESTRE, escrito_por_otro)
+
+    encontrados, cambiados = promedios.escribir_calificaciones(
+        bd, '1°A', TRIMESTRE, {1: {'matematicas': 10}, 2: {'ingles': 10}}, actuales)
+
+    assert (encontrados, cambiados) == (2, 1 + modificados)
+    assert bd.alumnos.find_one({'_id': 1})['calificaciones'][TRIMESTRE] == {**escrito_por_otro, 'matematicas': 10}
+    assert promedios.verificar(bd) == []
+
+
+def test_lote_en_transaccion_no_deja_desfase(bd_replica):
+    alumnos = [promedios.preparar_alta({'_id': i, 'nombre': nombre, 'apellidos': 'López', 'grupo': '1°A',
+                                        'calificaciones': {TRIMESTRE: calificaciones(6, 6, 6, 6, 6)}})
+               for i, nombre in ((1, 'Ana'), (2, 'Beto'))]
+    bd_replica.alumnos.insert_many(alumnos)
+    promedios.registrar_altas(bd_replica, alumnos)
+    promedios.actualizar_alumno(bd_replica, {'_id': 1}, TRIMESTRE, calificaciones(10, 6, 6, 6, 6))
+
+    resultado = promedios.escribir_calificaciones(
+        bd_replica, '1°A', TRIMESTRE, {1: {'matematicas': 10}, 2: {'matematicas': 10}},
+        {1: calificaciones(6, 6, 6, 6, 6), 2: calificaciones(6, 6, 6, 6, 6)})
+
+    assert resultado == (2, 1)
+    assert promedios.verificar(bd_replica) == []
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import sesiones
+from conftest import calificaciones, iniciar_sesion, sembrar
+
+URL = '/calificaciones?trimestre=primer_trimestre'
+
+
+@pytest.fixture
+def maestro(app, bd):
+    if not isinstance(app.session_interface, sesiones.InterfazSesiones):
+        pytest.skip("SESIONES=cookie: no hay almacén en el servidor")
+    sembrar(bd, [('Ana', 'López', '1°A', {'primer_trimestre': calificaciones(8, 8, 8, 8, 8)})])
+    cliente = iniciar_sesion(app, 'm1a', '1234')
+    # Consume el mensaje de bienvenida y guarda el trimestre elegido
+    cliente.get(URL).close()
+    return cliente
+
+
+@pytest.fixture
+def escrituras(app, monkeypatch):
+    almacen = app.session_interface.almacen
+    guardadas = []
+    guardar = almacen.guardar
+    monkeypatch.setattr(almacen, 'guardar', lambda *argumentos: (guardadas.append(argumentos), guardar(*argumentos))[1])
+    return guardadas
+
+
+def test_sesion_sin_cambios_no_se_vuelve_a_guardar(maestro, escrituras):
+    for _ in range(3):
+        respuesta = maestro.get(URL)
+        respuesta.close()
+        assert respuesta.status_code == 200
+        assert 'Set-Cookie' not in respuesta.headers
+
+    assert escrituras == []
+
+
+def test_sesion_modificada_se_guarda_una_vez(maestro, escrituras, bd):
+    maestro.get('/calificaciones?trimestre=segundo_trimestre').close()
+
+    assert len(escrituras) == 1
+    sid, datos, expira = escrituras[0]
+    assert datos['trimestre_actual'] == 'segundo_trimestre'
+    assert bd.sesiones.find_one({'_id': sid})['datos']['trimestre_actual'] == 'segundo_trimestre'
+
+
+def test_sesion_por_vencer_se_renueva(maestro, escrituras, bd):
+    casi_vencida = datetime.utcnow() + sesiones.DURACION / 4
+    bd.sesiones.update_many({}, {'$set': {'expira': casi_vencida}})
+
+    maestro.get(URL).close()
+
+    assert len(escrituras) == 1
+    assert escrituras[0][2] - datetime.utcnow() > sesiones.DURACION - timedelta(minutes=1)
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import promedios
+import trabajos
+from conftest import calificaciones, iniciar_sesion, sembrar
+
+
+def test_recalcular_reporta_avance_por_lote(bd, monkeypatch):
+    sembrar(bd, [(f'Alumno {i}', 'López', '1°A', {'primer_trimestre': calificaciones(8, 8, 8, 8, 8)})
+                 for i in range(1, 26)])
+    bd.alumnos.update_many({}, {'$unset': {'promedios': ''}})
+    monkeypatch.setattr(promedios, 'LOTE_VERIFICAR', 10)
+    monkeypatch.setattr(trabajos, 'INTERVALO_AVANCE', 0)
+    latidos = []
+    llamar = trabajos.Avance.__call__
+    monkeypatch.setattr(trabajos.Avance, '__call__',
+                        lambda self, hechos, total=None, mensaje='': (latidos.append((hechos, mensaje)),
+                                                                      llamar(self, hechos, total, mensaje))[1])
+    trabajo_id = trabajos.encolar(bd, 'recalcular')
+
+    trabajos.ejecutar(bd, trabajos.tomar_trabajo(bd, 'pruebas'))
+
+    trabajo = bd.trabajos.find_one({'_id': trabajo_id})
+    assert trabajo['estado'] == 'terminado' and trabajo['resultado']['corregidas'] == 25
+    assert [hechos for hechos, _ in latidos] == [10, 20, 10, 20]
+    assert trabajo['latido'] > trabajo['iniciado']
+    assert promedios.verificar(bd) == []
+
+
+def test_pendiente_sin_worker_muestra_aviso(app, bd):
+    sembrar(bd, [])
+    olvidado = trabajos.encolar(bd, 'recalcular')
+    reciente = trabajos.encolar(bd, 'recalcular')
+    bd.trabajos.update_one({'_id': olvidado},
+                           {'$set': {'creado': datetime.utcnow() - timedelta(seconds=trabajos.SIN_WORKER + 1)}})
+    admin = iniciar_sesion(app, 'admin', 'admin')
+
+    assert admin.get(f'/api/v1/trabajos/{olvidado}').get_json()['sin_worker'] is True
+    assert admin.get(f'/api/v1/trabajos/{reciente}').get_json()['sin_worker'] is False
+    # Una vez en la fila del olvidado y otra en el atributo que usa el JavaScript
+    assert admin.get('/trabajos').get_data(as_text=True).count('Ningún worker ha tomado este trabajo') == 2
@@ -0,0 +1,336 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+import gridfs
+import os
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+from database import obtener_bd
+
+# Cola de trabajos largos (boletas de toda la escuela, importaciones y
+# exportaciones completas). Las rutas solo insertan un documento en la
+# colección `trabajos` y responden de inmediato; un proceso aparte
+# (`python trabajos.py`, ver Procfile) los toma uno a uno, reporta el avance
+# en el mismo documento y guarda el archivo resultante en GridFS.
+#
+# Estados: pendiente -> en_proceso -> terminado | fallido | cancelado
+#
+# Las fechas (creado, iniciado, latido, terminado) se guardan en UTC, como las
+# devuelve pymongo, para que los workers y la web comparen lo mismo aunque
+# corran con otra zona horaria.
+ESPERA = float(os.environ.get('TRABAJOS_ESPERA', 2))
+# Un trabajo en_proceso sin latido en este tiempo se considera abandonado
+# (worker reiniciado) y vuelve a la cola
+LATIDO_MAXIMO = int(os.environ.get('TRABAJOS_LATIDO_MAXIMO', 300))
+INTENTOS_MAXIMOS = int(os.environ.get('TRABAJOS_INTENTOS', 2))
+RETENCION_DIAS = int(os.environ.get('TRABAJOS_RETENCION_DIAS', 7))
+# El avance se escribe como mucho una vez por este intervalo (segundos)
+INTERVALO_AVANCE = float(os.environ.get('TRABAJOS_INTERVALO_AVANCE', 1))
+# Un pendiente con más de estos segundos en cola se marca en /trabajos: casi
+# siempre significa que el servicio del worker no está corriendo
+SIN_WORKER = int(os.environ.get('TRABAJOS_SIN_WORKER', 60))
+
+COLECCION_ARCHIVOS = 'archivos_trabajos'
+ESTADOS_FINALES = ('terminado', 'fallido', 'cancelado')
+
+
+class TrabajoCancelado(Exception):
+    pass
+
+
+def archivos(db):
+    return gridfs.GridFS(db, collection=COLECCION_ARCHIVOS)
+
+
+def _id(trabajo_id):
+    try:
+        return ObjectId(trabajo_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+def encolar(db, tipo, parametros=None, usuario=None, archivo_id=None):
+    if tipo not in TAREAS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    trabajo = {
+        'tipo': tipo,
+        'parametros': parametros or {},
+        'usuario': usuario,
+        'estado': 'pendiente',
+        'progreso': {'hechos': 0, 'total': None, 'mensaje': 'En cola'},
+        'cancelar': False,
+        'intentos': 0,
+        'creado': datetime.utcnow(),
+    }
+    if archivo_id is not None:
+        trabajo['entrada_id'] = archivo_id
+    return db.trabajos.insert_one(trabajo).inserted_id
+
+
+def guardar_entrada(db, contenido, nombre):
+    # Archivos subidos (p. ej. importaciones) que procesará el worker
+    return archivos(db).put(contenido, filename=nombre)
+
+
+def obtener_trabajo(db, trabajo_id):
+    trabajo_id = _id(trabajo_id)
+    return db.trabajos.find_one({'_id': trabajo_id}) if trabajo_id else None
+
+
+def listar_trabajos(db, limite=20):
+    return list(db.trabajos.find({}, sort=[('creado', -1)], limit=limite))
+
+
+def cancelar_trabajo(db, trabajo_id):
+    # Un pendiente se cancela de inmediato; uno en proceso se marca y el
+    # worker lo detiene en su siguiente reporte de avance
+    trabajo_id = _id(trabajo_id)
+    if trabajo_id is None:
+        return None
+    db.trabajos.update_one(
+        {'_id': trabajo_id, 'estado': 'pendiente'},
+        {'$set': {'estado': 'cancelado', 'terminado': datetime.utcnow(), 'progreso.mensaje': 'Cancelado'}}
+    )
+    return db.trabajos.find_one_and_update(
+        {'_id': trabajo_id, 'estado': 'en_proceso'},
+        {'$set': {'cancelar': True}},
+        return_document=ReturnDocument.AFTER
+    ) or db.trabajos.find_one({'_id': trabajo_id})
+
+
+def leer_resultado(db, trabajo):
+    # GridOut con el archivo del trabajo terminado, o None
+    resultado = trabajo.get('resultado') or {}
+    if trabajo.get('estado') != 'terminado' or 'archivo_id' not in resultado:
+        return None
+    try:
+        return archivos(db).get(resultado['archivo_id'])
+    except NoFile:
+        return None
+
+
+def esperando_worker(trabajo):
+    return (trabajo['estado'] == 'pendiente'
+            and datetime.utcnow() - trabajo['creado'] > timedelta(seconds=SIN_WORKER))
+
+
+def a_json(trabajo):
+    resultado = dict(trabajo.get('resultado') or {})
+    archivo_id = resultado.pop('archivo_id', None)
+    return {
+        'id': str(trabajo['_id']),
+        'tipo': trabajo['tipo'],
+        'estado': trabajo['estado'],
+        'progreso': trabajo.get('progreso'),
+        'resultado': resultado,
+        'descarga': f"/trabajos/{trabajo['_id']}/descargar" if archivo_id else None,
+        'error': trabajo.get('error'),
+        'creado': trabajo['creado'].isoformat(),
+        'terminado': trabajo['terminado'].isoformat() if trabajo.get('terminado') else None,
+        'sin_worker': esperando_worker(trabajo),
+    }
+
+
+class Avance:
+    # Se pasa a cada tarea: avance(hechos, total, mensaje). Escribe el avance
+    # como mucho cada INTERVALO_AVANCE segundos (también sirve de latido) y
+    # lanza TrabajoCancelado si alguien pidió cancelar
+    def __init__(self, db, trabajo_id):
+        self.db = db
+        self.trabajo_id = trabajo_id
+        self.ultimo = 0
+
+    def __call__(self, hechos, total=None, mensaje=''):
+        ahora = time.monotonic()
+        if ahora - self.ultimo < INTERVALO_AVANCE and (total is None or hechos < total):
+            return
+        self.ultimo = ahora
+        trabajo = self.db.trabajos.find_one_and_update(
+            {'_id': self.trabajo_id},
+            {'$set': {
+                'progreso': {'hechos': hechos, 'total': total, 'mensaje': mensaje},
+                'latido': datetime.utcnow(),
+            }},
+            projection={'cancelar': 1}
+        )
+        if trabajo and trabajo.get('cancelar'):
+            raise TrabajoCancelado()
+
+
+def _subir_resultado(db, trabajo, ruta, nombre, tipo_mime):
+    with open(ruta, 'rb') as archivo:
+        archivo_id = archivos(db).put(archivo, filename=nombre, content_type=tipo_mime,
+                                      trabajo_id=trabajo['_id'])
+    return {'archivo_id': archivo_id, 'nombre': nombre, 'tipo_mime': tipo_mime}
+
+
+def tarea_boletas(db, trabajo, avance):
+    from boletas import generar_zip, nombre_seguro
+    from escuela import GRUPOS
+
+    grupos = trabajo['parametros'].get('grupos') or GRUPOS
+    nombre = 'boletas_escuela.zip' if len(grupos) > 1 else f'boletas_{nombre_seguro(grupos[0])}.zip'
+    with tempfile.NamedTemporaryFile(suffix='.zip') as destino:
+        pdfs = generar_zip(
+            grupos, destino.name,
+            progreso=lambda hechos, total, grupo, _: avance(hechos, total, f"Grupo {grupo} listo")
+        )
+        resultado = _subir_resultado(db, trabajo, destino.name, nombre, 'application/zip')
+    resultado['pdfs'] = pdfs
+    return resultado
+
+
+def tarea_exportar(db, trabajo, avance):
+    from exportacion import FORMATOS, exportar, nombre_archivo
+
+    parametros = trabajo['parametros']
+    grupo, trimestre, formato = parametros.get('grupo'), parametros['trimestre'], parametros['formato']
+    total = db.alumnos.count_documents({} if grupo is None else {'grupo': grupo})
+    with tempfile.NamedTemporaryFile() as destino:
+        progreso = lambda filas: avance(filas, total, f"{filas} de {total} alumnos")
+        for fragmento in exportar(db, grupo, trimestre, formato, progreso=progreso):
+            destino.write(fragmento)
+        destino.flush()
+        return _subir_resultado(db, trabajo, destino.name, nombre_archivo(grupo, trimestre, formato), FORMATOS[formato])
+
+
+def tarea_importar(db, trabajo, avance):
+    from importacion import importar_alumnos
+
+    entrada = archivos(db).get(trabajo['entrada_id'])
+    parametros = trabajo['parametros']
+    try:
+        resultado = importar_alumnos(
+            db, entrada, entrada.filename, simular=parametros.get('simular', False),
+            progreso=lambda filas, insertados: avance(filas, None, f"{filas} filas leídas, {insertados} insertadas")
+        )
+    finally:
+        archivos(db).delete(trabajo['entrada_id'])
+    return resultado
+
+
+def tarea_recalcular(db, trabajo, avance):
+    # Reconstruye los promedios materializados (ver promedios.py)
+    from cache_grupos import invalidar_grupos
+    from promedios import verificar
+
+    # El avance de cada lote también sirve de latido: sin él, una reparación
+    # de más de LATIDO_MAXIMO segundos se daría por abandonada
+    diferencias = verificar(db, reparar=True, progreso=avance)
+    if diferencias:
+        invalidar_grupos(db)
+    return {'corregidas': len(diferencias), 'diferencias': diferencias[:100]}
+
+
+# tipo -> función(db, trabajo, avance) que devuelve el resultado (dict)
+TAREAS = {
+    'boletas': tarea_boletas,
+    'exportar': tarea_exportar,
+    'importar': tarea_importar,
+    'recalcular': tarea_recalcular,
+}
+
+
+def tomar_trabajo(db, trabajador):
+    # El más antiguo de la cola; find_one_and_update evita que dos workers
+    # tomen el mismo
+    return db.trabajos.find_one_and_update(
+        {'estado': 'pendiente'},
+        {'$set': {'estado': 'en_proceso', 'iniciado': datetime.utcnow(), 'latido': datetime.utcnow(),
+                  'trabajador': trabajador, 'progreso.mensaje': 'Iniciando'},
+         '$inc': {'intentos': 1}},
+        sort=[('creado', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def ejecutar(db, trabajo):
+    avance = Avance(db, trabajo['_id'])
+    cambios = {'terminado': datetime.utcnow()}
+    try:
+        resultado = TAREAS[trabajo['tipo']](db, trabajo, avance)
+        cambios.update({'estado': 'terminado', 'resultado': resultado, 'progreso.mensaje': 'Terminado'})
+        print(f"✅ Trabajo {trabajo['_id']} ({trabajo['tipo']}) terminado")
+    except TrabajoCancelado:
+        cambios.update({'estado': 'cancelado', 'progreso.mensaje': 'Cancelado'})
+        print(f"ℹ️  Trabajo {trabajo['_id']} ({trabajo['tipo']}) cancelado")
+    except Exception as e:
+        cambios.update({'estado': 'fallido', 'error': str(e) or e.__class__.__name__, 'progreso.mensaje': 'Falló'})
+        print(f"❌ Trabajo {trabajo['_id']} ({trabajo['tipo']}) falló: {e}")
+        traceback.print_exc()
+    cambios['terminado'] = datetime.utcnow()
+    db.trabajos.update_one({'_id': trabajo['_id']}, {'$set': cambios})
+
+
+def recuperar_abandonados(db):
+    # Trabajos de un worker que murió a medias: se reintentan hasta
+    # INTENTOS_MAXIMOS veces y después quedan como fallidos
+    limite = datetime.utcnow() - timedelta(seconds=LATIDO_MAXIMO)
+    abandonados = {'estado': 'en_proceso', 'latido': {'$lt': limite}}
+    db.trabajos.update_many(
+        {**abandonados, 'intentos': {'$gte': INTENTOS_MAXIMOS}},
+        {'$set': {'estado': 'fallido', 'error': 'El worker dejó de responder', 'terminado': datetime.utcnow()}}
+    )
+    db.trabajos.update_many(
+        {**abandonados, 'cancelar': True},
+        {'$set': {'estado': 'cancelado', 'terminado': datetime.utcnow()}}
+    )
+    db.trabajos.update_many(abandonados, {'$set': {'estado': 'pendiente', 'progreso.mensaje': 'Reintentando'}})
+
+
+def limpiar_antiguos(db):
+    # Borra los trabajos terminados hace más de RETENCION_DIAS y sus archivos
+    limite = datetime.utcnow() - timedelta(days=RETENCION_DIAS)
+    fs = archivos(db)
+    borrados = 0
+    for trabajo in db.trabajos.find({'estado': {'$in': list(ESTADOS_FINALES)}, 'terminado': {'$lt': limite}}):
+        for archivo_id in ((trabajo.get('resultado') or {}).get('archivo_id'), trabajo.get('entrada_id')):
+            if archivo_id is not None:
+                fs.delete(archivo_id)
+        db.trabajos.delete_one({'_id': trabajo['_id']})
+        borrados += 1
+    return borrados
+
+
+def trabajar(una_vez=False):
+    trabajador = f'{socket.gethostname()}:{os.getpid()}'
+    print(f"🛠️  Worker de trabajos iniciado ({trabajador})")
+    ultima_revision = ultima_limpieza = 0
+    while True:
+        db = obtener_bd()
+        trabajo = None
+        try:
+            if db is not None:
+                if time.monotonic() - ultima_revision > 60:
+                    recuperar_abandonados(db)
+                    ultima_revision = time.monotonic()
+                if time.monotonic() - ultima_limpieza > 3600:
+                    borrados = limpiar_antiguos(db)
+                    if borrados:
+                        print(f"🗑️  {borrados} trabajos antiguos eliminados")
+                    ultima_limpieza = time.monotonic()
+                trabajo = tomar_trabajo(db, trabajador)
+                if trabajo is not None:
+                    print(f"▶️  Trabajo {trabajo['_id']} ({trabajo['tipo']})")
+                    ejecutar(db, trabajo)
+        except PyMongoError as e:
+            print(f"⚠️  Error de MongoDB en el worker: {e}")
+        if una_vez:
+            return trabajo
+        if trabajo is None:
+            time.sleep(ESPERA)
+
+
+if __name__ == '__main__':
+    # python trabajos.py [--una-vez]
+    try:
+        trabajar(una_vez='--una-vez' in sys.argv)
+    except KeyboardInterrupt:
+        print("👋 Worker detenido")